@@ -1,9 +1,9 @@
-from app import create_app
 from flask_cors import CORS
 
-app = create_app()
-CORS(app, supports_credentials=True)
-
 
 if __name__ == '__main__':
+    # Imported here so spawned invoice render processes, which re-import this
+    # script as their main module, don't build an app of their own
+    from app import app
+    CORS(app, supports_credentials=True)
     app.run(debug=True)
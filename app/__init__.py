@@ -1,3 +1,4 @@
+from threading import Lock
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -7,7 +8,12 @@ from flask_restx import Api
 from flask_cors import CORS
 from .config import Config
 from .models import Client, db
+from .database import engine_options
 from .email_service import email_service
+from .invoice_service import invoice_service
+from .response_cache import response_cache
+from .instrumentation import query_instrumentation
+from .metrics import metrics
 
 jwt = JWTManager()
 bcrypt = Bcrypt()
@@ -17,6 +23,7 @@ api = Api(title='Laptop Care API', version='1.0', description='A laptop repair m
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
 
     # Initialize extensions
     db.init_app(app)
@@ -25,18 +32,51 @@ def create_app():
     api.init_app(app)
     migrate.init_app(app, db)
 
-    # Start email service
-    email_service.start_email_service()
+    # Start the email outbox dispatcher
+    email_service.init_app(app)
+    invoice_service.init_app(app)
+    response_cache.init_app(app)
+    query_instrumentation.init_app(app)
+    metrics.init_app(app)
 
     # Apply CORS to the app
     CORS(app, origins=["http://localhost:3000", "https://laptop-care-client.vercel.app"], supports_credentials=True)
 
-    from .routes import client_ns, device_ns, users_ns, jobcards_ns
+    from .routes import client_ns, device_ns, users_ns, jobcards_ns, emails_ns, cache_ns, stats_ns
     api.add_namespace(client_ns)
     api.add_namespace(device_ns)
     api.add_namespace(users_ns)
     api.add_namespace(jobcards_ns)
+    api.add_namespace(emails_ns)
+    api.add_namespace(cache_ns)
+    api.add_namespace(stats_ns)
+
+    from .commands import invoices_cli, jobcards_cli, emails_cli, seed
+    app.cli.add_command(invoices_cli)
+    app.cli.add_command(jobcards_cli)
+    app.cli.add_command(emails_cli)
+    app.cli.add_command(seed)
 
     return app
 
-app = create_app()
+
+_app = None
+_app_lock = Lock()
+
+
+def get_app():
+    """Return this process's app, creating it on first use."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
+
+
+def __getattr__(name):
+    # `app` is created the first time it's looked up (by gunicorn, `flask --app app`
+    # or `from app import app`) rather than at import, so it's only ever built once
+    # and processes that just need the models, like the invoice renderers, never build it
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,194 @@
+"""
+Validation and persistence helpers for the bulk create/update endpoints.
+
+Items are validated one by one so every error can be reported against its
+index in the request array. Uniqueness and foreign keys are then checked
+for the whole batch with one IN query per column, and the surviving items
+are written in a single flush and transaction.
+"""
+from collections import namedtuple
+from sqlalchemy import String
+from .models import db
+
+# type: expected Python type; required: needed on create and never null;
+# choices: allowed values, if restricted; minimum: lowest allowed number
+BulkField = namedtuple('BulkField', ['type', 'required', 'choices', 'minimum'], defaults=(False, None, None))
+
+
+def _type_error(value, field):
+    # bool is a subclass of int, but True is not a valid id or cost
+    if isinstance(value, bool) and field.type is not bool:
+        return f'must be of type {field.type.__name__}'
+    if field.type is int and isinstance(value, float) and value.is_integer():
+        return None
+    if not isinstance(value, field.type):
+        return f'must be of type {field.type.__name__}'
+    return None
+
+
+def validate_item(model, fields, item, partial=False):
+    """
+    Check one item against the field specs and the model's column lengths.
+
+    :param partial: Validate an update, where only the given fields are set
+    :return: Tuple of (values, errors) where errors maps field names to messages
+    """
+    if not isinstance(item, dict):
+        return {}, {'item': 'must be an object'}
+
+    values, errors = {}, {}
+    for name in item:
+        if name not in fields and not (partial and name == 'id'):
+            errors[name] = 'unknown field'
+
+    for name, field in fields.items():
+        if name not in item or item[name] is None:
+            if field.required and (name in item or not partial):
+                errors[name] = 'is required'
+            elif name in item:
+                values[name] = None
+            continue
+
+        value = item[name]
+        error = _type_error(value, field)
+        if error is None and field.choices is not None and value not in field.choices:
+            error = f'must be one of: {", ".join(field.choices)}'
+        if error is None and field.minimum is not None and value < field.minimum:
+            error = f'must be at least {field.minimum}'
+        column_type = model.__table__.c[name].type
+        if error is None and isinstance(value, str) and isinstance(column_type, String) \
+                and column_type.length and len(value) > column_type.length:
+            error = f'must be at most {column_type.length} characters'
+        if error:
+            errors[name] = error
+        else:
+            values[name] = int(value) if field.type is int else value
+    return values, errors
+
+
+class BulkOperation:
+    """Collects the valid items and per-item errors of one bulk request."""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.items = []      # (index, values) of items that passed every check so far
+        self.errors = {}     # index -> {field: message}
+
+    def validate(self, items, partial=False):
+        for index, item in enumerate(items):
+            values, errors = validate_item(self.model, self.fields, item, partial)
+            if partial and (not isinstance(item, dict) or not isinstance(item.get('id'), int)
+                            or isinstance(item.get('id'), bool)):
+                errors['id'] = 'is required'
+            if errors:
+                self.errors[index] = errors
+            else:
+                if partial:
+                    values['id'] = item['id']
+                self.items.append((index, values))
+        return self
+
+    def reject(self, index, field, message):
+        self.errors.setdefault(index, {})[field] = message
+
+    def _keep_valid(self):
+        self.items = [(index, values) for index, values in self.items if index not in self.errors]
+
+    def check_unique(self, column):
+        """Reject items whose value for a unique column is repeated in the batch or taken by another row."""
+        name = column.key
+        seen = {}
+        for index, values in self.items:
+            value = values.get(name)
+            if value is None:
+                continue
+            if value in seen:
+                self.reject(index, name, f'duplicates item {seen[value]}')
+            else:
+                seen[value] = index
+
+        if seen:
+            taken = dict(db.session.query(column, self.model.id).filter(column.in_(list(seen))))
+            for index, values in self.items:
+                owner = taken.get(values.get(name))
+                if owner is not None and owner != values.get('id'):
+                    self.reject(index, name, 'already exists')
+        self._keep_valid()
+        return self
+
+    def check_references(self, name, target_column):
+        """Reject items whose foreign key `name` doesn't match an existing `target_column` value."""
+        wanted = {values[name] for _, values in self.items if values.get(name) is not None}
+        if wanted:
+            existing = {value for (value,) in db.session.query(target_column).filter(target_column.in_(wanted))}
+            for index, values in self.items:
+                if values.get(name) is not None and values[name] not in existing:
+                    self.reject(index, name, 'does not exist')
+        self._keep_valid()
+        return self
+
+    def create(self):
+        """Insert the valid items in one flush; returns the new instances in item order."""
+        instances = []
+        for index, values in self.items:
+            try:
+                instance = self.model(**values)
+                if hasattr(instance, 'validate_fields'):
+                    instance.validate_fields()
+                instances.append((index, instance))
+            except ValueError as e:
+                # Model-level validation, e.g. Client's email format
+                self.reject(index, 'item', str(e))
+        self._keep_valid()
+        db.session.add_all([instance for _, instance in instances])
+        db.session.flush()
+        return instances
+
+    def update(self):
+        """Apply the valid items to their rows, loaded with one query; returns the updated instances."""
+        ids = [values['id'] for _, values in self.items]
+        rows = {row.id: row for row in self.model.query.filter(self.model.id.in_(ids))} if ids else {}
+        instances = []
+        for index, values in self.items:
+            row = rows.get(values['id'])
+            if row is None:
+                self.reject(index, 'id', 'not found')
+                continue
+            for name, value in values.items():
+                if name != 'id':
+                    setattr(row, name, value)
+            try:
+                if hasattr(row, 'validate_fields'):
+                    row.validate_fields()
+            except ValueError as e:
+                # Discard the pending changes so the flush doesn't write them
+                db.session.expire(row)
+                self.reject(index, 'item', str(e))
+                continue
+            instances.append((index, row))
+        self._keep_valid()
+        db.session.flush()
+        return instances
+
+    def write(self, partial=False):
+        """Create the valid items, or update them when `partial`; returns (index, id) pairs."""
+        instances = self.update() if partial else self.create()
+        # Read the ids now; after commit every instance is expired and would be reloaded one by one
+        return [(index, instance.id) for index, instance in instances]
+
+    def response(self, written, success_status):
+        """
+        Build the response body and status for a bulk request.
+
+        The status is `success_status` if every item succeeded, 207 if some
+        did and 400 if none did.
+        """
+        body = {
+            'results': [{'index': index, 'id': written_id} for index, written_id in written],
+            'errors': [{'index': index, 'errors': errors} for index, errors in sorted(self.errors.items())]
+        }
+        if not self.errors:
+            return body, success_status
+        return body, 207 if written else 400
+
@@ -0,0 +1,169 @@
+"""
+Change feed for jobcards.
+
+Every jobcard insert, update and delete appends a row to jobcard_changes in
+the same transaction, so `seq` gives clients a cursor to ask for only what
+changed since they last looked. On Postgres the writes to the log take a
+transaction-level advisory lock, so sequence numbers become visible in commit
+order and a reader never skips past one that is still being committed.
+"""
+import json
+import threading
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session, object_session
+from .models import db, Jobcards, JobcardChange, utcnow
+from .serializers import jobcard_serializer
+
+# Arbitrary application-wide key for pg_advisory_xact_lock
+CHANGE_LOG_LOCK_KEY = 0x4a4f4243
+
+
+def serialize_change(change):
+    """Convert a JobcardChange into the dict sent to clients."""
+    return {
+        'seq': change.seq,
+        'jobcard_id': change.jobcard_id,
+        'operation': change.operation,
+        'status': change.status,
+        'data': json.loads(change.data) if change.data else None,
+        'created_at': change.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+class ChangeFeed:
+    """
+    Reads the jobcard change log, waiting for new changes when asked.
+
+    Commits made by this process wake waiting readers immediately; changes
+    committed by other processes are picked up by polling the log's primary
+    key every JOBCARD_CHANGES_POLL_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def notify(self):
+        """Wake every reader waiting in this process."""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def latest_seq(self):
+        return db.session.query(func.max(JobcardChange.seq)).scalar() or 0
+
+    def oldest_seq(self):
+        return db.session.query(func.min(JobcardChange.seq)).scalar()
+
+    def fetch(self, since, limit):
+        """Return up to `limit` serialized changes after `since`, oldest first."""
+        changes = JobcardChange.query.filter(JobcardChange.seq > since).order_by(JobcardChange.seq).limit(limit).all()
+        result = [serialize_change(change) for change in changes]
+        # End the read transaction so the connection goes back to the pool while
+        # waiting, and so the next read (on SQLite in particular) sees new commits
+        db.session.rollback()
+        return result
+
+    def wait_for_changes(self, since, timeout, limit):
+        """Return changes after `since`, blocking up to `timeout` seconds for the first one."""
+        poll_interval = current_app.config['JOBCARD_CHANGES_POLL_INTERVAL']
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self._generation
+            changes = self.fetch(since, limit)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+            with self._condition:
+                # Skip the wait if a commit landed since the read above
+                if self._generation == generation:
+                    self._condition.wait(min(poll_interval, remaining))
+
+    def prune(self, older_than_days):
+        """Delete changes older than `older_than_days`; returns how many were deleted."""
+        cutoff = utcnow() - timedelta(days=older_than_days)
+        deleted = JobcardChange.query.filter(JobcardChange.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+change_feed = ChangeFeed()
+
+
+# Writing the log
+
+def _column_values(jobcard, keys):
+    converters = dict(jobcard_serializer.converters)
+    values = {}
+    for key in keys:
+        value = getattr(jobcard, key)
+        values[key] = converters[key](value) if key in converters else value
+    return values
+
+
+def _change_row(jobcard, operation, data):
+    return {
+        'jobcard_id': jobcard.id,
+        'operation': operation,
+        'status': jobcard.status,
+        'data': json.dumps(data) if data is not None else None,
+        'created_at': utcnow()
+    }
+
+
+def _write_changes(connection, session, rows):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_LOG_LOCK_KEY})
+    connection.execute(JobcardChange.__table__.insert(), rows)
+    if session is not None:
+        session.info['jobcard_changes_written'] = True
+
+
+def _append_change(connection, jobcard, operation, data):
+    _write_changes(connection, object_session(jobcard), [_change_row(jobcard, operation, data)])
+
+
+def _log_insert(mapper, connection, jobcard):
+    # Inserts are logged together at the end of the flush, so creating many
+    # jobcards at once writes the log in a single statement
+    object_session(jobcard).info.setdefault('new_jobcard_changes', []).append(
+        _change_row(jobcard, JobcardChange.INSERT, _column_values(jobcard, jobcard_serializer.names))
+    )
+
+
+def _log_inserts(session, flush_context):
+    rows = session.info.pop('new_jobcard_changes', None)
+    if rows:
+        _write_changes(session.connection(), session, rows)
+
+
+def _log_update(mapper, connection, jobcard):
+    state = db.inspect(jobcard)
+    changed = [key for key in jobcard_serializer.names if state.attrs[key].history.has_changes()]
+    if changed:
+        _append_change(connection, jobcard, JobcardChange.UPDATE, _column_values(jobcard, changed))
+
+
+def _log_delete(mapper, connection, jobcard):
+    _append_change(connection, jobcard, JobcardChange.DELETE, None)
+
+
+def _notify_committed_changes(session):
+    if session.info.pop('jobcard_changes_written', False):
+        change_feed.notify()
+
+
+def _discard_changes(session):
+    session.info.pop('jobcard_changes_written', None)
+    session.info.pop('new_jobcard_changes', None)
+
+
+db.event.listen(Jobcards, 'after_insert', _log_insert)
+db.event.listen(Jobcards, 'after_update', _log_update)
+db.event.listen(Jobcards, 'after_delete', _log_delete)
+event.listen(Session, 'after_flush', _log_inserts)
+event.listen(Session, 'after_commit', _notify_committed_changes)
+event.listen(Session, 'after_rollback', _discard_changes)
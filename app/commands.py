@@ -0,0 +1,84 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from .invoice_service import stream_invoice_zip, invoice_service
+from .changes import change_feed
+from .email_service import email_service
+
+invoices_cli = AppGroup('invoices', help='Invoice related commands.')
+jobcards_cli = AppGroup('jobcards', help='Jobcard related commands.')
+emails_cli = AppGroup('emails', help='Email outbox commands.')
+
+
+@invoices_cli.command('batch')
+@click.argument('jobcard_ids', nargs=-1, type=int, required=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default='invoices.zip',
+              show_default=True, help='Where to write the ZIP archive.')
+@click.option('--send-emails/--no-send-emails', default=True, show_default=True,
+              help='Queue each invoice to its client by email.')
+@click.option('--workers', type=int, default=None, help='Render processes to use (defaults to every core).')
+def batch_invoices(jobcard_ids, output, send_emails, workers):
+    """Render invoices for JOBCARD_IDS into a ZIP archive."""
+    chunks = stream_invoice_zip(
+        list(dict.fromkeys(jobcard_ids)),
+        send_emails=send_emails,
+        max_workers=workers or current_app.config['INVOICE_BATCH_WORKERS']
+    )
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    click.echo(f'Wrote invoices for {len(jobcard_ids)} jobcard(s) to {output}')
+
+
+@invoices_cli.command('prune-jobs')
+@click.option('--days', type=int, default=None,
+              help='Keep jobs newer than this many days (defaults to INVOICE_JOB_RETENTION_DAYS).')
+def prune_invoice_jobs(days):
+    """Delete old invoice jobs and the PDFs kept for their downloads."""
+    if days is None:
+        days = current_app.config['INVOICE_JOB_RETENTION_DAYS']
+    deleted = invoice_service.prune(days)
+    click.echo(f'Deleted {deleted} invoice job(s) older than {days} day(s)')
+
+
+@jobcards_cli.command('prune-changes')
+@click.option('--days', type=int, default=30, show_default=True, help='Keep changes newer than this many days.')
+def prune_changes(days):
+    """Delete old entries from the jobcard change log."""
+    deleted = change_feed.prune(days)
+    click.echo(f'Deleted {deleted} jobcard change(s) older than {days} day(s)')
+
+
+@emails_cli.command('prune')
+@click.option('--days', type=int, default=None,
+              help='Keep emails newer than this many days (defaults to EMAIL_OUTBOX_RETENTION_DAYS).')
+def prune_emails(days):
+    """Delete old sent and dead-lettered emails from the outbox."""
+    if days is None:
+        days = current_app.config['EMAIL_OUTBOX_RETENTION_DAYS']
+    deleted = email_service.prune(days)
+    click.echo(f'Deleted {deleted} email(s) older than {days} day(s)')
+
+
+@click.command('seed')
+@click.option('--clients', type=int, default=10, show_default=True, help='Clients to generate.')
+@click.option('--devices', type=int, default=20, show_default=True, help='Devices to generate, spread over the new clients.')
+@click.option('--users', type=int, default=10, show_default=True, help='Users to generate.')
+@click.option('--jobcards', type=int, default=50, show_default=True,
+              help='Jobcards to generate, spread over the new devices.')
+@click.option('--seed', 'random_seed', type=int, default=42, show_default=True,
+              help='Random seed; the same seed and counts give the same data.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=10000, show_default=True,
+              help='Rows generated and committed per batch.')
+@click.option('--password', default='password', show_default=True, help='Password given to every generated user.')
+@with_appcontext
+def seed(clients, devices, users, jobcards, random_seed, chunk_size, password):
+    """Bulk-load generated clients, devices, users and jobcards."""
+    # Faker takes longer to import than the rest of the app; only load it when seeding
+    from .fixtures import seed_database
+    try:
+        seed_database(clients, devices, users, jobcards, seed=random_seed, chunk_size=chunk_size,
+                      password=password, echo=click.echo)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo('Database seeded successfully!')
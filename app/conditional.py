@@ -0,0 +1,51 @@
+import hashlib
+import pytz
+from flask import Response, request
+from werkzeug.http import http_date, parse_date
+
+
+def version_etag(parts):
+    """
+    Build a weak ETag value from the (id, version) of every row a response embeds.
+
+    Versions are bumped on every update, so the tag changes whenever any of
+    those rows do, without serializing or hashing the body itself.
+    """
+    return hashlib.blake2b(repr(tuple(parts)).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def last_modified_header(updated_at_values):
+    """Format the latest of some naive-UTC updated_at values as an HTTP date, or None."""
+    values = [value for value in updated_at_values if value is not None]
+    if not values:
+        return None
+    return http_date(max(values).replace(tzinfo=pytz.utc))
+
+
+def versioned(body, etag_parts, updated_at_values):
+    """Bundle a body with its validators; the bundle is what the response cache stores."""
+    return {'body': body, 'etag': version_etag(etag_parts), 'last_modified': last_modified_header(updated_at_values)}
+
+
+def is_not_modified(etag, last_modified=None):
+    """Check the request's If-None-Match (or, failing that, If-Modified-Since) against a response's validators."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag) or request.if_none_match.star_tag
+    if request.if_modified_since and last_modified:
+        return parse_date(last_modified) <= request.if_modified_since
+    return False
+
+
+def conditional_response(bundle, headers=None):
+    """
+    Return a `versioned` bundle's body with ETag and Last-Modified headers,
+    or an empty 304 if the client's copy is still current.
+    """
+    headers = dict(headers or {})
+    headers['ETag'] = f'W/"{bundle["etag"]}"'
+    if bundle['last_modified']:
+        headers['Last-Modified'] = bundle['last_modified']
+
+    if is_not_modified(bundle['etag'], bundle['last_modified']):
+        return Response(status=304, headers=headers)
+    return bundle['body'], 200, headers
@@ -6,8 +6,59 @@ load_dotenv()
 class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Database connection pool. Sizes are per process; DB_POOL_PREWARM
+    # connections are opened when a gunicorn worker starts
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true') == 'true'
+    DB_POOL_PREWARM = int(os.environ.get('DB_POOL_PREWARM', DB_POOL_SIZE))
+    # Postgres only: 0 leaves statements without a time limit
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    # psycopg 3 only: executions before a statement is prepared on the server, or 'off'
+    DB_PREPARE_THRESHOLD = os.environ.get('DB_PREPARE_THRESHOLD')
+
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev-jwt-secret')
+
+    # Pagination settings for list endpoints
+    PAGINATION_DEFAULT_LIMIT = int(os.environ.get('PAGINATION_DEFAULT_LIMIT', 100))
+    PAGINATION_MAX_LIMIT = int(os.environ.get('PAGINATION_MAX_LIMIT', 500))
+
+    # Most serial numbers accepted by one bulk serial lookup
+    DEVICE_SERIAL_LOOKUP_MAX = int(os.environ.get('DEVICE_SERIAL_LOOKUP_MAX', 500))
+
+    # Most items accepted by one bulk create, update or status request
+    BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 1000))
+
+    # Response cache for single-resource GETs; set RESPONSE_CACHE_URL to a
+    # redis:// URL to share it between processes instead of caching in memory
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true') == 'true'
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 10000))
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL')
+
+    # Jobcard change feed: how often waiting readers re-check the log for
+    # changes committed by other processes, and how long they may wait
+    JOBCARD_CHANGES_POLL_INTERVAL = float(os.environ.get('JOBCARD_CHANGES_POLL_INTERVAL', 1))
+    JOBCARD_CHANGES_MAX_WAIT = float(os.environ.get('JOBCARD_CHANGES_MAX_WAIT', 30))
+    JOBCARD_CHANGES_STREAM_SECONDS = float(os.environ.get('JOBCARD_CHANGES_STREAM_SECONDS', 300))
+    JOBCARD_CHANGES_HEARTBEAT_SECONDS = float(os.environ.get('JOBCARD_CHANGES_HEARTBEAT_SECONDS', 15))
+
+    # Per-request SQL instrumentation: statements slower than the threshold are
+    # logged, and responses carry a Server-Timing header with the database time
+    QUERY_INSTRUMENTATION_ENABLED = os.environ.get('QUERY_INSTRUMENTATION_ENABLED', 'true') == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true') == 'true'
+
+    # Prometheus metrics at /metrics; see app/metrics.py for running under gunicorn
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true') == 'true'
+
+    # Trigram similarity (0-1) a word needs to fuzzily match a search term in
+    # the in-process search index; Postgres uses pg_trgm.word_similarity_threshold
+    SEARCH_SIMILARITY_THRESHOLD = float(os.environ.get('SEARCH_SIMILARITY_THRESHOLD', 0.3))
     
     # Mail settings
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -16,3 +67,29 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+
+    # Email outbox dispatcher settings
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+    EMAIL_OUTBOX_LEASE_SECONDS = int(os.environ.get('EMAIL_OUTBOX_LEASE_SECONDS', 300))
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', 5))
+    EMAIL_WORKER_THREADS = int(os.environ.get('EMAIL_WORKER_THREADS', 2))
+    EMAIL_SMTP_POOL_SIZE = int(os.environ.get('EMAIL_SMTP_POOL_SIZE', 2))
+    EMAIL_SMTP_NOOP_INTERVAL = float(os.environ.get('EMAIL_SMTP_NOOP_INTERVAL', 30))
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+    EMAIL_RETRY_BASE_DELAY = float(os.environ.get('EMAIL_RETRY_BASE_DELAY', 30))
+    EMAIL_RETRY_MAX_DELAY = float(os.environ.get('EMAIL_RETRY_MAX_DELAY', 3600))
+    # How long sent and dead-lettered emails are kept; see `flask emails prune`
+    EMAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('EMAIL_OUTBOX_RETENTION_DAYS', 30))
+
+    # Invoice rendering settings
+    INVOICE_RENDER_WORKERS = int(os.environ.get('INVOICE_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+    INVOICE_MAX_PENDING_JOBS = int(os.environ.get('INVOICE_MAX_PENDING_JOBS', 100))
+    INVOICE_LONG_POLL_MAX_WAIT = float(os.environ.get('INVOICE_LONG_POLL_MAX_WAIT', 30))
+    INVOICE_CACHE_DIR = os.environ.get('INVOICE_CACHE_DIR')
+    INVOICE_CACHE_MEMORY_BYTES = int(os.environ.get('INVOICE_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+    INVOICE_CACHE_DISK_BYTES = int(os.environ.get('INVOICE_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+    # Render processes started by `flask invoices batch`; web batches use the INVOICE_RENDER_WORKERS pool
+    INVOICE_BATCH_WORKERS = int(os.environ.get('INVOICE_BATCH_WORKERS', os.cpu_count() or 1))
+    INVOICE_BATCH_MAX_JOBCARDS = int(os.environ.get('INVOICE_BATCH_MAX_JOBCARDS', 1000))
+    # How long finished invoice jobs and their PDFs are kept; see `flask invoices prune-jobs`
+    INVOICE_JOB_RETENTION_DAYS = int(os.environ.get('INVOICE_JOB_RETENTION_DAYS', 7))
@@ -0,0 +1,94 @@
+"""
+Engine options from config, and connection pool pre-warming.
+
+`engine_options` turns the DB_* settings into SQLALCHEMY_ENGINE_OPTIONS for
+the configured database. `prewarm_pool` runs in each gunicorn worker once it
+has loaded the app (see gunicorn.conf.py). It opens connections ahead of the
+first requests and runs the queries behind the busiest endpoints, so
+SQLAlchemy has compiled them and the driver has loaded its type information
+before any client is waiting.
+"""
+import logging
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from .models import db, Client, Device, Users, Jobcards
+
+logger = logging.getLogger(__name__)
+
+
+def engine_options(config):
+    """
+    Build the SQLAlchemy engine options for `config`'s database.
+
+    Pool sizing only applies to client/server databases; SQLite keeps the
+    pool SQLAlchemy picks for it. The statement timeout and prepared
+    statement settings only apply to Postgres.
+    """
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri:
+        return {}
+    url = make_url(uri)
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE']
+    }
+    if url.get_backend_name() == 'sqlite':
+        return options
+
+    options.update({
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        # Hand back the most recently used connection, so idle ones age out through pool_recycle
+        'pool_use_lifo': True
+    })
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {}
+        if config['DB_STATEMENT_TIMEOUT_MS']:
+            connect_args['options'] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        # Only psycopg 3 prepares statements on the server; psycopg2 always sends them as text.
+        # 'off' disables it, as PgBouncer in transaction mode requires
+        threshold = config['DB_PREPARE_THRESHOLD']
+        if url.get_driver_name() == 'psycopg' and threshold:
+            connect_args['prepare_threshold'] = None if threshold == 'off' else int(threshold)
+        if connect_args:
+            options['connect_args'] = connect_args
+    return options
+
+
+def prewarm_pool(app):
+    """Open up to DB_POOL_PREWARM pooled connections and run the hot queries once."""
+    count = app.config['DB_POOL_PREWARM']
+    if count <= 0:
+        return
+    started = time.perf_counter()
+    with app.app_context():
+        engine = db.engine
+        # Connections opened before a fork belong to the parent; start this worker with its own
+        engine.dispose(close=False)
+        connections = []
+        try:
+            # Hold every connection until all are open, or the pool would hand back the same one
+            for _ in range(min(count, app.config['DB_POOL_SIZE'])):
+                connection = engine.connect()
+                connections.append(connection)
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            logger.warning(f"Could not pre-warm the database pool: {e}")
+            return
+        finally:
+            for connection in connections:
+                connection.close()
+
+        try:
+            Jobcards.query_with_details().order_by(Jobcards.id.desc()).limit(1).all()
+            Client.query.filter(Client.id == 0).first()
+            Device.query.filter(Device.id == 0).first()
+            Users.query.filter_by(role='technician').limit(1).all()
+            Users.query.filter_by(username='').first()
+        except Exception as e:
+            logger.warning(f"Could not run the pre-warming queries: {e}")
+        finally:
+            db.session.remove()
+    logger.info(f"Pre-warmed {len(connections)} database connection(s) in {time.perf_counter() - started:.2f}s")
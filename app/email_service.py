@@ -1,13 +1,16 @@
 import logging
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from datetime import timedelta
 from flask import current_app
-from threading import Thread
-from queue import Queue, Empty
+from threading import Thread, Event, Lock
+from queue import LifoQueue, Empty, Full
+from uuid import uuid4
 import traceback
+import random
+import time
 import os
+from .models import db, EmailOutbox, utcnow
+from .metrics import email_send_duration, email_sent, email_send_failures
 
 # Configure logging
 logging.basicConfig(
@@ -16,11 +19,95 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Errors after which an SMTP session can't be reused and must be reopened
+SMTP_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+
+class SMTPConnectionPool:
+    """
+    Keep authenticated SMTP sessions open between messages.
+
+    Idle sessions are reused most-recently-used first; one that has sat idle for
+    longer than `noop_interval` seconds is health-checked with NOOP before it is
+    handed out, and replaced if the server has dropped it.
+    """
+
+    def __init__(self, connect, size, noop_interval):
+        self._connect = connect
+        self._idle = LifoQueue(maxsize=size) if size > 0 else None
+        self.noop_interval = noop_interval
+
+    def acquire(self):
+        """Return a healthy SMTP session, or None if one can't be established."""
+        while self._idle is not None:
+            try:
+                smtp_conn, last_used = self._idle.get_nowait()
+            except Empty:
+                break
+            if time.monotonic() - last_used < self.noop_interval or self._is_alive(smtp_conn):
+                return smtp_conn
+            self.discard(smtp_conn)
+        return self._connect()
+
+    def release(self, smtp_conn):
+        """Return a session to the pool, closing it if the pool is full or disabled."""
+        if self._idle is None:
+            self._close(smtp_conn)
+            return
+        try:
+            self._idle.put_nowait((smtp_conn, time.monotonic()))
+        except Full:
+            self._close(smtp_conn)
+
+    def discard(self, smtp_conn):
+        """Drop a session that failed; it is closed without being reused."""
+        self._close(smtp_conn, graceful=False)
+
+    def close_all(self):
+        """Close every idle session."""
+        while self._idle is not None:
+            try:
+                smtp_conn, _ = self._idle.get_nowait()
+            except Empty:
+                break
+            self._close(smtp_conn)
+
+    @staticmethod
+    def _is_alive(smtp_conn):
+        try:
+            return smtp_conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(smtp_conn, graceful=True):
+        try:
+            if graceful:
+                smtp_conn.quit()
+            else:
+                smtp_conn.close()
+        except Exception:
+            pass
+
+
 class EmailService:
     def __init__(self):
-        self.email_queue = Queue()
-        self.email_thread = None
+        self.app = None
+        self.smtp_pool = None
+        self.email_threads = []
         self._stop_thread = False
+        self._wakeup = Event()
+        self._start_lock = Lock()
+
+    def init_app(self, app):
+        """Bind the service to an app and start the outbox dispatcher."""
+        self.app = app
+        self.smtp_pool = SMTPConnectionPool(
+            self._get_smtp_connection,
+            size=app.config['EMAIL_SMTP_POOL_SIZE'],
+            noop_interval=app.config['EMAIL_SMTP_NOOP_INTERVAL']
+        )
+        self.start_email_service()
 
     def _get_smtp_connection(self):
         """
@@ -66,58 +153,190 @@ class EmailService:
             logger.error(f"SMTP Connection Error: {str(e)}")
             return None
 
-    def _email_worker(self):
-        """Background worker to process email queue."""
-        while not self._stop_thread:
-            try:
-                # Wait for email with a timeout
-                try:
-                    email_task = self.email_queue.get(timeout=1)
-                except Empty:
-                    continue
+    def _claim_batch(self, worker_id):
+        """
+        Lease a batch of pending outbox rows to the given worker.
 
-                # Get SMTP connection
-                smtp_connection = self._get_smtp_connection()
+        On Postgres the candidate rows are selected with FOR UPDATE SKIP LOCKED so
+        concurrent dispatchers never wait on each other. The conditional UPDATE on
+        `locked_until` is the lease that also makes this safe on SQLite, which
+        ignores FOR UPDATE; a worker that dies leaves its lease to expire.
+        """
+        config = self.app.config
+        now = utcnow()
+        lease_expired = db.or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now)
+        attempt_due = db.or_(EmailOutbox.next_attempt_at.is_(None), EmailOutbox.next_attempt_at <= now)
+
+        candidate_ids = [
+            row.id for row in db.session.query(EmailOutbox.id)
+            .filter(EmailOutbox.status == EmailOutbox.PENDING, lease_expired, attempt_due)
+            .order_by(EmailOutbox.id)
+            .limit(config['EMAIL_OUTBOX_BATCH_SIZE'])
+            .with_for_update(skip_locked=True)
+        ]
+        if not candidate_ids:
+            db.session.commit()
+            return []
+
+        db.session.query(EmailOutbox).filter(
+            EmailOutbox.id.in_(candidate_ids),
+            EmailOutbox.status == EmailOutbox.PENDING,
+            lease_expired,
+            attempt_due
+        ).update({
+            EmailOutbox.locked_by: worker_id,
+            EmailOutbox.locked_until: now + timedelta(seconds=config['EMAIL_OUTBOX_LEASE_SECONDS'])
+        }, synchronize_session=False)
+        db.session.commit()
+
+        return EmailOutbox.query.filter(
+            EmailOutbox.id.in_(candidate_ids),
+            EmailOutbox.locked_by == worker_id,
+            EmailOutbox.status == EmailOutbox.PENDING
+        ).order_by(EmailOutbox.id).all()
+
+    def _deliver_batch(self, batch):
+        """Send a claimed batch over a pooled SMTP session and record each outcome."""
+        smtp_connection = self.smtp_pool.acquire()
+        try:
+            for email in batch:
+                email.attempts += 1
                 if not smtp_connection:
                     logger.error("Could not establish SMTP connection")
-                    self.email_queue.task_done()  # Mark task as done if we couldn't process it
+                    self._schedule_retry(email, "Could not establish SMTP connection")
+                    email_send_failures.labels(email.status).inc()
+                    db.session.commit()
                     continue
 
+                started = time.perf_counter()
                 try:
-                    # Send the email
-                    smtp_connection.send_message(email_task['message'])
-                    logger.info(f"Email sent to {email_task['recipient']}")
+                    try:
+                        smtp_connection.sendmail(email.sender, [email.recipient], email.raw_message)
+                    except SMTP_CONNECTION_ERRORS:
+                        # The session went stale mid-batch; reconnect and retry once
+                        self.smtp_pool.discard(smtp_connection)
+                        smtp_connection = self.smtp_pool.acquire()
+                        if not smtp_connection:
+                            raise
+                        smtp_connection.sendmail(email.sender, [email.recipient], email.raw_message)
+                    email_send_duration.observe(time.perf_counter() - started)
+                    email_sent.inc()
+                    email.status = EmailOutbox.SENT
+                    email.sent_at = utcnow()
+                    email.raw_message = None
+                    email.locked_by = None
+                    email.locked_until = None
+                    logger.info(f"Email sent to {email.recipient}")
                 except Exception as send_error:
                     logger.error(f"Failed to send email: {send_error}")
+                    self._schedule_retry(email, str(send_error))
+                    email_send_failures.labels(email.status).inc()
+                    if isinstance(send_error, SMTP_CONNECTION_ERRORS) and smtp_connection:
+                        self.smtp_pool.discard(smtp_connection)
+                        smtp_connection = None
+                # Record each outcome as it happens so a crash can't resend delivered mail
+                db.session.commit()
+        finally:
+            # Keep the session open for the next batch
+            if smtp_connection:
+                self.smtp_pool.release(smtp_connection)
+
+    def _retry_delay(self, attempts):
+        """Exponential backoff with jitter: a random delay in the upper half of the window."""
+        config = self.app.config
+        window = min(config['EMAIL_RETRY_MAX_DELAY'], config['EMAIL_RETRY_BASE_DELAY'] * 2 ** (attempts - 1))
+        return random.uniform(window / 2, window)
+
+    def _schedule_retry(self, email, error):
+        """Reschedule a failed email, or move it to the dead letters once it is out of attempts."""
+        email.last_error = error
+        email.locked_by = None
+        email.locked_until = None
+
+        if email.attempts >= self.app.config['EMAIL_MAX_ATTEMPTS']:
+            email.status = EmailOutbox.DEAD
+            email.next_attempt_at = None
+            logger.error(f"Email {email.id} to {email.recipient} moved to dead letters after {email.attempts} attempts")
+            return
+
+        delay = self._retry_delay(email.attempts)
+        email.next_attempt_at = utcnow() + timedelta(seconds=delay)
+        logger.warning(f"Email {email.id} to {email.recipient} will be retried in {delay:.0f}s")
+
+    def _seconds_until_next_retry(self):
+        """Seconds until the earliest scheduled retry, or None if no retry is scheduled."""
+        now = utcnow()
+        next_attempt_at = db.session.query(db.func.min(EmailOutbox.next_attempt_at)).filter(
+            EmailOutbox.status == EmailOutbox.PENDING,
+            EmailOutbox.next_attempt_at > now
+        ).scalar()
+        if next_attempt_at is None:
+            return None
+        return (next_attempt_at - now).total_seconds()
+
+    def _email_worker(self, worker_id):
+        """Background worker draining the email outbox in batches."""
+        with self.app.app_context():
+            while not self._stop_thread:
+                timeout = self.app.config['EMAIL_OUTBOX_POLL_INTERVAL']
+                try:
+                    batch = self._claim_batch(worker_id)
+                    if batch:
+                        self._deliver_batch(batch)
+                        continue
+
+                    next_retry = self._seconds_until_next_retry()
+                    if next_retry is not None:
+                        timeout = min(timeout, next_retry)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error in email worker: {e}")
+                    logger.error(traceback.format_exc())
                 finally:
-                    # Close the SMTP connection
-                    smtp_connection.quit()
-                    self.email_queue.task_done()  # Mark task as done after processing
+                    db.session.remove()
 
-            except Exception as e:
-                logger.error(f"Error in email worker: {e}")
-                logger.error(traceback.format_exc())
+                # Sleep until new mail is queued in this process, the next retry falls
+                # due or the poll interval elapses, which picks up mail queued by other workers
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
 
     def start_email_service(self):
-        """Start the email service background thread."""
-        if self.email_thread and self.email_thread.is_alive():
-            return
+        """Start the email service background threads."""
+        if self.app is None:
+            raise RuntimeError("EmailService.init_app() must be called before starting the service")
 
-        self._stop_thread = False
-        self.email_thread = Thread(target=self._email_worker, daemon=True)
-        self.email_thread.start()
-        logger.info("Email service started")
+        with self._start_lock:
+            if any(thread.is_alive() for thread in self.email_threads):
+                return
+
+            self._stop_thread = False
+            self._wakeup.clear()
+            self.email_threads = []
+            for _ in range(self.app.config['EMAIL_WORKER_THREADS']):
+                worker_id = f"{os.getpid()}-{uuid4().hex[:8]}"
+                thread = Thread(target=self._email_worker, args=(worker_id,), daemon=True)
+                thread.start()
+                self.email_threads.append(thread)
+        logger.info(f"Email service started with {len(self.email_threads)} worker thread(s)")
 
     def stop_email_service(self):
         """Gracefully stop the email service."""
         self._stop_thread = True
-        if self.email_thread:
-            self.email_thread.join()
+        self._wakeup.set()
+        for thread in self.email_threads:
+            thread.join()
+        self.email_threads = []
+        if self.smtp_pool:
+            self.smtp_pool.close_all()
         logger.info("Email service stopped")
 
-    def send_email(self, subject, recipient, html_body, attachments=None):
+    def send_email(self, subject, recipient, html_body, attachments=None, commit=True):
         """
         Queue an email for sending with optional attachments.
+
+        The email is written to the outbox table in the current database session,
+        so passing commit=False lets it be committed atomically with the caller's
+        own changes.
         
         Args:
             subject (str): Email subject
@@ -128,14 +347,22 @@ class EmailService:
                 - 'filename': name of the file
                 - 'content': file content as bytes
                 - 'mimetype': MIME type of the file (e.g., 'application/pdf')
+            commit (bool, optional): Commit the session after queueing. Defaults to True.
         
         Returns:
             bool: True if email was queued successfully, False otherwise
         """
+        # Only needed when queueing; the dispatcher sends the stored raw message
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.application import MIMEApplication
+
         try:
+            sender = current_app.config.get('MAIL_DEFAULT_SENDER')
+
             # Create multipart message
             message = MIMEMultipart()
-            message['From'] = current_app.config.get('MAIL_DEFAULT_SENDER')
+            message['From'] = sender
             message['To'] = recipient
             message['Subject'] = subject
             
@@ -149,14 +376,17 @@ class EmailService:
                     part.add_header('Content-Disposition', 'attachment', filename=attachment['filename'])
                     message.attach(part)
             
-            # Prepare email task
-            email_task = {
-                'message': message,
-                'recipient': recipient
-            }
-            
-            # Queue the email
-            self.email_queue.put(email_task)
+            # Queue the email in the outbox
+            db.session.add(EmailOutbox(
+                sender=sender,
+                recipient=recipient,
+                subject=subject,
+                raw_message=message.as_string()
+            ))
+
+            if commit:
+                db.session.commit()
+                self._wakeup.set()
             
             logger.info(f"Email to {recipient} queued successfully")
             return True
@@ -165,8 +395,53 @@ class EmailService:
             logger.error(traceback.format_exc())
             return False
 
+    def notify(self):
+        """Wake the dispatcher after the caller committed queued emails."""
+        self._wakeup.set()
+
+    def replay_dead_letters(self, ids=None):
+        """
+        Requeue dead-lettered emails for delivery.
+
+        Args:
+            ids (list, optional): Outbox ids to replay. Replays every dead letter if omitted.
+
+        Returns:
+            int: Number of emails requeued
+        """
+        query = EmailOutbox.query.filter(EmailOutbox.status == EmailOutbox.DEAD)
+        if ids is not None:
+            query = query.filter(EmailOutbox.id.in_(ids))
+
+        replayed = query.update({
+            EmailOutbox.status: EmailOutbox.PENDING,
+            EmailOutbox.attempts: 0,
+            EmailOutbox.next_attempt_at: None
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if replayed:
+            logger.info(f"Replaying {replayed} dead-lettered email(s)")
+            self._wakeup.set()
+        return replayed
+
+    def prune(self, older_than_days):
+        """
+        Delete sent and dead-lettered emails queued more than `older_than_days` ago.
+
+        Returns:
+            int: Number of emails deleted
+        """
+        cutoff = utcnow() - timedelta(days=older_than_days)
+        deleted = EmailOutbox.query.filter(
+            EmailOutbox.status.in_([EmailOutbox.SENT, EmailOutbox.DEAD]),
+            EmailOutbox.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
     def send_jobcard_notification(self, client_name, client_email, jobcard_id, 
-                                   problem_description, device_model, device_brand):
+                                   problem_description, device_model, device_brand, commit=True):
         """
         Send a jobcard notification email.
         
@@ -177,6 +452,7 @@ class EmailService:
             problem_description (str): Description of the problem
             device_model (str): Model of the device
             device_brand (str): Brand of the device
+            commit (bool, optional): Commit the session after queueing. Defaults to True.
         
         Returns:
             bool: True if email was queued successfully, False otherwise
@@ -216,7 +492,7 @@ class EmailService:
             </html>
             '''
             
-            result = self.send_email(subject, client_email, html_body)
+            result = self.send_email(subject, client_email, html_body, commit=commit)
             logger.info(f"Email sending result: {result}")
             return result
         except Exception as e:
@@ -224,5 +500,50 @@ class EmailService:
             logger.error(traceback.format_exc())
             return False
 
+    def send_jobcard_status_notification(self, client_name, client_email, jobcard_id, status,
+                                         device_model, device_brand, commit=True):
+        """
+        Send an email telling a client their jobcard moved to a new status.
+        
+        Args:
+            client_name (str): Name of the client
+            client_email (str): Email of the client
+            jobcard_id (int): ID of the jobcard
+            status (str): The jobcard's new status
+            device_model (str): Model of the device
+            device_brand (str): Brand of the device
+            commit (bool, optional): Commit the session after queueing. Defaults to True.
+        
+        Returns:
+            bool: True if email was queued successfully, False otherwise
+        """
+        status_label = status.replace('_', ' ').title()
+        subject = f'Job Card #{jobcard_id} is now {status_label} - Laptop Care'
+
+        html_body = f'''
+            <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                <div style="max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f4f4f4;">
+                    <h2 style="color: #2c3e50;">Job Card Status Update</h2>
+                    <p>Dear {client_name},</p>
+                    
+                    <p>The status of the job card for your {device_brand} {device_model} has changed:</p>
+                    
+                    <div style="margin: 20px 0; padding: 15px; border: 1px solid #ddd; border-radius: 5px; background-color: white;">
+                        <p><strong>Job Card Number:</strong> #{jobcard_id}</p>
+                        <p><strong>New Status:</strong> {status_label}</p>
+                    </div>
+                    
+                    <p>If you have any questions, please don't hesitate to contact us.</p>
+                    
+                    <p style="margin-top: 20px; font-style: italic;">Best regards,<br>
+                    Laptop Care Team</p>
+                </div>
+            </body>
+            </html>
+            '''
+
+        return self.send_email(subject, client_email, html_body, commit=commit)
+
 # Create a global email service instance
 email_service = EmailService()
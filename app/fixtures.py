@@ -0,0 +1,254 @@
+"""
+Deterministic fixture data at production volumes, for load and benchmark runs.
+
+Names, addresses, models and problem descriptions are drawn once from Faker
+into small pools. Rows are then generated a chunk at a time by sampling whole
+columns from those pools with one seeded random.Random, so the same seed and
+counts always give the same data. Chunks are loaded with COPY on Postgres and
+with executemany elsewhere, bypassing the ORM. The tables the mapper events
+would normally maintain (device serials, phone numbers, search documents) are
+filled in bulk alongside. The jobcard change log is left empty because seeded
+rows are not changes.
+"""
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+from faker import Faker
+from sqlalchemy import func, text
+from .models import db, bcrypt, Client, Device, DeviceSerial, Users, Jobcards, JobcardSearchDocument
+from .search import build_documents
+
+# Distinct values drawn from Faker for each generated text column
+POOL_SIZE = 1000
+# Seeded timestamps fall in the DATE_RANGE_DAYS days before this fixed date, so they don't depend on today
+ANCHOR_DATE = datetime(2025, 1, 1)
+DATE_RANGE_DAYS = 730
+
+ROLES = ['admin', 'clerk', 'technician', 'technician', 'technician']
+STATUSES = ['pending', 'in_progress', 'completed', 'cancelled']
+STORAGE = ['256GB SSD', '512GB SSD', '1TB SSD', '500GB HDD', '1TB HDD']
+MEMORY = ['4GB DDR4', '8GB DDR4', '16GB DDR4', '16GB DDR5', '32GB DDR5']
+BRANDS = ['Dell', 'HP', 'Lenovo', 'Apple', 'Asus', 'Acer', 'Microsoft', 'Toshiba']
+PROBLEMS = [
+    'Battery not charging', 'Screen flickering', 'Keyboard malfunction', 'Overheating and fan noise',
+    'No power', 'Cracked screen', 'Slow boot', 'Wi-Fi keeps dropping', 'Liquid damage',
+    'Hinge broken', 'Trackpad not responding', 'Blue screen on startup', 'Charging port loose'
+]
+DIAGNOSTICS = ['Replaced battery', 'Replaced screen', 'Cleaned fan', 'Reinstalled OS', 'Replaced keyboard', None]
+
+
+class FixtureGenerator:
+    """Generates chunks of rows for each table from one seeded random stream."""
+
+    def __init__(self, seed, password):
+        self.random = random.Random(seed)
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.names = [fake.name() for _ in range(POOL_SIZE)]
+        self.addresses = [fake.address().replace('\n', ', ') for _ in range(POOL_SIZE)]
+        self.domains = [fake.free_email_domain() for _ in range(20)]
+        self.models = [f'{fake.word().title()} {self.random.randint(1, 99)}' for _ in range(100)]
+        self.problems = [f'{problem} - {fake.sentence(nb_words=5)}'[:100] for problem in PROBLEMS for _ in range(20)]
+        # One bcrypt hash shared by every seeded user, instead of a deliberately slow hash per row
+        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+
+    def _timestamps(self, count):
+        seconds = [self.random.randrange(DATE_RANGE_DAYS * 86400) for _ in range(count)]
+        return [ANCHOR_DATE - timedelta(seconds=offset) for offset in seconds]
+
+    def clients(self, first_id, count):
+        sample = self.random.choices
+        names = sample(self.names, k=count)
+        mailboxes = [name.lower().replace(' ', '.').replace("'", '') for name in names]
+        domains = sample(self.domains, k=count)
+        phones = [f'07{number:08d}' for number in (self.random.randrange(10 ** 8) for _ in range(count))]
+        addresses = sample(self.addresses + [None], k=count)
+        updated = self._timestamps(count)
+        return [
+            {
+                'id': client_id,
+                'name': name,
+                'email': f'{mailbox}.{client_id}@{domain}',
+                'phone_number': phone,
+                'phone_normalized': Client.normalize_phone(phone),
+                'address': address,
+                'version': 1,
+                'updated_at': updated_at
+            }
+            for client_id, name, mailbox, domain, phone, address, updated_at
+            in zip(range(first_id, first_id + count), names, mailboxes, domains, phones, addresses, updated)
+        ]
+
+    def devices(self, first_id, count, client_ids):
+        sample = self.random.choices
+        client_ids = sample(client_ids, k=count)
+        brands = sample(BRANDS, k=count)
+        models = sample(self.models, k=count)
+        storage = sample(STORAGE, k=count)
+        memory = sample(MEMORY, k=count)
+        warranty = sample(['True', 'False'], k=count)
+        updated = self._timestamps(count)
+        return [
+            {
+                'id': device_id,
+                'device_serial_number': f'SN{device_id:010d}',
+                'device_model': model,
+                'brand': brand,
+                'hdd_or_ssd': drive,
+                'hdd_or_ssd_serial_number': f'DRV{device_id:010d}',
+                'memory': ram,
+                'memory_serial_number': f'MEM{device_id:010d}',
+                'battery': f'{brand} battery',
+                'battery_serial_number': f'BAT{device_id:010d}',
+                'adapter': f'{brand} adapter',
+                'adapter_serial_number': f'ADP{device_id:010d}',
+                'client_id': client_id,
+                'warranty_status': warranty_status,
+                'version': 1,
+                'updated_at': updated_at
+            }
+            for device_id, client_id, brand, model, drive, ram, warranty_status, updated_at
+            in zip(range(first_id, first_id + count), client_ids, brands, models, storage, memory, warranty, updated)
+        ]
+
+    @staticmethod
+    def device_serials(devices):
+        return [
+            {'serial_number': DeviceSerial.normalize(device[attribute]), 'component': component, 'device_id': device['id']}
+            for device in devices
+            for component, attribute in Device.SERIAL_COMPONENTS.items()
+        ]
+
+    def users(self, first_id, count):
+        roles = self.random.choices(ROLES, k=count)
+        return [
+            {
+                'id': user_id,
+                'email': f'user{user_id}@laptopcare.test',
+                'username': f"{self.random.choice(self.names).split()[0].lower()}{user_id}",
+                'password': self.password_hash,
+                'role': role,
+                'version': 1,
+                'updated_at': ANCHOR_DATE
+            }
+            for user_id, role in zip(range(first_id, first_id + count), roles)
+        ]
+
+    def jobcards(self, first_id, count, device_ids, technician_ids):
+        sample = self.random.choices
+        device_ids = sample(device_ids, k=count)
+        problems = sample(self.problems, k=count)
+        statuses = sample(STATUSES, k=count)
+        diagnostics = sample(DIAGNOSTICS, k=count)
+        costs = [self.random.choice((None, self.random.randrange(500, 50000, 50))) for _ in range(count)]
+        technicians = sample(technician_ids + [None], k=count) if technician_ids else [None] * count
+        timestamps = self._timestamps(count)
+        return [
+            {
+                'id': jobcard_id,
+                'problem_description': problem,
+                'status': status,
+                'device_id': device_id,
+                'diagnostic': diagnostic if status != 'pending' else None,
+                'timestamp': timestamp,
+                'cost': cost if status == 'completed' else None,
+                'assigned_technician_id': technician,
+                'version': 1,
+                'updated_at': timestamp
+            }
+            for jobcard_id, device_id, problem, status, diagnostic, cost, technician, timestamp
+            in zip(range(first_id, first_id + count), device_ids, problems, statuses, diagnostics, costs,
+                   technicians, timestamps)
+        ]
+
+
+def load_rows(connection, table, rows):
+    """Bulk-load rows (dicts with the same keys) into a table, with COPY on Postgres."""
+    if not rows:
+        return
+    columns = list(rows[0])
+    if connection.dialect.name == 'postgresql':
+        # Unquoted empty CSV fields are NULL; the generator never produces empty strings
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def _next_id(connection, model):
+    return (connection.execute(db.select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(connection):
+    # Explicit ids were loaded, so move each serial past them
+    for model in (Client, Device, DeviceSerial, Users, Jobcards):
+        table = model.__tablename__
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"
+        ))
+
+
+def seed_database(clients, devices, users, jobcards, seed=42, chunk_size=10000, password='password', echo=print):
+    """
+    Generate and bulk-load fixture rows, committing after every chunk.
+
+    New rows get ids after any existing ones. Devices are assigned to the
+    seeded clients, jobcards to the seeded devices and to any technician.
+
+    :return: Mapping of table name to rows inserted
+    """
+    if devices and not clients:
+        raise ValueError('Devices need clients; pass --clients as well')
+    if jobcards and not devices:
+        raise ValueError('Jobcards need devices; pass --devices as well')
+
+    generator = FixtureGenerator(seed, password)
+    engine = db.engine
+    counts = {}
+
+    def load(name, model, count, make_chunk, extra=None):
+        with engine.connect() as connection:
+            first_id = _next_id(connection, model)
+        started = time.perf_counter()
+        for offset in range(0, count, chunk_size):
+            rows = make_chunk(first_id + offset, min(chunk_size, count - offset))
+            with engine.begin() as connection:
+                load_rows(connection, model.__table__, rows)
+                if extra is not None:
+                    extra(connection, rows)
+        counts[name] = count
+        if count:
+            elapsed = time.perf_counter() - started
+            echo(f'{name}: {count} row(s) in {elapsed:.1f}s ({count / elapsed:,.0f}/s)')
+        return list(range(first_id, first_id + count))
+
+    def load_serials(connection, rows):
+        load_rows(connection, DeviceSerial.__table__, generator.device_serials(rows))
+
+    def load_search_documents(connection, rows):
+        condition = Jobcards.id.between(rows[0]['id'], rows[-1]['id'])
+        load_rows(connection, JobcardSearchDocument.__table__, build_documents(connection, condition))
+
+    client_ids = load('clients', Client, clients, generator.clients)
+    load('users', Users, users, generator.users)
+    device_ids = load('devices', Device, devices, lambda first, n: generator.devices(first, n, client_ids),
+                      load_serials)
+
+    with engine.connect() as connection:
+        technician_ids = list(connection.execute(
+            db.select(Users.id).where(Users.role == 'technician').order_by(Users.id)
+        ).scalars())
+    load('jobcards', Jobcards, jobcards,
+         lambda first, n: generator.jobcards(first, n, device_ids, technician_ids), load_search_documents)
+
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as connection:
+            _reset_sequences(connection)
+    return counts
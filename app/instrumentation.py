@@ -0,0 +1,184 @@
+"""
+Per-request SQL instrumentation.
+
+Cursor events on the engine time every statement. Inside a request the
+statement count and database time are added up, returned to the client in a
+Server-Timing header and aggregated per endpoint. Statements slower than
+SLOW_QUERY_THRESHOLD_MS are logged wherever they run, with the values of
+their bound parameters replaced by their types.
+
+Only the work done before a response is returned is attributed to its
+request, so the rows read while streaming an export or the change feed
+are not counted.
+"""
+import logging
+import time
+from collections import defaultdict
+from threading import Lock
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text kept for the slow query log and stats
+MAX_STATEMENT_LENGTH = 1000
+
+
+def redact_parameters(parameters, executemany=False):
+    """Replace bound parameter values with their types, so logs never hold client data."""
+    if executemany:
+        return f'<{len(parameters)} parameter sets>'
+    if isinstance(parameters, dict):
+        return {key: _placeholder(value) for key, value in parameters.items()}
+    return tuple(_placeholder(value) for value in parameters or ())
+
+
+def _placeholder(value):
+    return 'NULL' if value is None else f'<{type(value).__name__}>'
+
+
+def _shorten(statement):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= MAX_STATEMENT_LENGTH else statement[:MAX_STATEMENT_LENGTH] + '...'
+
+
+def _new_endpoint_stats():
+    return {
+        'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0, 'max_db_time': 0.0,
+        'duration': 0.0, 'max_duration': 0.0, 'slow_queries': 0, 'slowest_statement': None, 'slowest_time': 0.0
+    }
+
+
+class QueryInstrumentation:
+    """Counts and times SQL statements per request and keeps per-endpoint totals for this process."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_threshold = None
+        self.server_timing = False
+        self._endpoints = defaultdict(_new_endpoint_stats)
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['QUERY_INSTRUMENTATION_ENABLED']
+        self.slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000
+        self.server_timing = app.config['SERVER_TIMING_ENABLED']
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _discard_failed_statement)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def record_statement(self, statement, parameters, executemany, elapsed):
+        """Add one executed statement to the current request and log it if slow."""
+        slow = elapsed >= self.slow_query_threshold
+        if slow:
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f} ms): {_shorten(statement)} "
+                f"parameters={redact_parameters(parameters, executemany)}"
+            )
+        if has_request_context() and 'query_count' in g:
+            g.query_count += 1
+            g.query_time += elapsed
+            g.slow_query_count += slow
+            if elapsed > g.slowest_query[1]:
+                g.slowest_query = (statement, elapsed)
+
+    def stats(self):
+        """Per-endpoint request, query and timing totals, busiest database user first."""
+        with self._lock:
+            endpoints = {endpoint: dict(values) for endpoint, values in self._endpoints.items()}
+        result = []
+        for endpoint, values in endpoints.items():
+            requests = values['requests']
+            result.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'queries_per_request': round(values['queries'] / requests, 2),
+                'max_queries': values['max_queries'],
+                'db_time_ms': round(values['db_time'] * 1000, 2),
+                'avg_db_time_ms': round(values['db_time'] * 1000 / requests, 2),
+                'max_db_time_ms': round(values['max_db_time'] * 1000, 2),
+                'avg_duration_ms': round(values['duration'] * 1000 / requests, 2),
+                'max_duration_ms': round(values['max_duration'] * 1000, 2),
+                'slow_queries': values['slow_queries'],
+                'slowest_statement': values['slowest_statement'],
+                'slowest_statement_ms': round(values['slowest_time'] * 1000, 2)
+            })
+        result.sort(key=lambda item: item['db_time_ms'], reverse=True)
+        return {
+            'enabled': self.enabled,
+            'slow_query_threshold_ms': self.slow_query_threshold * 1000 if self.enabled else None,
+            'endpoints': result
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+        g.slow_query_count = 0
+        g.slowest_query = (None, 0.0)
+
+    def _finish_request(self, response):
+        if 'query_count' not in g:
+            return response
+        duration = time.perf_counter() - g.request_started
+        rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+        endpoint = f'{request.method} {rule}'
+
+        with self._lock:
+            values = self._endpoints[endpoint]
+            values['requests'] += 1
+            values['queries'] += g.query_count
+            values['max_queries'] = max(values['max_queries'], g.query_count)
+            values['db_time'] += g.query_time
+            values['max_db_time'] = max(values['max_db_time'], g.query_time)
+            values['duration'] += duration
+            values['max_duration'] = max(values['max_duration'], duration)
+            values['slow_queries'] += g.slow_query_count
+            statement, elapsed = g.slowest_query
+            if elapsed > values['slowest_time']:
+                values['slowest_statement'] = _shorten(statement)
+                values['slowest_time'] = elapsed
+
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'db;desc="{g.query_count} queries";dur={g.query_time * 1000:.2f}, app;dur={duration * 1000:.2f}'
+            )
+        return response
+
+
+query_instrumentation = QueryInstrumentation()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append((cursor, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, started = conn.info['query_started'].pop()
+    query_instrumentation.record_statement(statement, parameters, executemany, time.perf_counter() - started)
+
+
+def _discard_failed_statement(exception_context):
+    # A failed statement never reaches after_cursor_execute. Only statements that got as far
+    # as their cursor were timed, so drop the timer only if it belongs to this statement's cursor
+    connection = exception_context.connection
+    context = exception_context.execution_context
+    if connection is None or context is None:
+        return
+    pending = connection.info.get('query_started')
+    if pending and pending[-1][0] is context.cursor:
+        pending.pop()
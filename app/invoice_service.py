@@ -0,0 +1,778 @@
+import contextlib
+import logging
+import multiprocessing
+import os
+import io
+import json
+import re
+import time
+import traceback
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from hashlib import sha256
+from functools import lru_cache, partial
+from itertools import islice
+from threading import Event, Lock
+from types import SimpleNamespace
+from uuid import uuid4
+from .models import db, Jobcards, InvoiceJob, utcnow
+from .email_service import email_service
+from .metrics import invoice_render_duration
+
+logger = logging.getLogger(__name__)
+
+
+# Cache keys are SHA-256 hex digests; anything else is rejected before touching the disk
+CACHE_KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+# Once the disk cache passes its limit it is trimmed to this fraction of it, so trims are rare
+DISK_CACHE_TRIM_RATIO = 0.9
+
+
+class InvoiceQueueFull(Exception):
+    """Raised when the render pool already has the maximum number of pending jobs."""
+
+
+class InvoiceRenderUnavailable(Exception):
+    """Raised when a queued job can't be handed to the render pool; the job has been marked failed."""
+
+    def __init__(self, job, message):
+        super().__init__(message)
+        self.job = job
+
+
+def render_pool(max_workers):
+    """
+    A process pool for rendering invoices.
+
+    Workers are spawned rather than forked: the web process runs the email
+    dispatcher threads and holds pooled database connections, and a forked
+    child could inherit a lock held by another thread or share a socket.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+COMPANY_DETAILS = (
+    ("Laptop Care Service",),
+    ("Nairobi, Kenya",),
+    ("Phone: +254 (0) 700 000 000",),
+    ("Email: support@laptopcare.com",)
+)
+ITEMS_HEADER = ('Type', 'Description', 'Quantity', 'Unit Price', 'Total')
+
+
+@lru_cache(maxsize=None)
+def invoice_template():
+    """
+    Build the invoice template once, on the first render.
+
+    ReportLab is imported here rather than at module load so that processes
+    which never render an invoice don't pay for it. These objects are only
+    read while rendering; flowables are created per invoice because ReportLab
+    keeps layout state on them.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import TableStyle
+
+    return SimpleNamespace(
+        styles=getSampleStyleSheet(),
+        page=dict(pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18),
+        company_details_widths=(6*inch,),
+        company_details_style=TableStyle([
+            ('ALIGN', (0,0), (-1,-1), 'RIGHT'),
+            ('FONTNAME', (0,0), (-1,-1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,-1), 10),
+        ]),
+        client_info_widths=(3*inch, 3*inch),
+        client_info_style=TableStyle([
+            ('BACKGROUND', (0,0), (1,0), colors.grey),
+            ('TEXTCOLOR', (0,0), (1,0), colors.whitesmoke),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 12),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 12),
+            ('BACKGROUND', (0,1), (-1,-1), colors.beige),
+        ]),
+        items_widths=(1*inch, 3*inch, 1*inch, 1.5*inch, 1.5*inch),
+        items_style=TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.grey),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 12),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 12),
+            ('BACKGROUND', (0,1), (-1,-1), colors.beige),
+            ('GRID', (0,0), (-1,-1), 1, colors.black)
+        ])
+    )
+
+
+def generate_invoice_pdf(invoice_data):
+    """
+    Generate a PDF invoice from the provided invoice data
+    
+    :param invoice_data: Dictionary containing invoice details
+    :return: BytesIO object with PDF content
+    """
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph
+    template = invoice_template()
+
+    # Create a buffer for the PDF
+    buffer = io.BytesIO()
+    
+    # Create the PDF document
+    doc = SimpleDocTemplate(buffer, **template.page)
+    
+    # Company Header and Details
+    elements = [
+        Paragraph("Laptop Care Service", template.styles['Title']),
+        Paragraph("Invoice", template.styles['Heading2']),
+        Table([list(row) for row in COMPANY_DETAILS], colWidths=template.company_details_widths, style=template.company_details_style)
+    ]
+    
+    # Client Information
+    client_info = [
+        ["Bill To:", "Invoice Details:"],
+        [invoice_data['client_name'], f"Invoice Number: {invoice_data['jobcard_id']}"],
+        [invoice_data['client_email'], f"Date: {invoice_data.get('invoice_date') or datetime.now().strftime('%Y-%m-%d')}"],
+        [invoice_data['device_info'], ""]
+    ]
+    elements.append(Table(client_info, colWidths=template.client_info_widths, style=template.client_info_style))
+    
+    # Invoice Items
+    items_data = [list(ITEMS_HEADER)]
+    total_amount = 0
+    for item in invoice_data['items']:
+        # Default quantity to 1 if not specified
+        quantity = item.get('quantity', 1)
+        unit_price = float(item['price'])
+        item_total = quantity * unit_price
+        total_amount += item_total
+        
+        items_data.append([
+            item['type'].capitalize(), 
+            item['description'], 
+            str(quantity),
+            f"Ksh {unit_price:,.2f}", 
+            f"Ksh {item_total:,.2f}"
+        ])
+    
+    # Add total row
+    items_data.append(['', '', '', 'Total:', f"Ksh {total_amount:,.2f}"])
+    elements.append(Table(items_data, colWidths=template.items_widths, style=template.items_style))
+    
+    # Additional Notes
+    elements.append(Paragraph("Thank you for your business!", template.styles['Normal']))
+    
+    # Build PDF
+    doc.build(elements)
+    
+    # Move buffer pointer to the beginning
+    buffer.seek(0)
+    return buffer
+
+
+def render_invoice_pdf(invoice_data):
+    """Render an invoice to PDF bytes in this process, recording how long it took."""
+    with invoice_render_duration.time():
+        return generate_invoice_pdf(invoice_data).getvalue()
+
+
+def render_invoice_pdf_timed(invoice_data):
+    """
+    Render an invoice to PDF bytes; runs inside the render worker processes.
+
+    Metrics recorded in a worker process never reach /metrics, so the render
+    time is returned with the PDF for the web process to record through
+    `rendered_pdf`.
+    """
+    started = time.perf_counter()
+    pdf_bytes = generate_invoice_pdf(invoice_data).getvalue()
+    return pdf_bytes, time.perf_counter() - started
+
+
+def rendered_pdf(future):
+    """Return the PDF from a render_invoice_pdf_timed future, recording its render time."""
+    pdf_bytes, seconds = future.result()
+    if seconds is not None:
+        invoice_render_duration.observe(seconds)
+    return pdf_bytes
+
+
+def invoice_email_html(invoice_data):
+    """Build the HTML body of the email that carries an invoice."""
+    return f'''
+            <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                <div style="max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f4f4f4;">
+                    <h2 style="color: #2c3e50;">Invoice for Job Card #{invoice_data['jobcard_id']}</h2>
+                    <p>Dear {invoice_data['client_name']},</p>
+                    
+                    <p>Please find attached the invoice for your recent laptop repair service.</p>
+                    
+                    <div style="margin: 20px 0; padding: 15px; border: 1px solid #ddd; border-radius: 5px; background-color: white;">
+                        <p><strong>Job Card ID:</strong> {invoice_data['jobcard_id']}</p>
+                        <p><strong>Device:</strong> {invoice_data['device_info']}</p>
+                        <p><strong>Total Cost:</strong> Ksh {float(invoice_data['total']):,.2f}</p>
+                    </div>
+                    
+                    <p>Thank you for choosing Laptop Care Service!</p>
+                </div>
+            </body>
+            </html>
+            '''
+
+
+def invoice_filename(invoice_data):
+    return f"invoice_{invoice_data['jobcard_id']}.pdf"
+
+
+def email_invoice(invoice_data, pdf_bytes, commit=True):
+    """Queue a rendered invoice to the client by email."""
+    return email_service.send_email(
+        subject=f"Invoice for Job Card #{invoice_data['jobcard_id']}",
+        recipient=invoice_data['client_email'],
+        html_body=invoice_email_html(invoice_data),
+        attachments=[{
+            'filename': invoice_filename(invoice_data),
+            'content': pdf_bytes,
+            'subtype': 'pdf'
+        }],
+        commit=commit
+    )
+
+
+def normalize_invoice(invoice_data, invoice_date=None):
+    """
+    Reduce an invoice payload to exactly what ends up on the rendered PDF.
+
+    Fields that don't affect the document (such as the client-supplied total) are
+    dropped and item defaults are filled in, so equivalent payloads normalize to
+    the same dictionary. The invoice date is pinned so it is part of the cache key.
+    """
+    return {
+        'jobcard_id': str(invoice_data['jobcard_id']),
+        'client_name': invoice_data['client_name'],
+        'client_email': invoice_data['client_email'],
+        'device_info': invoice_data['device_info'],
+        'items': [{
+            'type': item['type'],
+            'description': item['description'],
+            'quantity': item.get('quantity', 1),
+            'price': float(item['price'])
+        } for item in invoice_data['items']],
+        'invoice_date': invoice_date or datetime.now().strftime('%Y-%m-%d')
+    }
+
+
+def invoice_cache_key(normalized_invoice):
+    """Content address of a normalized invoice: the SHA-256 of its canonical JSON."""
+    canonical = json.dumps(normalized_invoice, sort_keys=True, separators=(',', ':'), default=str)
+    return sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class InvoiceCache:
+    """
+    Two-tier cache of rendered invoice PDFs keyed by content hash.
+
+    A per-process LRU keeps the most recently served PDFs in memory; every PDF is
+    also written to a directory shared by all workers, which is trimmed oldest-first
+    once it grows past its size limit. Each process keeps a running estimate of the
+    directory's size and only scans it when the estimate passes the limit; the scan
+    also corrects the estimate for what other workers wrote.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.memory_limit = 0
+        self.disk_limit = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = Lock()
+        self._evict_lock = Lock()
+
+    def init_app(self, app):
+        self.directory = app.config['INVOICE_CACHE_DIR'] or os.path.join(app.root_path, 'invoices', 'cache')
+        self.memory_limit = app.config['INVOICE_CACHE_MEMORY_BYTES']
+        self.disk_limit = app.config['INVOICE_CACHE_DISK_BYTES']
+        self._disk_bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Return the cached PDF bytes for `key`, or None."""
+        if not CACHE_KEY_PATTERN.fullmatch(key):
+            return None
+
+        with self._lock:
+            pdf_bytes = self._memory.get(key)
+            if pdf_bytes is not None:
+                self._memory.move_to_end(key)
+                return pdf_bytes
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                pdf_bytes = f.read()
+            # Mark the file as recently used for disk eviction
+            os.utime(path)
+        except OSError:
+            return None
+
+        self._remember(key, pdf_bytes)
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        """Store PDF bytes under `key` in both tiers; a failed disk write is logged, not raised."""
+        self._remember(key, pdf_bytes)
+        try:
+            added = self._write(key, pdf_bytes)
+        except OSError as e:
+            logger.warning(f"Could not write invoice {key} to the disk cache: {e}")
+            return
+        self._track_disk_usage(added)
+
+    def _write(self, key, pdf_bytes):
+        """Atomically write one PDF to the directory; returns the change in the directory's size."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Unique per call: the threads of a worker share its pid, and may store the same invoice at once
+        tmp_path = f'{path}.{uuid4().hex}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf_bytes)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        finally:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+        return len(pdf_bytes) - replaced
+
+    def _track_disk_usage(self, added):
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += added
+            over_limit = self._disk_bytes is None or self._disk_bytes > self.disk_limit
+        if over_limit:
+            self._evict_from_disk()
+
+    def _remember(self, key, pdf_bytes):
+        if len(pdf_bytes) > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = pdf_bytes
+            self._memory_bytes += len(pdf_bytes)
+            while self._memory_bytes > self.memory_limit:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _evict_from_disk(self):
+        """Measure the directory and, if it is over the limit, delete the least recently used PDFs."""
+        # One scan per process at a time; other writers carry on with their estimate
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            if total > self.disk_limit:
+                target = self.disk_limit * DISK_CACHE_TRIM_RATIO
+                for _, size, path in sorted(entries):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                    except OSError:
+                        pass
+            with self._lock:
+                self._disk_bytes = total
+        finally:
+            self._evict_lock.release()
+
+
+invoice_cache = InvoiceCache()
+
+
+def get_invoice_pdf(invoice_data):
+    """
+    Return the rendered PDF for an invoice, rendering it only on a cache miss.
+
+    :param invoice_data: Dictionary containing invoice details
+    :return: Tuple of (pdf_bytes, cache_key)
+    """
+    normalized = normalize_invoice(invoice_data)
+    key = invoice_cache_key(normalized)
+    pdf_bytes = invoice_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = render_invoice_pdf(normalized)
+        invoice_cache.put(key, pdf_bytes)
+    return pdf_bytes, key
+
+
+def invoice_data_for_jobcards(jobcard_ids):
+    """
+    Build invoice payloads for jobcards from their stored details.
+
+    Each jobcard is billed as a single repair line at its recorded cost.
+
+    :param jobcard_ids: Ids of the jobcards to invoice
+    :return: Dictionary mapping jobcard id to invoice data
+    """
+    rows = Jobcards.query_with_details().filter(Jobcards.id.in_(jobcard_ids)).all()
+    return {
+        row.id: {
+            'jobcard_id': row.id,
+            'client_name': row.client_name,
+            'client_email': row.client_email,
+            'device_info': f'{row.device_brand} {row.device_model}',
+            'items': [{
+                'type': 'repair',
+                'description': row.diagnostic or row.problem_description,
+                'quantity': 1,
+                'price': row.cost or 0
+            }],
+            'total': row.cost or 0
+        }
+        for row in rows
+    }
+
+
+class _ZipStream:
+    """Write-only file object that collects zip output so it can be yielded in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _render_in_window(to_render, submit, window):
+    """
+    Yield (jobcard_id, key, future) for each invoice in `to_render` as its render finishes.
+
+    At most `window` renders are submitted at a time, so a batch sharing a pool
+    can't queue ahead of everything else on it. Renders still queued when the
+    caller stops iterating are cancelled.
+    """
+    queued = iter(to_render.items())
+    pending = {}
+    try:
+        while True:
+            for jobcard_id, (normalized, key) in islice(queued, window - len(pending)):
+                try:
+                    future = submit(normalized)
+                except RuntimeError as e:
+                    # The pool is broken or shutting down; fail this invoice, not the archive
+                    future = Future()
+                    future.set_exception(e)
+                pending[future] = (jobcard_id, key)
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobcard_id, key = pending.pop(future)
+                yield jobcard_id, key, future
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def stream_invoice_zip(jobcard_ids, send_emails=True, max_workers=None, submit=None):
+    """
+    Render invoices for many jobcards and yield a ZIP archive of them in chunks.
+
+    Cached invoices are written first; the rest are rendered across a process
+    pool and added to the archive in the order they finish. A manifest.json
+    listing rendered, missing and failed jobcards closes the archive. When
+    `send_emails` is set, every invoice email is queued in one transaction.
+
+    :param jobcard_ids: Ids of the jobcards to invoice
+    :param send_emails: Queue each rendered invoice to its client
+    :param max_workers: Renders to run at once; defaults to every core
+    :param submit: Queues one normalized invoice on an existing pool and returns its future.
+        Without it, a pool of `max_workers` processes is started for this batch.
+    """
+    max_workers = max_workers or os.cpu_count()
+    invoices = invoice_data_for_jobcards(jobcard_ids)
+    manifest = {
+        'rendered': [],
+        'missing': [jobcard_id for jobcard_id in jobcard_ids if jobcard_id not in invoices],
+        'failed': {}
+    }
+    rendered = {}
+    stream = _ZipStream()
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        def add(jobcard_id, pdf_bytes):
+            archive.writestr(invoice_filename(invoices[jobcard_id]), pdf_bytes)
+            rendered[jobcard_id] = pdf_bytes
+            manifest['rendered'].append(jobcard_id)
+            return stream.drain()
+
+        to_render = {}
+        for jobcard_id, invoice_data in invoices.items():
+            normalized = normalize_invoice(invoice_data)
+            key = invoice_cache_key(normalized)
+            cached = invoice_cache.get(key)
+            if cached is not None:
+                yield add(jobcard_id, cached)
+            else:
+                to_render[jobcard_id] = (normalized, key)
+
+        if to_render:
+            with contextlib.ExitStack() as stack:
+                if submit is None:
+                    executor = stack.enter_context(render_pool(max_workers))
+                    submit = partial(executor.submit, render_invoice_pdf_timed)
+                for jobcard_id, key, future in _render_in_window(to_render, submit, max_workers):
+                    try:
+                        pdf_bytes = rendered_pdf(future)
+                    except Exception as e:
+                        logger.error(f"Batch invoice for jobcard {jobcard_id} failed: {e}")
+                        manifest['failed'][jobcard_id] = str(e)
+                        continue
+                    invoice_cache.put(key, pdf_bytes)
+                    yield add(jobcard_id, pdf_bytes)
+
+        if send_emails and rendered:
+            for jobcard_id, pdf_bytes in rendered.items():
+                email_invoice(invoices[jobcard_id], pdf_bytes, commit=False)
+            db.session.commit()
+            email_service.notify()
+            manifest['emails_queued'] = len(rendered)
+
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+
+    yield stream.drain()
+
+
+class InvoiceService:
+    """Render invoices in a bounded process pool and track each job in the database."""
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._executor_lock = Lock()
+        self._pending = 0
+        # Completion events for jobs submitted by this process, used by long polls
+        self._done_events = {}
+
+    def init_app(self, app):
+        self.app = app
+        invoice_cache.init_app(app)
+
+    @property
+    def invoices_dir(self):
+        return os.path.join(self.app.root_path, 'invoices')
+
+    def _get_executor(self):
+        # The pool is created on first use so importing the app never forks workers
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = render_pool(self.app.config['INVOICE_RENDER_WORKERS'])
+            return self._executor
+
+    def _replace_executor(self, broken):
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_render(self, normalized):
+        executor = self._get_executor()
+        try:
+            return executor.submit(render_invoice_pdf_timed, normalized)
+        except BrokenProcessPool:
+            # A render process died (killed for memory, or crashed in ReportLab); start a fresh pool
+            logger.warning("Invoice render pool is broken; replacing it")
+            self._replace_executor(executor)
+            return self._get_executor().submit(render_invoice_pdf_timed, normalized)
+
+    def _fail_job(self, job, error):
+        try:
+            job.status = InvoiceJob.FAILED
+            job.error = str(error)
+            job.completed_at = utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not record invoice job {job.id}: {e}")
+        done = self._done_events.pop(job.id, None)
+        if done:
+            done.set()
+
+    def submit(self, invoice_data):
+        """
+        Queue an invoice for rendering.
+
+        :param invoice_data: Dictionary containing invoice details
+        :return: The InvoiceJob tracking the render
+        :raises InvoiceQueueFull: If too many renders are already pending
+        :raises InvoiceRenderUnavailable: If the render pool can't take the job
+        """
+        with self._executor_lock:
+            if self._pending >= self.app.config['INVOICE_MAX_PENDING_JOBS']:
+                raise InvoiceQueueFull("Too many invoices are being rendered, try again shortly")
+            self._pending += 1
+
+        job = None
+        try:
+            normalized = normalize_invoice(invoice_data)
+            key = invoice_cache_key(normalized)
+            new_job = InvoiceJob(id=uuid4().hex, jobcard_id=normalized['jobcard_id'], status=InvoiceJob.QUEUED)
+            db.session.add(new_job)
+            db.session.commit()
+            job = new_job
+
+            self._done_events[job.id] = Event()
+            cached = invoice_cache.get(key)
+            if cached is not None:
+                # Already rendered: finish the job straight away without using the pool
+                future = Future()
+                # Nothing was rendered, so there's no render time to record
+                future.set_result((cached, None))
+            else:
+                try:
+                    future = self._submit_render(normalized)
+                except RuntimeError as e:
+                    # The replacement pool broke too, or the service is shutting down
+                    raise InvoiceRenderUnavailable(job, f"Invoice rendering is unavailable: {e}") from e
+        except Exception as e:
+            with self._executor_lock:
+                self._pending -= 1
+            # Don't leave a committed job queued forever
+            if job is not None:
+                self._fail_job(job, e)
+            raise
+
+        future.add_done_callback(partial(self._finish_job, job.id, invoice_data, key))
+        return job
+
+    def _finish_job(self, job_id, invoice_data, key, future):
+        """Record the outcome of a render; runs on the executor's callback thread."""
+        with self._executor_lock:
+            self._pending -= 1
+
+        with self.app.app_context():
+            try:
+                job = db.session.get(InvoiceJob, job_id)
+                try:
+                    pdf_bytes = rendered_pdf(future)
+                    invoice_cache.put(key, pdf_bytes)
+
+                    # Keep the job's own copy so cache eviction can't break its download
+                    pdf_path = os.path.join(self.invoices_dir, 'jobs', f'{job_id}.pdf')
+                    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+                    with open(pdf_path, 'wb') as f:
+                        f.write(pdf_bytes)
+
+                    email_invoice(invoice_data, pdf_bytes)
+                    job.status = InvoiceJob.COMPLETED
+                    job.file_path = pdf_path
+                except Exception as e:
+                    logger.error(f"Invoice job {job_id} failed: {e}")
+                    logger.error(traceback.format_exc())
+                    job.status = InvoiceJob.FAILED
+                    job.error = str(e)
+                job.completed_at = utcnow()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Could not record invoice job {job_id}: {e}")
+            finally:
+                db.session.remove()
+                done = self._done_events.pop(job_id, None)
+                if done:
+                    done.set()
+
+    def stream_batch_zip(self, jobcard_ids, send_emails=True):
+        """
+        Stream a ZIP archive of invoices for `jobcard_ids`, rendered on this service's pool.
+
+        The batch shares the pool with single invoices and keeps at most
+        INVOICE_RENDER_WORKERS renders queued on it, so concurrent batches can't
+        start more render processes or hold the pool to themselves.
+        """
+        return stream_invoice_zip(
+            jobcard_ids,
+            send_emails=send_emails,
+            max_workers=self.app.config['INVOICE_RENDER_WORKERS'],
+            submit=self._submit_render
+        )
+
+    def wait_for(self, job_id, timeout):
+        """
+        Block until a job finishes or `timeout` seconds pass.
+
+        Jobs submitted by this process are waited on directly; jobs owned by
+        another worker are polled from the database.
+        """
+        done = self._done_events.get(job_id)
+        if done:
+            done.wait(timeout)
+            return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            job = db.session.get(InvoiceJob, job_id)
+            if job is None or job.status != InvoiceJob.QUEUED:
+                return
+            time.sleep(min(0.25, max(0, deadline - time.monotonic())))
+
+    def prune(self, older_than_days):
+        """Delete jobs created more than `older_than_days` ago and their PDFs; returns how many were deleted."""
+        cutoff = utcnow() - timedelta(days=older_than_days)
+        old_jobs = InvoiceJob.query.filter(InvoiceJob.created_at < cutoff)
+        for (file_path,) in old_jobs.filter(InvoiceJob.file_path.isnot(None)).with_entities(InvoiceJob.file_path):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+        deleted = old_jobs.delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+# Create a global invoice service instance
+invoice_service = InvoiceService()
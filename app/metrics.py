@@ -0,0 +1,154 @@
+"""
+Prometheus metrics, served as text at /metrics.
+
+Covers request latency per route, the database connection pool, email
+delivery, the email outbox and invoice rendering. Recording a sample is an
+in-memory (or, across processes, an mmap'd) counter update, so the metrics are
+meant to stay on in production; benchmarks/metrics_overhead_benchmark.py
+measures what they cost per request.
+
+Under gunicorn every worker keeps its own samples. To report them all from
+whichever worker answers the scrape, start gunicorn with
+PROMETHEUS_MULTIPROC_DIR pointing at an empty directory writable by every
+worker. gunicorn.conf.py cleans up after workers that exit. Without it each
+process only reports its own samples. Invoice render processes return their
+render time to the web process, which records it, so they need neither.
+"""
+import os
+import time
+from flask import Response, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, exc, func
+from .models import db, EmailOutbox
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests, until the response is returned',
+    ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+db_pool_checkout_wait = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time taken to check a connection out of the pool, including connecting',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+db_pool_checkout_timeouts = Counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that gave up waiting for a free connection'
+)
+db_pool_checked_out = Gauge(
+    'db_pool_checked_out_connections', 'Connections currently checked out of the pool', multiprocess_mode='livesum'
+)
+db_pool_overflow = Gauge(
+    'db_pool_overflow_connections', 'Connections open beyond the pool size', multiprocess_mode='livesum'
+)
+email_send_duration = Histogram(
+    'email_send_duration_seconds', 'Time taken to hand one email to the SMTP server',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+email_sent = Counter('email_sent_total', 'Emails delivered to the SMTP server')
+email_send_failures = Counter(
+    'email_send_failures_total', 'Failed email delivery attempts, by whether the email will be retried',
+    ['outcome']
+)
+invoice_render_duration = Histogram(
+    'invoice_render_duration_seconds', 'Time taken to render one invoice PDF',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+class Metrics:
+    """Installs the request and connection pool hooks and serves /metrics."""
+
+    def __init__(self):
+        self.enabled = False
+        self.engine = None
+
+    def init_app(self, app):
+        self.enabled = app.config['METRICS_ENABLED']
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engine = self.engine = db.engine
+        if not event.contains(engine, 'checkout', _pool_checkout):
+            event.listen(engine, 'checkout', _pool_checkout)
+            event.listen(engine, 'checkin', _pool_checkin)
+            engine.raw_connection = _timed_checkout(engine.raw_connection)
+
+        app.before_request(_start_timer)
+        app.after_request(_observe_request)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+
+    def render(self):
+        """Render every metric in the Prometheus text format."""
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        # The outbox is shared by every process, so it's read once per scrape rather than per process
+        outbox = CollectorRegistry()
+        outbox.register(EmailOutboxCollector())
+        return Response(generate_latest(registry) + generate_latest(outbox), mimetype=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
+
+
+class EmailOutboxCollector:
+    """Emails waiting in the outbox and in the dead letters, counted when scraped."""
+
+    def collect(self):
+        counts = dict(
+            db.session.query(EmailOutbox.status, func.count(EmailOutbox.id))
+            .filter(EmailOutbox.status.in_([EmailOutbox.PENDING, EmailOutbox.DEAD]))
+            .group_by(EmailOutbox.status)
+        )
+        family = GaugeMetricFamily('email_outbox_messages', 'Emails in the outbox by status', labels=['status'])
+        for status in (EmailOutbox.PENDING, EmailOutbox.DEAD):
+            family.add_metric([status], counts.get(status, 0))
+        yield family
+
+
+def _start_timer():
+    request.environ['metrics.started'] = time.perf_counter()
+
+
+def _observe_request(response):
+    started = request.environ.get('metrics.started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        http_request_duration.labels(request.method, route, str(response.status_code)) \
+            .observe(time.perf_counter() - started)
+    return response
+
+
+def _timed_checkout(raw_connection):
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return raw_connection(*args, **kwargs)
+        except exc.TimeoutError:
+            db_pool_checkout_timeouts.inc()
+            raise
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started)
+    return timed
+
+
+def _record_overflow():
+    # Only QueuePool can overflow; overflow() counts down from zero while the pool isn't full
+    overflow = getattr(metrics.engine.pool, 'overflow', None)
+    if overflow is not None:
+        db_pool_overflow.set(max(overflow(), 0))
+
+
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    db_pool_checked_out.inc()
+    _record_overflow()
+
+
+def _pool_checkin(dbapi_connection, connection_record):
+    db_pool_checked_out.dec()
+    _record_overflow()
@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import func, DateTime
+from sqlalchemy import func, literal_column, DateTime, DDL
+from sqlalchemy.orm import Session, validates, object_session
 from datetime import datetime
 import pytz
 import re
@@ -11,9 +12,18 @@ utc_now = datetime.now(pytz.utc)
 nairobi_tz = pytz.timezone('Africa/Nairobi')
 nairobi_now = utc_now.astimezone(nairobi_tz)
 
+# Country calling code assumed for phone numbers written in national format
+DEFAULT_PHONE_COUNTRY_CODE = '254'
+
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 
+
+def utcnow():
+    """Return the current UTC time as a naive datetime, as stored in the outbox and updated_at columns."""
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+
 class Client(db.Model, SerializerMixin):
     __tablename__ = 'clients'
     serialize_rules = ('-devices.client',)
@@ -21,8 +31,12 @@ class Client(db.Model, SerializerMixin):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
-    phone_number = db.Column(db.String(40), nullable=False)
+    phone_number = db.Column(db.String(40), nullable=False, index=True)
+    phone_normalized = db.Column(db.String(20), nullable=True, index=True)
     address = db.Column(db.String(300), nullable=True)
+    # Bumped on every update; ETags are built from these
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
 
     devices = db.relationship('Device', backref='client', lazy=True, cascade="all, delete-orphan")
 
@@ -53,6 +67,36 @@ class Client(db.Model, SerializerMixin):
         if not self.phone_number:
             raise ValueError("Phone number is required.")
 
+    @validates('phone_number')
+    def _normalize_phone_number(self, key, phone_number):
+        self.phone_normalized = self.normalize_phone(phone_number)
+        return phone_number
+
+    @staticmethod
+    def normalize_phone(phone_number):
+        """
+        Normalize a phone number to E.164 style, e.g. "0700-000 000" -> "+254700000000".
+
+        Numbers in national format get DEFAULT_PHONE_COUNTRY_CODE. Also used on
+        partial input for prefix searches, so "0700" normalizes to "+254700".
+        Returns None if the number has no digits.
+        """
+        if not phone_number:
+            return None
+        phone_number = phone_number.strip()
+        digits = re.sub(r'\D', '', phone_number)
+        if not digits:
+            return None
+        if phone_number.startswith('+'):
+            return '+' + digits
+        if digits.startswith('00'):
+            return '+' + digits[2:]
+        if digits.startswith('0'):
+            return '+' + DEFAULT_PHONE_COUNTRY_CODE + digits[1:]
+        if digits.startswith(DEFAULT_PHONE_COUNTRY_CODE) and len(digits) > 9:
+            return '+' + digits
+        return '+' + DEFAULT_PHONE_COUNTRY_CODE + digits
+
     @staticmethod
     def is_valid_email(email):
         """Check if the email is valid."""
@@ -82,8 +126,28 @@ class Device(db.Model, SerializerMixin):
     battery_serial_number = db.Column(db.String(50), nullable=True)
     adapter = db.Column(db.String(50), nullable=True) 
     adapter_serial_number = db.Column(db.String(50), nullable=True) 
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, index=True)
     warranty_status = db.Column(db.String(100), nullable=False) 
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+    # Component name -> column holding that component's serial number
+    SERIAL_COMPONENTS = {
+        'device': 'device_serial_number',
+        'hdd_or_ssd': 'hdd_or_ssd_serial_number',
+        'memory': 'memory_serial_number',
+        'battery': 'battery_serial_number',
+        'adapter': 'adapter_serial_number',
+    }
+
+    def component_serials(self):
+        """Return the device_serials rows for every component serial recorded on this device."""
+        rows = []
+        for component, attribute in self.SERIAL_COMPONENTS.items():
+            serial_number = DeviceSerial.normalize(getattr(self, attribute))
+            if serial_number:
+                rows.append({'serial_number': serial_number, 'component': component, 'device_id': self.id})
+        return rows
 
     def __repr__(self):
         return f'<Device {self.brand}>'
@@ -92,6 +156,65 @@ class Device(db.Model, SerializerMixin):
         return f'{self.device_model} - {self.brand}'
     
     
+class DeviceSerial(db.Model):
+    """Lookup table resolving any component serial number to its device."""
+    __tablename__ = 'device_serials'
+
+    id = db.Column(db.Integer, primary_key=True)
+    serial_number = db.Column(db.String(50), nullable=False, index=True)
+    component = db.Column(db.String(20), nullable=False)
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    @staticmethod
+    def normalize(serial_number):
+        """Serials are matched case-insensitively and without surrounding whitespace."""
+        if serial_number is None:
+            return None
+        return serial_number.strip().upper()
+
+    def __repr__(self):
+        return f'<DeviceSerial {self.component} {self.serial_number}>'
+
+
+def _insert_device_serials(mapper, connection, device):
+    # Written once at the end of the flush, so inserting many devices costs a single statement
+    rows = device.component_serials()
+    if rows:
+        object_session(device).info.setdefault('new_device_serials', []).extend(rows)
+
+
+def _update_device_serials(mapper, connection, device):
+    state = db.inspect(device)
+    if not any(state.attrs[attribute].history.has_changes() for attribute in Device.SERIAL_COMPONENTS.values()):
+        return
+    table = DeviceSerial.__table__
+    connection.execute(table.delete().where(table.c.device_id == device.id))
+    _insert_device_serials(mapper, connection, device)
+
+
+def _delete_device_serials(mapper, connection, device):
+    table = DeviceSerial.__table__
+    connection.execute(table.delete().where(table.c.device_id == device.id))
+
+
+def _write_device_serials(session, flush_context):
+    rows = session.info.pop('new_device_serials', None)
+    if rows:
+        session.connection().execute(DeviceSerial.__table__.insert(), rows)
+
+
+def _discard_device_serials(session):
+    session.info.pop('new_device_serials', None)
+
+
+# Keep the serial lookup table in step with every device write
+db.event.listen(Device, 'after_insert', _insert_device_serials)
+db.event.listen(Device, 'after_update', _update_device_serials)
+db.event.listen(Device, 'before_delete', _delete_device_serials)
+db.event.listen(Session, 'after_flush', _write_device_serials)
+db.event.listen(Session, 'after_rollback', _discard_device_serials)
+
+
 class Users(db.Model, SerializerMixin):
     __tablename__ = 'users'
 
@@ -99,9 +222,12 @@ class Users(db.Model, SerializerMixin):
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(50), nullable=False, unique=True)
-    username = db.Column(db.String(50), nullable=False)
+    username = db.Column(db.String(50), nullable=False, index=True)
     password = db.Column(db.String(255), nullable=True)
-    role = db.Column(db.String(50), nullable=False)
+    role = db.Column(db.String(50), nullable=False, index=True)
+    # Bumped on every update; jobcard ETags embed their technician's
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
 
     jobcards = db.relationship('Jobcards', backref='user', lazy=True, cascade="all, delete-orphan")
 
@@ -130,55 +256,69 @@ class Jobcards(db.Model, SerializerMixin):
     id = db.Column(db.Integer, primary_key=True)
     problem_description = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(50), nullable=False)
-    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False)
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False, index=True)
     diagnostic = db.Column(db.String(50), nullable=True)
-    timestamp = db.Column(DateTime, default=lambda: datetime.now(pytz.timezone('Africa/Nairobi')))  # Add the timestamp column
+    timestamp = db.Column(DateTime, default=lambda: datetime.now(pytz.timezone('Africa/Nairobi')), index=True)  # Add the timestamp column
     cost = db.Column(db.Integer, nullable=True)
     assigned_technician_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+    # List pages filter on status and/or technician and are keyset-paginated by id
+    __table_args__ = (
+        db.Index('ix_jobcards_status_id', 'status', 'id'),
+        db.Index('ix_jobcards_assigned_technician_id_id', 'assigned_technician_id', 'id'),
+        db.Index('ix_jobcards_status_assigned_technician_id_id', 'status', 'assigned_technician_id', 'id'),
+    )
     
-    def get_client_device_info(self):
-        """Retrieve client name, client email, device model, and device brand for this jobcard."""
-        logger = logging.getLogger(__name__)
-
-        logger.info(f"Retrieving client info for jobcard ID: {self.id}")
-        logger.info(f"Device ID for this jobcard: {self.device_id}")
-
-        client_info = (
+    @classmethod
+    def query_with_details(cls):
+        """Build a column query yielding each jobcard's columns plus its client, device and technician details."""
+        return (
             db.session.query(
+                *cls.__table__.columns,
                 Client.name.label('client_name'),
                 Client.email.label('client_email'),
                 Client.phone_number.label('client_phone'),
                 Device.device_model.label('device_model'),
                 Device.brand.label('device_brand'),
-                Jobcards.status.label('jobcards_status'),
-                Jobcards.diagnostic.label('diagnostic'),
-                Jobcards.cost.label('cost'),
-                Jobcards.problem_description.label('problem_description'),
                 Users.username.label('technician_name')
             )
-            .select_from(Jobcards) 
-            .join(Device, Jobcards.device_id == Device.id)
+            .select_from(cls)
+            .join(Device, cls.device_id == Device.id)
             .join(Client, Device.client_id == Client.id)
-            .outerjoin(Users, Jobcards.assigned_technician_id == Users.id)
-            .filter(Jobcards.id == self.id)    
-            .first()
+            .outerjoin(Users, cls.assigned_technician_id == Users.id)
         )
 
+    @staticmethod
+    def details_from_row(row):
+        """Turn a row from `query_with_details` into the client/device info dictionary."""
+        return {
+            "client_name": row.client_name,
+            "client_email": row.client_email,
+            "client_phone": row.client_phone,
+            "device_model": row.device_model,
+            "device_brand": row.device_brand,
+            "jobcards_status": row.status,
+            "diagnostic": row.diagnostic,
+            "cost": row.cost,
+            "problem_description": row.problem_description,
+            "technician_name": row.technician_name,
+            "jobcard_id": row.id
+        }
+
+    def get_client_device_info(self):
+        """Retrieve client name, client email, device model, and device brand for this jobcard."""
+        logger = logging.getLogger(__name__)
+
+        logger.info(f"Retrieving client info for jobcard ID: {self.id}")
+        logger.info(f"Device ID for this jobcard: {self.device_id}")
+
+        client_info = Jobcards.query_with_details().filter(Jobcards.id == self.id).first()
+
         if client_info:
             logger.info(f"Client info retrieved: {client_info}")
-            return {
-                "client_name": client_info.client_name,
-                "client_email": client_info.client_email,
-                "client_phone": client_info.client_phone,
-                "device_model": client_info.device_model,
-                "device_brand": client_info.device_brand,
-                "jobcards_status": client_info.jobcards_status,
-                "diagnostic": client_info.diagnostic,
-                "cost": client_info.cost,
-                "problem_description": client_info.problem_description,
-                "technician_name": client_info.technician_name,
-                "jobcard_id": self.id
-            }
+            return Jobcards.details_from_row(client_info)
         
         logger.warning(f"No client info found for jobcard ID: {self.id}")
         return None
@@ -193,4 +333,131 @@ class Jobcards(db.Model, SerializerMixin):
         return f"Jobcard(id={self.id}, problem='{self.problem_description}', status='{self.status}', timestamp='{self.timestamp}')"
 
     def __repr__(self):
-        return f"<Jobcard(id={self.id}, problem='{self.problem_description}', status='{self.status}', timestamp='{self.timestamp}')>"
\ No newline at end of file
+        return f"<Jobcard(id={self.id}, problem='{self.problem_description}', status='{self.status}', timestamp='{self.timestamp}')>"
+
+def _bump_version(mapper, connection, target):
+    # Only count real column changes, not e.g. a device being added to a client
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = (target.version or 0) + 1
+
+
+for _versioned_model in (Client, Device, Users, Jobcards):
+    db.event.listen(_versioned_model, 'before_update', _bump_version)
+
+
+class JobcardChange(db.Model, SerializerMixin):
+    """Append-only log of jobcard writes; `seq` orders them for /jobcards/changes."""
+    __tablename__ = 'jobcard_changes'
+
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    seq = db.Column(db.Integer, primary_key=True)
+    jobcard_id = db.Column(db.Integer, nullable=False, index=True)
+    operation = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(50), nullable=True)
+    # JSON object of the columns the write set, with their new values
+    data = db.Column(db.Text, nullable=True)
+    created_at = db.Column(DateTime, nullable=False, default=utcnow, index=True)
+
+    # AUTOINCREMENT stops SQLite reusing sequence numbers once old changes are pruned
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    def __repr__(self):
+        return f'<JobcardChange {self.seq} {self.operation} jobcard {self.jobcard_id}>'
+
+
+class EmailOutbox(db.Model, SerializerMixin):
+    __tablename__ = 'email_outbox'
+    serialize_rules = ('-raw_message',)
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    # Emails that exhausted their retries are kept as dead letters for replay
+    DEAD = 'dead'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(255), nullable=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    # Dropped once the email is sent; dead letters keep it for replay
+    raw_message = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default=PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(DateTime, nullable=True)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_until = db.Column(DateTime, nullable=True)
+    created_at = db.Column(DateTime, nullable=False, default=utcnow)
+    sent_at = db.Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_locked_until', 'status', 'locked_until'),
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} to {self.recipient} ({self.status})>'
+
+    def __str__(self):
+        return f'{self.subject} -> {self.recipient} [{self.status}]'
+
+
+class InvoiceJob(db.Model, SerializerMixin):
+    __tablename__ = 'invoice_jobs'
+    serialize_rules = ('-file_path',)
+
+    QUEUED = 'queued'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    id = db.Column(db.String(32), primary_key=True)
+    jobcard_id = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    error = db.Column(db.Text, nullable=True)
+    file_path = db.Column(db.String(300), nullable=True)
+    created_at = db.Column(DateTime, nullable=False, default=utcnow)
+    completed_at = db.Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<InvoiceJob {self.id} ({self.status})>'
+
+    def __str__(self):
+        return f'Invoice job {self.id} for jobcard {self.jobcard_id} [{self.status}]'
+
+
+class JobcardSearchDocument(db.Model):
+    """Searchable text of a jobcard together with its client and device, maintained on write."""
+    __tablename__ = 'jobcard_search_documents'
+
+    jobcard_id = db.Column(db.Integer, db.ForeignKey('jobcards.id', ondelete='CASCADE'), primary_key=True)
+    document = db.Column(db.Text, nullable=False)
+
+    @classmethod
+    def search_vector(cls):
+        """The tsvector expression the Postgres full-text index is built on."""
+        return func.to_tsvector(literal_column("'simple'::regconfig"), cls.document)
+
+    # Full-text and trigram indexes only exist on Postgres; other databases
+    # are searched through the in-process index in app/search.py
+    __table_args__ = (
+        db.Index(
+            'ix_jobcard_search_documents_document_tsv', func.to_tsvector(literal_column("'simple'::regconfig"), document),
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
+        db.Index(
+            'ix_jobcard_search_documents_document_trgm', 'document',
+            postgresql_using='gin', postgresql_ops={'document': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
+    )
+
+    def __repr__(self):
+        return f'<JobcardSearchDocument {self.jobcard_id}>'
+
+
+# The trigram index needs pg_trgm when the schema is built with create_all()
+db.event.listen(
+    JobcardSearchDocument.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
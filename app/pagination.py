@@ -0,0 +1,107 @@
+import base64
+import json
+from urllib.parse import urlencode
+from flask import current_app, request
+from flask_restx import abort
+
+
+def add_pagination_arguments(parser):
+    """Add the `limit` and `cursor` query arguments to a request parser."""
+    parser.add_argument('limit', type=int, location='args', help='Maximum number of items to return')
+    parser.add_argument('cursor', type=str, location='args', help='Opaque cursor returned by the previous page')
+    return parser
+
+
+def encode_cursor(last_id, field='id'):
+    """Encode the id of the last item on a page (or another position `field`) as an opaque cursor token."""
+    payload = json.dumps({field: last_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, field='id'):
+    """Decode a cursor token back into the id (or other `field`) it was created from."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))[field]
+    except (ValueError, KeyError, TypeError):
+        abort(400, 'Invalid cursor')
+    if not isinstance(last_id, int):
+        abort(400, 'Invalid cursor')
+    return last_id
+
+
+def page_limit(requested):
+    """Clamp the requested page size to the configured default and maximum."""
+    default_limit = current_app.config['PAGINATION_DEFAULT_LIMIT']
+    max_limit = current_app.config['PAGINATION_MAX_LIMIT']
+    if requested is None:
+        return default_limit
+    if requested < 1:
+        abort(400, 'limit must be a positive integer')
+    return min(requested, max_limit)
+
+
+def paginate(query, key_column, args, key=lambda item: item.id):
+    """
+    Apply keyset pagination on `key_column` to a query.
+
+    Rows are ordered by the key and only those after the cursor are read, so
+    every page costs the same regardless of how deep it is.
+
+    :param query: SQLAlchemy query to paginate
+    :param key_column: Unique, indexed column the pages are ordered by
+    :param args: Parsed arguments containing `limit` and `cursor`
+    :param key: Callable returning the key value of a fetched item
+    :return: Tuple of (items, headers) where headers carry the next cursor
+    """
+    limit = page_limit(args.get('limit'))
+
+    if args.get('cursor'):
+        query = query.filter(key_column > decode_cursor(args['cursor']))
+
+    # Fetch one extra row to find out whether another page exists
+    items = query.order_by(key_column).limit(limit + 1).all()
+
+    headers = {}
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(key(items[-1]))
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{_next_page_url(next_cursor, limit)}>; rel="next"'
+
+    return items, headers
+
+
+def paginate_ranked(search, args):
+    """
+    Paginate results ordered by relevance, where there is no key column to seek on.
+
+    The cursor carries the offset of the next page instead of the last id.
+
+    :param search: Callable taking (offset, limit) and returning that slice of the results
+    :param args: Parsed arguments containing `limit` and `cursor`
+    :return: Tuple of (items, headers) where headers carry the next cursor
+    """
+    limit = page_limit(args.get('limit'))
+    offset = decode_cursor(args['cursor'], field='offset') if args.get('cursor') else 0
+    if offset < 0:
+        abort(400, 'Invalid cursor')
+
+    # Fetch one extra result to find out whether another page exists
+    items = search(offset, limit + 1)
+
+    headers = {}
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(offset + limit, field='offset')
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{_next_page_url(next_cursor, limit)}>; rel="next"'
+
+    return items, headers
+
+
+def _next_page_url(next_cursor, limit):
+    query_args = request.args.to_dict()
+    query_args['cursor'] = next_cursor
+    query_args['limit'] = str(limit)
+    return f'{request.base_url}?{urlencode(query_args)}'
@@ -0,0 +1,266 @@
+"""
+Read-through cache for the hottest single-resource GET responses.
+
+Each cached body is stored with tags naming the rows it was built from, e.g.
+a device body embeds its client so it is tagged both `device:<id>` and
+`client:<id>`. Every flush records the tags of the rows it writes, and once
+the transaction commits the entries carrying those tags are dropped, so any
+handler that writes through the ORM invalidates exactly what it changed.
+
+The default backend is an in-process LRU with a TTL. Setting
+RESPONSE_CACHE_URL to a redis:// URL shares the cache, and its invalidations,
+between all worker processes; that needs the optional `redis` package.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import db, Client, Device, Users, Jobcards
+
+logger = logging.getLogger(__name__)
+
+
+def tag(entity, entity_id=None):
+    """Name the cache tag for one row, or for a whole collection when `entity_id` is None."""
+    return entity if entity_id is None else f'{entity}:{entity_id}'
+
+
+class MemoryBackend:
+    """Per-process LRU with per-entry expiry and a tag index."""
+    name = 'memory'
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value, tags)
+        self._tags = defaultdict(set)   # tag -> keys carrying it
+        self._generation = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for entry_tag in tags:
+                self._tags[entry_tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            self._generation += 1
+            for entry_tag in tags:
+                for key in self._tags.pop(entry_tag, ()):
+                    self._discard(key)
+
+    def generation(self):
+        return self._generation
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def entry_count(self):
+        return len(self._entries)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for entry_tag in entry[2]:
+            keys = self._tags.get(entry_tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[entry_tag]
+
+
+class RedisBackend:
+    """Cache shared by every worker process through Redis; bodies are stored as JSON."""
+    name = 'redis'
+
+    def __init__(self, url, prefix='laptopcare:cache:'):
+        # Optional dependency, only needed when a shared cache is configured
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl, tags):
+        pipe = self._redis.pipeline()
+        pipe.set(self._prefix + key, json.dumps(value, default=str), ex=ttl)
+        for entry_tag in tags:
+            tag_key = f'{self._prefix}tag:{entry_tag}'
+            pipe.sadd(tag_key, self._prefix + key)
+            pipe.expire(tag_key, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        tag_keys = [f'{self._prefix}tag:{entry_tag}' for entry_tag in tags]
+        pipe = self._redis.pipeline()
+        pipe.incr(self._prefix + 'generation')
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        results = pipe.execute()
+        keys = set().union(*results[1:]) if tag_keys else set()
+        self._redis.delete(*keys, *tag_keys)
+
+    def generation(self):
+        return int(self._redis.get(self._prefix + 'generation') or 0)
+
+    def clear(self):
+        self._redis.incr(self._prefix + 'generation')
+        for key in self._redis.scan_iter(match=self._prefix + '*'):
+            self._redis.delete(key)
+
+    def entry_count(self):
+        return None
+
+
+class ResponseCache:
+    """Read-through cache of serialized response bodies with tag-based invalidation and hit/miss counters."""
+
+    def __init__(self):
+        self.enabled = False
+        self.ttl = 0
+        self.backend = None
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._counters_lock = Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['RESPONSE_CACHE_ENABLED']
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        url = app.config['RESPONSE_CACHE_URL']
+        if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+            self.backend = RedisBackend(url)
+        else:
+            self.backend = MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        logger.info(f"Response cache {'enabled' if self.enabled else 'disabled'} ({self.backend.name} backend)")
+
+    def get_or_load(self, resource, key, loader):
+        """
+        Return the cached body for `resource`/`key`, or load and cache it.
+
+        :param loader: Callable returning (body, tags) or None when there is
+            nothing to cache (e.g. the resource doesn't exist)
+        :return: The body, or None if the loader returned None
+        """
+        if not self.enabled:
+            result = loader()
+            return None if result is None else result[0]
+
+        cache_key = f'{resource}:{key}'
+        body = self.backend.get(cache_key)
+        if body is not None:
+            self._count(resource, 'hits')
+            return body
+        self._count(resource, 'misses')
+
+        # A write committed while loading may have been read before or after
+        # the change, so only store the body if nothing was invalidated meanwhile
+        generation = self.backend.generation()
+        result = loader()
+        if result is None:
+            return None
+        body, tags = result
+        if self.backend.generation() == generation:
+            self.backend.set(cache_key, body, self.ttl, frozenset(tags))
+        return body
+
+    def invalidate(self, tags):
+        """Drop every entry carrying any of `tags`."""
+        if self.enabled and tags:
+            self.backend.invalidate(tags)
+
+    def clear(self):
+        """Drop every entry."""
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """Hit and miss counters per resource for this process, plus the number of cached entries."""
+        with self._counters_lock:
+            resources = {resource: dict(counts) for resource, counts in self._counters.items()}
+        return {
+            'enabled': self.enabled,
+            'backend': self.backend.name if self.backend else None,
+            'entries': self.backend.entry_count() if self.backend else 0,
+            'hits': sum(counts['hits'] for counts in resources.values()),
+            'misses': sum(counts['misses'] for counts in resources.values()),
+            'resources': resources
+        }
+
+    def _count(self, resource, outcome):
+        with self._counters_lock:
+            self._counters[resource][outcome] += 1
+
+
+response_cache = ResponseCache()
+
+
+# Write-driven invalidation
+
+def _column_values(instance, attribute):
+    """Current and previous non-null values of an attribute, so moves invalidate both sides."""
+    history = db.inspect(instance).attrs[attribute].history
+    return {value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None}
+
+
+def write_tags(instance):
+    """The cache tags affected by inserting, updating or deleting `instance`."""
+    if isinstance(instance, Client):
+        return {tag('client', instance.id)}
+    if isinstance(instance, Device):
+        # Client bodies embed their devices
+        return {tag('device', instance.id)} | {
+            tag('client', client_id) for client_id in _column_values(instance, 'client_id')
+        }
+    if isinstance(instance, Jobcards):
+        # Technician bodies embed their assigned jobcards
+        return {tag('jobcard', instance.id)} | {
+            tag('user', user_id) for user_id in _column_values(instance, 'assigned_technician_id')
+        }
+    if isinstance(instance, Users):
+        return {tag('user', instance.id), tag('technicians')}
+    return set()
+
+
+def _collect_write_tags(session, flush_context):
+    if not response_cache.enabled:
+        return
+    tags = session.info.setdefault('response_cache_tags', set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        tags.update(write_tags(instance))
+
+
+def _invalidate_committed_writes(session):
+    tags = session.info.pop('response_cache_tags', None)
+    if tags:
+        response_cache.invalidate(tags)
+
+
+def _discard_write_tags(session):
+    session.info.pop('response_cache_tags', None)
+
+
+event.listen(Session, 'after_flush', _collect_write_tags)
+event.listen(Session, 'after_commit', _invalidate_committed_writes)
+event.listen(Session, 'after_rollback', _discard_write_tags)
@@ -1,26 +1,41 @@
-from flask import request, current_app, jsonify, send_file
-from flask_restx import Resource, Namespace, reqparse
+from flask import request, current_app, jsonify, send_file, Response, stream_with_context
+from flask_restx import Resource, Namespace, reqparse, inputs
 from flask_jwt_extended import create_access_token
-from . import db
-from .models import Client, Device, Users, Jobcards
+from . import db, api
+from .models import Client, Device, DeviceSerial, Users, Jobcards, EmailOutbox, InvoiceJob
 from .email_service import email_service
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.mime.text import MIMEText
-import os
+from .pagination import add_pagination_arguments, paginate, paginate_ranked, page_limit
+from .serializers import (
+    client_serializer, device_serializer, user_serializer, jobcard_serializer,
+    serialize_clients, serialize_devices, serialize_users, serialize_jobcards,
+    EXPORT_FORMATS, export_rows
+)
+from .invoice_service import (
+    invoice_service, invoice_cache, InvoiceQueueFull, InvoiceRenderUnavailable, get_invoice_pdf, invoice_filename,
+    email_invoice
+)
+from .search import search_jobcards
+from .bulk import BulkField, BulkOperation
+from .response_cache import response_cache, tag
+from .instrumentation import query_instrumentation
+from .changes import change_feed
+from .conditional import versioned, version_etag, last_modified_header, is_not_modified, conditional_response
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 import io
-from datetime import datetime, timedelta
+import json
+import os
+import time
+from datetime import timedelta
 
 
 client_ns = Namespace('clients', description='Client related operations')
 device_ns = Namespace('devices', description='Device related operations')
 users_ns = Namespace('users', description='Users related operations')
 jobcards_ns = Namespace('jobcards', description='Jobcards related operations')
+emails_ns = Namespace('emails', description='Email outbox administration')
+cache_ns = Namespace('cache', description='Response cache administration')
+stats_ns = Namespace('stats', description='Request and query statistics')
 
 
 client_parser = reqparse.RequestParser()
@@ -66,14 +81,125 @@ jobcard_update_parser = reqparse.RequestParser()
 jobcard_update_parser.add_argument('cost', type=int, required=False, help='Cost of the repair')
 jobcard_update_parser.add_argument('diagnostic', type=str, required=False, help='Diagnostic information')
 
+# Parser for the limit/cursor arguments shared by the list endpoints
+pagination_parser = add_pagination_arguments(reqparse.RequestParser())
+
+# Parser for the export endpoints
+export_parser = reqparse.RequestParser()
+export_parser.add_argument('format', type=str, location='args', default='ndjson', choices=tuple(EXPORT_FORMATS),
+                           help='Export format: ndjson or csv')
+
+# Labelled detail columns that Jobcards.query_with_details() adds after the jobcard columns
+JOBCARD_DETAIL_FIELDS = ('client_name', 'client_email', 'client_phone', 'device_model', 'device_brand', 'technician_name')
+
+JOBCARD_STATUSES = ('pending', 'in_progress', 'completed', 'cancelled')
+
+# Parser for the bulk create/update endpoints
+bulk_parser = reqparse.RequestParser()
+bulk_parser.add_argument('atomic', type=inputs.boolean, location='args', default=False,
+                         help='Write nothing if any item is invalid')
+
+# Fields accepted by the bulk endpoints, mirroring the single-item parsers
+CLIENT_BULK_FIELDS = {
+    'name': BulkField(str, required=True),
+    'email': BulkField(str, required=True),
+    'phone_number': BulkField(str, required=True),
+    'address': BulkField(str)
+}
+DEVICE_BULK_FIELDS = {
+    'device_serial_number': BulkField(str, required=True),
+    'device_model': BulkField(str, required=True),
+    'brand': BulkField(str, required=True),
+    'hdd_or_ssd': BulkField(str),
+    'hdd_or_ssd_serial_number': BulkField(str),
+    'memory': BulkField(str),
+    'memory_serial_number': BulkField(str),
+    'battery': BulkField(str),
+    'battery_serial_number': BulkField(str),
+    'adapter': BulkField(str),
+    'adapter_serial_number': BulkField(str),
+    'client_id': BulkField(int, required=True),
+    'warranty_status': BulkField(bool)
+}
+JOBCARD_BULK_FIELDS = {
+    'device_id': BulkField(int, required=True),
+    'problem_description': BulkField(str, required=True),
+    'status': BulkField(str, required=True, choices=JOBCARD_STATUSES),
+    'assigned_technician_id': BulkField(int),
+    'diagnostic': BulkField(str),
+    'cost': BulkField(int, minimum=0)
+}
+JOBCARD_BULK_REFERENCES = {'device_id': Device.id, 'assigned_technician_id': Users.id}
+
+
+def export_response(query, serializer, export_format, name, extra_fields=()):
+    """Stream a query's rows back as an NDJSON or CSV file download."""
+    chunks = export_rows(query, serializer, export_format, extra_fields=extra_fields)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={name}.{export_format}'}
+    )
+
+
+def bulk_write(model, fields, partial=False, unique=(), references=None, defaults=None, on_written=None):
+    """
+    Create (or, when `partial`, update) the JSON array of items in the request body in one transaction.
+
+    Invalid items are reported by index and skipped, unless ?atomic=true is
+    given, in which case nothing is written if any item is invalid.
+
+    :param unique: Unique columns to check against the batch and the table
+    :param references: Foreign key field name -> referenced column, checked with one query each
+    :param defaults: Values for omitted fields on create
+    :param on_written: Called with the written (index, id) pairs before commit;
+        returns how many emails it queued
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return {'message': 'Expected a non-empty JSON array of items'}, 400
+
+    max_items = current_app.config['BULK_MAX_ITEMS']
+    if len(items) > max_items:
+        return {'message': f'At most {max_items} items can be written at once'}, 400
+
+    if defaults and not partial:
+        items = [{**defaults, **item} if isinstance(item, dict) else item for item in items]
+
+    operation = BulkOperation(model, fields).validate(items, partial=partial)
+    for column in unique:
+        operation.check_unique(column)
+    for name, target_column in (references or {}).items():
+        operation.check_references(name, target_column)
+
+    atomic = bulk_parser.parse_args()['atomic']
+    try:
+        written = [] if atomic and operation.errors else operation.write(partial)
+        if atomic and operation.errors:
+            db.session.rollback()
+            body, _ = operation.response([], 200)
+            return {**body, 'message': 'Nothing was written because some items are invalid'}, 400
+
+        emails_queued = on_written(written) if on_written and written else 0
+        db.session.commit()
+    except IntegrityError as e:
+        # Another request took a unique value between the checks and the write
+        db.session.rollback()
+        return {'message': 'The batch conflicts with existing data; nothing was written', 'detail': str(e.orig)}, 409
+
+    if emails_queued:
+        email_service.notify()
+    return operation.response(written, 200 if partial else 201)
+
 
 # Client routes
 @client_ns.route('', endpoint='clients')
 class ClientListResource(Resource):
     def get(self):
-        """Retrieve a list of clients."""
-        clients = Client.query.all()
-        return [client.to_dict() for client in clients], 200
+        """Retrieve a page of clients."""
+        args = pagination_parser.parse_args()
+        rows, headers = paginate(client_serializer.query(), Client.id, args)
+        return serialize_clients(rows), 200, headers
 
     def post(self):
         """Create a new client."""
@@ -92,8 +218,16 @@ class ClientListResource(Resource):
 class ClientResource(Resource):
     def get(self, client_id):
         """Retrieve a client by ID."""
-        client = Client.query.get_or_404(client_id)
-        return client.to_dict(), 200
+        def load():
+            client = Client.query.get_or_404(client_id)
+            bundle = versioned(
+                client.to_dict(),
+                [(client.id, client.version)] + [(device.id, device.version) for device in client.devices],
+                [client.updated_at] + [device.updated_at for device in client.devices]
+            )
+            return bundle, [tag('client', client.id)]
+
+        return conditional_response(response_cache.get_or_load('client', client_id, load))
 
     def put(self, client_id):
         """Update a client by ID."""
@@ -113,31 +247,78 @@ class ClientResource(Resource):
         db.session.commit()
         return '', 204
     
+def phone_prefix_filter(prefix):
+    """
+    Range conditions matching normalized phone numbers that start with `prefix`.
+
+    A range over the index is used rather than LIKE so every database can
+    answer it with an index seek.
+    """
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Client.phone_normalized >= prefix, Client.phone_normalized < upper_bound
+
+
 @client_ns.route('/search', endpoint='clients_search')
 class ClientSearchResource(Resource):
     def get(self):
-        """Search for a client by phone number."""
-        parser = reqparse.RequestParser()
+        """
+        Search for clients by phone number, in any common format.
+
+        With match=exact (the default) the client with that number is returned.
+        With match=prefix a page of clients whose number starts with the given
+        digits is returned, e.g. "0722" finds every +254722... number.
+        """
+        parser = pagination_parser.copy()
         parser.add_argument('phone_number', type=str, required=True, help="Phone number to search for")
+        parser.add_argument('match', type=str, location='args', default='exact', choices=('exact', 'prefix'),
+                            help='exact or prefix')
         args = parser.parse_args()
 
-        # Query the database for clients with the given phone number
-        client = Client.query.filter_by(phone_number=args['phone_number']).first()
-        
+        phone_normalized = Client.normalize_phone(args['phone_number'])
+        if phone_normalized is None:
+            return {'message': 'phone_number must contain digits'}, 400
+
+        if args['match'] == 'prefix':
+            rows, headers = paginate(
+                client_serializer.query().filter(*phone_prefix_filter(phone_normalized)), Client.id, args
+            )
+            return serialize_clients(rows), 200, headers
+
+        client = Client.query.filter_by(phone_normalized=phone_normalized).first()
+
         if client:
             return client.to_dict(), 200
         else:
             return {'message': 'Client not found'}, 404
 
 
+@client_ns.route('/export', endpoint='clients_export')
+class ClientExportResource(Resource):
+    def get(self):
+        """Stream every client as NDJSON or CSV."""
+        args = export_parser.parse_args()
+        query = client_serializer.query().order_by(Client.id)
+        return export_response(query, client_serializer, args['format'], 'clients')
+
+@client_ns.route('/bulk', endpoint='clients_bulk')
+class ClientBulkResource(Resource):
+    def post(self):
+        """Create many clients from a JSON array in one transaction."""
+        return bulk_write(Client, CLIENT_BULK_FIELDS, unique=(Client.email,))
+
+    def patch(self):
+        """Update many clients from a JSON array of objects with an `id` and the fields to change."""
+        return bulk_write(Client, CLIENT_BULK_FIELDS, partial=True, unique=(Client.email,))
+
 
 # Device routes
 @device_ns.route('', endpoint='devices')
 class DeviceListResource(Resource):
     def get(self):
-        """Retrieve a list of devices."""
-        devices = Device.query.all()
-        return [device.to_dict() for device in devices], 200
+        """Retrieve a page of devices."""
+        args = pagination_parser.parse_args()
+        rows, headers = paginate(device_serializer.query(), Device.id, args)
+        return serialize_devices(rows), 200, headers
 
     def post(self):
         """Create a new device."""
@@ -165,8 +346,16 @@ class DeviceListResource(Resource):
 class DeviceResource(Resource):
     def get(self, device_id):
         """Retrieve a device by ID."""
-        device = Device.query.get_or_404(device_id)
-        return device.to_dict(), 200
+        def load():
+            device = Device.query.get_or_404(device_id)
+            bundle = versioned(
+                device.to_dict(),
+                [(device.id, device.version), (device.client.id, device.client.version)],
+                [device.updated_at, device.client.updated_at]
+            )
+            return bundle, [tag('device', device.id), tag('client', device.client_id)]
+
+        return conditional_response(response_cache.get_or_load('device', device_id, load))
 
     def put(self, device_id):
         """Update a device by ID."""
@@ -211,13 +400,91 @@ class DeviceSearchResource(Resource):
         else:
             return {'message': 'Device not found'}, 404
 
+def lookup_serials(serial_numbers):
+    """
+    Resolve component serial numbers to their devices and owners in one indexed query.
+
+    Returns a dict mapping each normalized serial number to a list of matching
+    devices, each with its owning client nested as in Device.to_dict().
+    """
+    serials = {DeviceSerial.normalize(serial) for serial in serial_numbers if serial and serial.strip()}
+    matches = {serial: [] for serial in serials}
+    if not serials:
+        return matches
+
+    query = db.session.query(
+        DeviceSerial.serial_number, DeviceSerial.component, *device_serializer.columns, *client_serializer.columns
+    ).join(Device, Device.id == DeviceSerial.device_id).join(Client, Client.id == Device.client_id) \
+        .filter(DeviceSerial.serial_number.in_(serials)).order_by(Device.id)
+
+    client_start = 2 + len(device_serializer.columns)
+    for row in query:
+        device = device_serializer.row_to_dict(row[2:client_start])
+        device['client'] = client_serializer.row_to_dict(row[client_start:])
+        device['matched_component'] = row.component
+        device['matched_serial'] = row.serial_number
+        matches[row.serial_number].append(device)
+    return matches
+
+
+@device_ns.route('/serial-lookup', endpoint='devices_serial_lookup')
+class DeviceSerialLookupResource(Resource):
+    def get(self):
+        """Find the device and owner for a device or component serial number."""
+        parser = reqparse.RequestParser()
+        parser.add_argument('serial_number', type=str, required=True, location='args',
+                            help='Device, storage, memory, battery or adapter serial number')
+        args = parser.parse_args()
+
+        devices = lookup_serials([args['serial_number']]).get(DeviceSerial.normalize(args['serial_number']))
+        if devices:
+            return devices, 200
+        return {'message': 'Device not found'}, 404
+
+    def post(self):
+        """Look up a list of serial numbers; returns the matching devices per serial."""
+        serial_numbers = (request.get_json(silent=True) or {}).get('serial_numbers')
+        if not isinstance(serial_numbers, list) or not all(isinstance(serial, str) for serial in serial_numbers):
+            return {'message': 'serial_numbers must be a list of strings'}, 400
+
+        max_serials = current_app.config['DEVICE_SERIAL_LOOKUP_MAX']
+        if len(serial_numbers) > max_serials:
+            return {'message': f'At most {max_serials} serial numbers can be looked up at once'}, 400
+
+        return lookup_serials(serial_numbers), 200
+
+@device_ns.route('/export', endpoint='devices_export')
+class DeviceExportResource(Resource):
+    def get(self):
+        """Stream every device as NDJSON or CSV."""
+        args = export_parser.parse_args()
+        query = device_serializer.query().order_by(Device.id)
+        return export_response(query, device_serializer, args['format'], 'devices')
+
+@device_ns.route('/bulk', endpoint='devices_bulk')
+class DeviceBulkResource(Resource):
+    def post(self):
+        """Create many devices from a JSON array in one transaction."""
+        return bulk_write(
+            Device, DEVICE_BULK_FIELDS, unique=(Device.device_serial_number,),
+            references={'client_id': Client.id}, defaults={'warranty_status': False}
+        )
+
+    def patch(self):
+        """Update many devices from a JSON array of objects with an `id` and the fields to change."""
+        return bulk_write(
+            Device, DEVICE_BULK_FIELDS, partial=True, unique=(Device.device_serial_number,),
+            references={'client_id': Client.id}
+        )
+
 # Users routes
 @users_ns.route('', endpoint='users')
 class UserListResource(Resource):
     def get(self):
-        """Retrieve a list of users."""
-        users = Users.query.all()
-        return [user.to_dict(rules=('-password',)) for user in users], 200
+        """Retrieve a page of users."""
+        args = pagination_parser.parse_args()
+        rows, headers = paginate(user_serializer.query(), Users.id, args)
+        return serialize_users(rows), 200, headers
 
     def post(self):
         """Create a new user."""
@@ -257,8 +524,14 @@ class UserResource(Resource):
 class TechnicianListResource(Resource):
     def get(self):
         """Retrieve a list of users with the role of technician."""
-        technicians = Users.query.filter_by(role='technician').all()
-        return [technician.to_dict(rules=('-password',)) for technician in technicians], 200
+        def load():
+            technicians = Users.query.filter_by(role='technician').all()
+            return (
+                [technician.to_dict(rules=('-password',)) for technician in technicians],
+                [tag('technicians')] + [tag('user', technician.id) for technician in technicians]
+            )
+
+        return response_cache.get_or_load('technicians', 'all', load), 200
     
 
 @users_ns.route('/login', endpoint='login')
@@ -282,41 +555,86 @@ class UserLoginResource(Resource):
             'message': 'Login successful'
         }, 200    
 
+# Versions of the device, client and technician a jobcard's details embed, added to query_with_details()
+JOBCARD_RELATED_VERSION_COLUMNS = (
+    Device.version.label('device_version'), Device.updated_at.label('device_updated_at'),
+    Client.version.label('client_version'), Client.updated_at.label('client_updated_at'),
+    Users.version.label('technician_version'), Users.updated_at.label('technician_updated_at'),
+)
+# Everything a page of jobcards' validators are computed from
+JOBCARD_PAGE_VERSION_COLUMNS = (
+    Jobcards.id, Jobcards.version, Jobcards.updated_at, Jobcards.assigned_technician_id,
+    *JOBCARD_RELATED_VERSION_COLUMNS
+)
+
+
+def jobcard_page_validators(rows):
+    """
+    ETag parts and updated_at values for a page of jobcard rows.
+
+    Each jobcard's nested technician lists all of that technician's jobcards,
+    so a count and version sum of those are included as well.
+    """
+    etag_parts = [
+        (row.id, row.version, row.device_version, row.client_version, row.assigned_technician_id,
+         row.technician_version)
+        for row in rows
+    ]
+    updated_at_values = [
+        value for row in rows
+        for value in (row.updated_at, row.device_updated_at, row.client_updated_at, row.technician_updated_at)
+    ]
+    technician_ids = {row.assigned_technician_id for row in rows} - {None}
+    if technician_ids:
+        technician_jobcards = db.session.query(
+            Jobcards.assigned_technician_id, func.count(Jobcards.id), func.sum(Jobcards.version),
+            func.max(Jobcards.updated_at)
+        ).filter(Jobcards.assigned_technician_id.in_(technician_ids)) \
+            .group_by(Jobcards.assigned_technician_id).order_by(Jobcards.assigned_technician_id)
+        for technician_id, count, version_sum, latest in technician_jobcards:
+            etag_parts.append((technician_id, count, version_sum))
+            updated_at_values.append(latest)
+    return etag_parts, updated_at_values
+
+
 @jobcards_ns.route('', endpoint='jobcards')
 class JobcardsResource(Resource):
     def get(self):
-        """Retrieve a list of jobcards with optional status and assigned technician ID filters."""
-        # Parse the optional status and assigned technician ID arguments
-        parser = reqparse.RequestParser()
+        """Retrieve a page of jobcards with optional status and assigned technician ID filters."""
+        # Parse the optional status, assigned technician ID and pagination arguments
+        parser = pagination_parser.copy()
         parser.add_argument('status', type=str, help='Status of the jobcard')
         parser.add_argument('assigned_technician_id', type=int, help='Technician ID assigned to the jobcard')
         args = parser.parse_args()
 
-        # Build the query with optional filters
-        query = Jobcards.query
+        # Build a single joined column query with optional filters
+        query = Jobcards.query_with_details()
         
         if args['status']:
-            query = query.filter_by(status=args['status'])
+            query = query.filter(Jobcards.status == args['status'])
         
         if args['assigned_technician_id']:
-            query = query.filter_by(assigned_technician_id=args['assigned_technician_id'])
-
-        # Retrieve filtered job cards
-        jobcards = query.all()
+            query = query.filter(Jobcards.assigned_technician_id == args['assigned_technician_id'])
 
-        # Get additional client and device details for each job card
-        jobcards_with_details = []
-        for jobcard in jobcards:
-            jobcard_details = jobcard.to_dict()  # Assuming you have a `to_dict` method on Jobcards
-            client_device_info = jobcard.get_client_device_info()  # Get client and device info
-
-            if client_device_info:
-                jobcard_details.update(client_device_info)  # Add client and device info to the jobcard details
+        if request.if_none_match or request.if_modified_since:
+            # Check the client's copy against the page's row versions before
+            # fetching and serializing the page itself
+            stamps, headers = paginate(query.with_entities(*JOBCARD_PAGE_VERSION_COLUMNS), Jobcards.id, args)
+            etag_parts, updated_at_values = jobcard_page_validators(stamps)
+            if is_not_modified(version_etag(etag_parts), last_modified_header(updated_at_values)):
+                return conditional_response(versioned(None, etag_parts, updated_at_values), headers)
+            rows = query.add_columns(*JOBCARD_RELATED_VERSION_COLUMNS) \
+                .filter(Jobcards.id.in_([stamp.id for stamp in stamps])).order_by(Jobcards.id).all()
+        else:
+            rows, headers = paginate(query.add_columns(*JOBCARD_RELATED_VERSION_COLUMNS), Jobcards.id, args)
 
-            jobcards_with_details.append(jobcard_details)
+        # Combine each job card with its client and device details
+        jobcards_with_details = serialize_jobcards(rows)
+        for jobcard_details, row in zip(jobcards_with_details, rows):
+            jobcard_details.update(Jobcards.details_from_row(row))
 
         # Serialize and return the filtered job cards with client and device details
-        return jobcards_with_details, 200
+        return conditional_response(versioned(jobcards_with_details, *jobcard_page_validators(rows)), headers)
 
 
      
@@ -334,7 +652,7 @@ class JobcardsResource(Resource):
             assigned_technician_id=data.get('assigned_technician_id'),
         )
         db.session.add(new_jobcard)
-        db.session.commit()
+        db.session.flush()
 
         # Get client and device details for the email
         client_info = new_jobcard.get_client_device_info()
@@ -364,26 +682,248 @@ class JobcardsResource(Resource):
                     jobcard_id=new_jobcard.id,
                     problem_description=new_jobcard.problem_description,
                     device_model=client_info['device_model'],
-                    device_brand=client_info['device_brand']
+                    device_brand=client_info['device_brand'],
+                    commit=False
                 )
             except Exception as e:
                 print(f"Error sending email notification: {str(e)}")
 
+        # Commit the jobcard and its queued notification in one transaction
+        db.session.commit()
+        if email_sent:
+            email_service.notify()
+
         # Return jobcard details along with email sending status
         response = new_jobcard.to_dict()
         response['email_sent'] = email_sent
 
         return response, 201
 
+@jobcards_ns.route('/export', endpoint='jobcards_export')
+class JobcardExportResource(Resource):
+    def get(self):
+        """Stream jobcards with client and device details as NDJSON or CSV, with optional filters."""
+        parser = export_parser.copy()
+        parser.add_argument('status', type=str, location='args', help='Status of the jobcard')
+        parser.add_argument('assigned_technician_id', type=int, location='args', help='Technician ID assigned to the jobcard')
+        args = parser.parse_args()
+
+        query = Jobcards.query_with_details()
+        if args['status']:
+            query = query.filter(Jobcards.status == args['status'])
+        if args['assigned_technician_id']:
+            query = query.filter(Jobcards.assigned_technician_id == args['assigned_technician_id'])
+
+        return export_response(
+            query.order_by(Jobcards.id), jobcard_serializer, args['format'], 'jobcards',
+            extra_fields=JOBCARD_DETAIL_FIELDS
+        )
+
+def queue_jobcard_emails(jobcard_ids, send):
+    """
+    Queue one email per jobcard without committing, loading every jobcard's
+    client and device details with a single query.
+
+    :param send: Called with each `query_with_details` row; queues its email and returns whether it did
+    :return: Number of emails queued
+    """
+    if not jobcard_ids:
+        return 0
+    rows = Jobcards.query_with_details().filter(Jobcards.id.in_(jobcard_ids)).order_by(Jobcards.id)
+    return sum(1 for row in rows if send(row))
+
+def queue_new_jobcard_emails(written):
+    return queue_jobcard_emails([jobcard_id for _, jobcard_id in written], lambda row: email_service.send_jobcard_notification(
+        client_name=row.client_name,
+        client_email=row.client_email,
+        jobcard_id=row.id,
+        problem_description=row.problem_description,
+        device_model=row.device_model,
+        device_brand=row.device_brand,
+        commit=False
+    ))
+
+@jobcards_ns.route('/bulk', endpoint='jobcards_bulk')
+class JobcardBulkResource(Resource):
+    def post(self):
+        """Create many jobcards in one transaction, queueing every client notification email with them."""
+        return bulk_write(Jobcards, JOBCARD_BULK_FIELDS, references=JOBCARD_BULK_REFERENCES,
+                          on_written=queue_new_jobcard_emails)
+
+    def patch(self):
+        """Update many jobcards from a JSON array of objects with an `id` and the fields to change."""
+        return bulk_write(Jobcards, JOBCARD_BULK_FIELDS, partial=True, references=JOBCARD_BULK_REFERENCES)
+
+@jobcards_ns.route('/bulk-status', endpoint='jobcards_bulk_status')
+class JobcardBulkStatusResource(Resource):
+    def post(self):
+        """
+        Move many jobcards to one status in a single transaction.
+
+        Clients of the jobcards whose status actually changed are emailed,
+        with every email queued in the same transaction, unless `notify` is false.
+        """
+        data = request.get_json(silent=True) or {}
+        jobcard_ids = data.get('ids')
+        status = data.get('status')
+
+        if not isinstance(jobcard_ids, list) or not jobcard_ids \
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in jobcard_ids):
+            return {'error': 'ids must be a non-empty list of integers'}, 400
+        if status not in JOBCARD_STATUSES:
+            return {'error': f'Invalid status. Must be one of: {", ".join(JOBCARD_STATUSES)}'}, 400
+
+        max_items = current_app.config['BULK_MAX_ITEMS']
+        if len(jobcard_ids) > max_items:
+            return {'error': f'At most {max_items} jobcards can be updated at once'}, 400
+
+        jobcard_ids = list(dict.fromkeys(jobcard_ids))
+        jobcards = {jobcard.id: jobcard for jobcard in Jobcards.query.filter(Jobcards.id.in_(jobcard_ids))}
+        changed = {jobcard_id for jobcard_id in jobcard_ids
+                   if jobcard_id in jobcards and jobcards[jobcard_id].status != status}
+        for jobcard_id in changed:
+            jobcards[jobcard_id].status = status
+        db.session.flush()
+
+        emails_queued = 0
+        if data.get('notify', True):
+            emails_queued = queue_jobcard_emails(changed, lambda row: email_service.send_jobcard_status_notification(
+                client_name=row.client_name,
+                client_email=row.client_email,
+                jobcard_id=row.id,
+                status=status,
+                device_model=row.device_model,
+                device_brand=row.device_brand,
+                commit=False
+            ))
+
+        # The status changes and their emails commit together
+        db.session.commit()
+        if emails_queued:
+            email_service.notify()
+
+        return {
+            'message': f'{len(changed)} jobcard(s) moved to {status}',
+            'updated': sorted(changed),
+            'unchanged': [jobcard_id for jobcard_id in jobcard_ids if jobcard_id in jobcards and jobcard_id not in changed],
+            'not_found': [jobcard_id for jobcard_id in jobcard_ids if jobcard_id not in jobcards],
+            'emails_queued': emails_queued
+        }, 200
+
+@jobcards_ns.route('/search', endpoint='jobcards_search')
+class JobcardSearchResource(Resource):
+    def get(self):
+        """
+        Search jobcards by client name/email, device brand/model and problem/diagnostic text.
+
+        Every word must match, exactly, as a prefix or fuzzily, so "Dell flicker
+        Wanjiru" finds Wanjiru's flickering Dell. Results are ranked by relevance
+        and each carries its `score`.
+        """
+        parser = pagination_parser.copy()
+        parser.add_argument('q', type=str, required=True, location='args', help='Words to search for')
+        args = parser.parse_args()
+
+        matches, headers = paginate_ranked(lambda offset, limit: search_jobcards(args['q'], offset, limit), args)
+        scores = dict(matches)
+        rows = Jobcards.query_with_details().filter(Jobcards.id.in_(scores)).all() if scores else []
+
+        results = {}
+        for jobcard_details, row in zip(serialize_jobcards(rows), rows):
+            jobcard_details.update(Jobcards.details_from_row(row))
+            jobcard_details['score'] = round(scores[row.id], 4)
+            results[row.id] = jobcard_details
+
+        # Return in rank order, skipping any jobcard deleted since it was indexed
+        return [results[jobcard_id] for jobcard_id, _ in matches if jobcard_id in results], 200, headers
+
+@jobcards_ns.route('/changes', endpoint='jobcard_changes')
+class JobcardChangesResource(Resource):
+    def get(self):
+        """
+        Retrieve jobcard changes after sequence number `since`.
+
+        With ?wait=<seconds> the request long-polls until a change arrives.
+        With Accept: text/event-stream the changes are streamed as server-sent
+        events instead, resuming from Last-Event-ID on reconnect. Without
+        `since` only the latest sequence number is returned, to start from.
+        Responds 410 if changes after `since` have already been pruned.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument('since', type=int, location='args', help='Sequence number of the last change seen')
+        parser.add_argument('wait', type=float, location='args', default=0, help='Seconds to wait for a change')
+        parser.add_argument('limit', type=int, location='args', help='Maximum number of changes to return')
+        args = parser.parse_args()
+
+        limit = page_limit(args['limit'])
+        stream = request.accept_mimetypes.best == 'text/event-stream'
+        since = args['since']
+        if stream and request.headers.get('Last-Event-ID', '').isdigit():
+            since = int(request.headers['Last-Event-ID'])
+
+        latest_seq = change_feed.latest_seq()
+        if since is None:
+            if not stream:
+                return {'changes': [], 'last_seq': latest_seq}, 200
+            since = latest_seq
+
+        oldest_seq = change_feed.oldest_seq()
+        if oldest_seq is not None and since < oldest_seq - 1:
+            return {'message': 'Changes since that sequence number have been pruned; re-fetch the jobcards',
+                    'last_seq': latest_seq}, 410
+
+        if stream:
+            return Response(
+                stream_with_context(stream_jobcard_changes(since, limit)), mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+        wait = min(max(args['wait'], 0), current_app.config['JOBCARD_CHANGES_MAX_WAIT'])
+        changes = change_feed.wait_for_changes(since, wait, limit)
+        return {'changes': changes, 'last_seq': changes[-1]['seq'] if changes else since}, 200
+
+
+def stream_jobcard_changes(since, limit):
+    """Yield server-sent events for jobcard changes after `since`, with periodic keep-alives."""
+    heartbeat = current_app.config['JOBCARD_CHANGES_HEARTBEAT_SECONDS']
+    # Streams end after a while so workers are freed; EventSource reconnects by itself
+    deadline = time.monotonic() + current_app.config['JOBCARD_CHANGES_STREAM_SECONDS']
+    yield 'retry: 2000\n\n'
+    while time.monotonic() < deadline:
+        changes = change_feed.wait_for_changes(since, min(heartbeat, max(0, deadline - time.monotonic())), limit)
+        if not changes:
+            yield ': keep-alive\n\n'
+            continue
+        for change in changes:
+            yield f"id: {change['seq']}\nevent: jobcard\ndata: {json.dumps(change)}\n\n"
+        since = changes[-1]['seq']
+
+
 @jobcards_ns.route('/<int:jobcard_id>/details', endpoint='jobcard_details')
 class JobcardDetailsResource(Resource):
     def get(self, jobcard_id):
         """Retrieve client and device details for a specific jobcard."""
-        jobcard = Jobcards.query.get_or_404(jobcard_id)
-        details = jobcard.get_client_device_info()
-        
+        def load():
+            row = Jobcards.query_with_details().add_columns(Device.client_id, *JOBCARD_RELATED_VERSION_COLUMNS) \
+                .filter(Jobcards.id == jobcard_id).first()
+            if row is None:
+                Jobcards.query.get_or_404(jobcard_id)
+                return None
+            tags = [tag('jobcard', row.id), tag('device', row.device_id), tag('client', row.client_id)]
+            if row.assigned_technician_id is not None:
+                tags.append(tag('user', row.assigned_technician_id))
+            bundle = versioned(
+                Jobcards.details_from_row(row),
+                [(row.id, row.version, row.device_version, row.client_version, row.assigned_technician_id,
+                  row.technician_version)],
+                [row.updated_at, row.device_updated_at, row.client_updated_at, row.technician_updated_at]
+            )
+            return bundle, tags
+
+        details = response_cache.get_or_load('jobcard_details', jobcard_id, load)
+
         if details:
-            return details, 200
+            return conditional_response(details)
         else:
             return {"message": "Details not found for the specified jobcard."}, 404
         
@@ -415,9 +955,8 @@ class JobcardUpdateResource(Resource):
         updated_fields = []
         
         if 'status' in data:
-            valid_statuses = ['pending', 'in_progress', 'completed', 'cancelled']
-            if data['status'] not in valid_statuses:
-                return {'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}, 400
+            if data['status'] not in JOBCARD_STATUSES:
+                return {'error': f'Invalid status. Must be one of: {", ".join(JOBCARD_STATUSES)}'}, 400
             jobcard.status = data['status']
             updated_fields.append('status')
             
@@ -447,110 +986,10 @@ class JobcardUpdateResource(Resource):
             db.session.rollback()
             return {'error': str(e)}, 500
 
-def generate_invoice_pdf(invoice_data):
-    """
-    Generate a PDF invoice from the provided invoice data
-    
-    :param invoice_data: Dictionary containing invoice details
-    :return: BytesIO object with PDF content
-    """
-    # Create a buffer for the PDF
-    buffer = io.BytesIO()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    
-    # Company Header
-    elements.append(Paragraph("Laptop Care Service", styles['Title']))
-    elements.append(Paragraph("Invoice", styles['Heading2']))
-    
-    # Company Details
-    company_details = [
-        ["Laptop Care Service"],
-        ["Nairobi, Kenya"],
-        ["Phone: +254 (0) 700 000 000"],
-        ["Email: support@laptopcare.com"]
-    ]
-    company_details_table = Table(company_details, colWidths=[6*inch])
-    company_details_table.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'RIGHT'),
-        ('FONTNAME', (0,0), (-1,-1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,-1), 10),
-    ]))
-    elements.append(company_details_table)
-    
-    # Client Information
-    client_info = [
-        ["Bill To:", "Invoice Details:"],
-        [invoice_data['client_name'], f"Invoice Number: {invoice_data['jobcard_id']}"],
-        [invoice_data['client_email'], f"Date: {datetime.now().strftime('%Y-%m-%d')}"],
-        [invoice_data['device_info'], ""]
-    ]
-    client_info_table = Table(client_info, colWidths=[3*inch, 3*inch])
-    client_info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (1,0), colors.grey),
-        ('TEXTCOLOR', (0,0), (1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 12),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 12),
-        ('BACKGROUND', (0,1), (-1,-1), colors.beige),
-    ]))
-    elements.append(client_info_table)
-    
-    # Invoice Items
-    items_data = [['Type', 'Description', 'Quantity', 'Unit Price', 'Total']]
-    total_amount = 0
-    for item in invoice_data['items']:
-        # Default quantity to 1 if not specified
-        quantity = item.get('quantity', 1)
-        unit_price = float(item['price'])
-        item_total = quantity * unit_price
-        total_amount += item_total
-        
-        items_data.append([
-            item['type'].capitalize(), 
-            item['description'], 
-            str(quantity),
-            f"Ksh {unit_price:,.2f}", 
-            f"Ksh {item_total:,.2f}"
-        ])
-    
-    # Add total row
-    items_data.append(['', '', '', 'Total:', f"Ksh {total_amount:,.2f}"])
-    
-    items_table = Table(items_data, colWidths=[1*inch, 3*inch, 1*inch, 1.5*inch, 1.5*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.grey),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 12),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 12),
-        ('BACKGROUND', (0,1), (-1,-1), colors.beige),
-        ('GRID', (0,0), (-1,-1), 1, colors.black)
-    ]))
-    elements.append(items_table)
-    
-    # Additional Notes
-    elements.append(Paragraph("Thank you for your business!", styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Move buffer pointer to the beginning
-    buffer.seek(0)
-    return buffer
-
 @jobcards_ns.route('/generate-invoice', endpoint='generate_invoice')
 class InvoiceGenerationResource(Resource):
     def post(self):
+        """Generate an invoice PDF, or queue it for rendering when called with ?async=true."""
         data = request.get_json()
         required_fields = ['jobcard_id', 'client_name', 'client_email', 'device_info', 'items', 'total']
         
@@ -559,62 +998,165 @@ class InvoiceGenerationResource(Resource):
             if field not in data:
                 return {'error': f'Missing required field: {field}'}, 400
 
+        if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+            try:
+                job = invoice_service.submit(data)
+            except InvoiceQueueFull as e:
+                return {'error': str(e)}, 503, {'Retry-After': '5'}
+            except InvoiceRenderUnavailable as e:
+                return {**e.job.to_dict(), 'error': str(e)}, 503, {'Retry-After': '5'}
+
+            status_url = api.url_for(InvoiceJobResource, job_id=job.id)
+            return {**job.to_dict(), 'status_url': status_url}, 202, {'Location': status_url}
+
         try:
-            # Generate PDF
-            pdf_buffer = generate_invoice_pdf(data)
-            
-            # Prepare email body with PDF details
-            email_html_body = f'''
-            <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f4f4f4;">
-                    <h2 style="color: #2c3e50;">Invoice for Job Card #{data['jobcard_id']}</h2>
-                    <p>Dear {data['client_name']},</p>
-                    
-                    <p>Please find attached the invoice for your recent laptop repair service.</p>
-                    
-                    <div style="margin: 20px 0; padding: 15px; border: 1px solid #ddd; border-radius: 5px; background-color: white;">
-                        <p><strong>Job Card ID:</strong> {data['jobcard_id']}</p>
-                        <p><strong>Device:</strong> {data['device_info']}</p>
-                        <p><strong>Total Cost:</strong> Ksh {float(data['total']):,.2f}</p>
-                    </div>
-                    
-                    <p>Thank you for choosing Laptop Care Service!</p>
-                </div>
-            </body>
-            </html>
-            '''
-            
-            # Save PDF to a file
-            pdf_filename = f"invoice_{data['jobcard_id']}.pdf"
-            pdf_path = os.path.join(current_app.root_path, 'invoices', pdf_filename)
-            
-            # Ensure invoices directory exists
-            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+            # Generate PDF, or reuse the stored one for an identical invoice
+            pdf_bytes, cache_key = get_invoice_pdf(data)
             
-            with open(pdf_path, 'wb') as f:
-                f.write(pdf_buffer.getvalue())
-            
-            # Send email using email service with PDF attachment
-            email_service.send_email(
-                subject=f"Invoice for Job Card #{data['jobcard_id']}", 
-                recipient=data['client_email'], 
-                html_body=email_html_body,
-                attachments=[{
-                    'filename': pdf_filename,
-                    'content': pdf_buffer.getvalue(),
-                    'subtype': 'pdf'
-                }]
-            )
+            # Email the invoice to the client
+            email_invoice(data, pdf_bytes)
             
             # Return PDF as a response
-            return send_file(
-                pdf_buffer, 
+            response = send_file(
+                io.BytesIO(pdf_bytes), 
                 mimetype='application/pdf', 
                 as_attachment=True, 
-                download_name=pdf_filename
+                download_name=invoice_filename(data),
+                etag=cache_key
             )
+            response.headers['Content-Location'] = api.url_for(InvoiceDownloadResource, cache_key=cache_key)
+            return response
             
         except Exception as e:
             current_app.logger.error(f"Invoice generation error: {str(e)}")
             return {'error': str(e)}, 500
+
+@jobcards_ns.route('/invoices/<string:cache_key>', endpoint='invoice_download')
+class InvoiceDownloadResource(Resource):
+    def get(self, cache_key):
+        """Download a previously generated invoice by its content hash, honouring If-None-Match."""
+        # The content hash is the ETag, so a matching poll needs no cache lookup at all
+        if cache_key in request.if_none_match:
+            return '', 304, {'ETag': f'"{cache_key}"'}
+
+        pdf_bytes = invoice_cache.get(cache_key)
+        if pdf_bytes is None:
+            return {'error': 'Invoice not found'}, 404
+
+        return send_file(
+            io.BytesIO(pdf_bytes),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'invoice_{cache_key[:12]}.pdf',
+            etag=cache_key
+        )
+
+@jobcards_ns.route('/invoices/batch', endpoint='invoice_batch')
+class InvoiceBatchResource(Resource):
+    def post(self):
+        """Render invoices for many jobcards and stream them back as a ZIP archive."""
+        data = request.get_json(silent=True) or {}
+        jobcard_ids = data.get('jobcard_ids')
+
+        if not isinstance(jobcard_ids, list) or not jobcard_ids or not all(isinstance(i, int) for i in jobcard_ids):
+            return {'error': 'jobcard_ids must be a non-empty list of integers'}, 400
+
+        max_jobcards = current_app.config['INVOICE_BATCH_MAX_JOBCARDS']
+        if len(jobcard_ids) > max_jobcards:
+            return {'error': f'At most {max_jobcards} jobcards can be invoiced per batch'}, 400
+
+        chunks = invoice_service.stream_batch_zip(
+            list(dict.fromkeys(jobcard_ids)),
+            send_emails=bool(data.get('send_emails', True))
+        )
+        return Response(
+            stream_with_context(chunks),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=invoices.zip'}
+        )
+
+@jobcards_ns.route('/invoice-jobs/<string:job_id>', endpoint='invoice_job')
+class InvoiceJobResource(Resource):
+    def get(self, job_id):
+        """Retrieve the status of an invoice job, optionally long-polling with ?wait=<seconds>."""
+        parser = reqparse.RequestParser()
+        parser.add_argument('wait', type=float, location='args', default=0, help='Seconds to wait for the job to finish')
+        args = parser.parse_args()
+
+        job = InvoiceJob.query.get_or_404(job_id)
+        if job.status == InvoiceJob.QUEUED and args['wait'] > 0:
+            invoice_service.wait_for(job_id, min(args['wait'], current_app.config['INVOICE_LONG_POLL_MAX_WAIT']))
+            db.session.refresh(job)
+
+        response = job.to_dict()
+        if job.status == InvoiceJob.COMPLETED:
+            response['download_url'] = api.url_for(InvoiceJobDownloadResource, job_id=job.id)
+        return response, 200
+
+@jobcards_ns.route('/invoice-jobs/<string:job_id>/download', endpoint='invoice_job_download')
+class InvoiceJobDownloadResource(Resource):
+    def get(self, job_id):
+        """Download the PDF rendered by a completed invoice job."""
+        job = InvoiceJob.query.get_or_404(job_id)
+        if job.status != InvoiceJob.COMPLETED:
+            return {'error': f'Invoice job is {job.status}'}, 409
+        if not os.path.exists(job.file_path):
+            return {'error': 'Invoice PDF is no longer available'}, 410
+
+        return send_file(
+            job.file_path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f"invoice_{job.jobcard_id}.pdf"
+        )
+
+# Email outbox administration routes
+@emails_ns.route('/dead-letters', endpoint='email_dead_letters')
+class EmailDeadLetterListResource(Resource):
+    def get(self):
+        """Retrieve a page of emails that exhausted their delivery attempts."""
+        args = pagination_parser.parse_args()
+        query = EmailOutbox.query.filter_by(status=EmailOutbox.DEAD)
+        dead_letters, headers = paginate(query, EmailOutbox.id, args)
+        return [email.to_dict() for email in dead_letters], 200, headers
+
+@emails_ns.route('/dead-letters/replay', endpoint='email_dead_letters_replay')
+class EmailDeadLetterReplayResource(Resource):
+    def post(self):
+        """Requeue dead-lettered emails, either the given ids or all of them."""
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return {'error': 'ids must be a list of integers'}, 400
+
+        replayed = email_service.replay_dead_letters(ids)
+        return {'message': f'{replayed} email(s) requeued for delivery', 'replayed': replayed}, 200
+
+
+# Response cache administration
+@cache_ns.route('/stats', endpoint='cache_stats')
+class CacheStatsResource(Resource):
+    def get(self):
+        """Retrieve this process's response cache hit and miss counters."""
+        return response_cache.stats(), 200
+
+
+@cache_ns.route('', endpoint='cache')
+class CacheResource(Resource):
+    def delete(self):
+        """Drop every cached response."""
+        response_cache.clear()
+        return '', 204
+
+
+@stats_ns.route('/queries', endpoint='query_stats')
+class QueryStatsResource(Resource):
+    def get(self):
+        """Retrieve this process's per-endpoint query counts and database time."""
+        return query_instrumentation.stats(), 200
+
+    def delete(self):
+        """Reset the per-endpoint statistics."""
+        query_instrumentation.reset()
+        return '', 204
@@ -0,0 +1,328 @@
+"""
+Full-text and fuzzy search over jobcards, their clients and their devices.
+
+Every jobcard has a row in jobcard_search_documents holding its client's name
+and email, its device's brand and model and its own problem description and
+diagnostic. The rows are rebuilt by mapper events whenever any of those
+columns change, in the same transaction as the change.
+
+On Postgres the documents are searched through GIN full-text (tsvector) and
+trigram indexes. Other databases (SQLite in development) use SearchIndex, an
+in-process inverted index loaded from the same table on first use and updated
+as this process commits writes. Writes made by other processes are only picked
+up when the index is rebuilt.
+"""
+import logging
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from flask import current_app
+from sqlalchemy import event, func, literal, literal_column, or_, select
+from sqlalchemy.orm import Session, object_session
+from .models import db, Client, Device, Jobcards, JobcardSearchDocument
+
+logger = logging.getLogger(__name__)
+
+# Longest search accepted, in terms; the rest of the query is ignored
+MAX_QUERY_TERMS = 8
+# Most vocabulary tokens one query term may expand to through prefix matching
+MAX_PREFIX_EXPANSIONS = 50
+# Weight of a prefix match relative to an exact token match
+PREFIX_MATCH_WEIGHT = 0.9
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """Split text into lower-case alphanumeric tokens."""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def trigrams(token):
+    """The trigrams of a token, padded the way pg_trgm pads words."""
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_documents(connection, condition):
+    """Build the search documents of the jobcards matching `condition`."""
+    rows = connection.execute(
+        select(
+            Jobcards.id, Client.name, Client.email, Device.brand, Device.device_model,
+            Jobcards.problem_description, Jobcards.diagnostic
+        )
+        .select_from(Jobcards)
+        .join(Device, Jobcards.device_id == Device.id)
+        .join(Client, Device.client_id == Client.id)
+        .where(condition)
+    )
+    return [
+        {'jobcard_id': row[0], 'document': ' '.join(value for value in row[1:] if value)}
+        for row in rows
+    ]
+
+
+class SearchIndex:
+    """
+    In-process inverted index over the jobcard search documents.
+
+    Queries match every term, either exactly, as a prefix of an indexed token
+    or fuzzily through trigram similarity, and results are ranked with BM25.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._postings = defaultdict(dict)   # token -> {jobcard_id: term frequency}
+        self._documents = {}                 # jobcard_id -> Counter of its tokens
+        self._lengths = {}                   # jobcard_id -> document length in tokens
+        self._total_length = 0
+        self._trigrams = defaultdict(set)    # trigram -> tokens containing it
+        self._vocabulary = []                # sorted tokens, for prefix matching
+
+    def build(self):
+        """(Re)load the whole index from the jobcard_search_documents table."""
+        query = db.session.query(JobcardSearchDocument.jobcard_id, JobcardSearchDocument.document)
+        with self._lock:
+            self._clear()
+            for jobcard_id, document in query.yield_per(1000):
+                self._add(jobcard_id, document)
+            self._built = True
+        logger.info(f"Search index built with {len(self._documents)} document(s)")
+
+    def apply(self, changes):
+        """Apply committed document changes, a mapping of jobcard id to document (None when deleted)."""
+        with self._lock:
+            # Until the first build there's nothing to update; the build reads the committed rows
+            if not self._built:
+                return
+            for jobcard_id, document in changes.items():
+                self._remove(jobcard_id)
+                if document is not None:
+                    self._add(jobcard_id, document)
+
+    def search(self, text, offset=0, limit=20):
+        """Return a page of (jobcard_id, score) pairs matching every term of `text`, best first."""
+        terms = tokenize(text)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        if not self._built:
+            self.build()
+
+        threshold = current_app.config['SEARCH_SIMILARITY_THRESHOLD']
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = self._score_term(term, threshold)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {jobcard_id: score + term_scores[jobcard_id]
+                              for jobcard_id, score in scores.items() if jobcard_id in term_scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[offset:offset + limit]
+
+    def _score_term(self, term, threshold):
+        document_count = len(self._documents)
+        average_length = self._total_length / document_count if document_count else 0
+        scores = {}
+        for token, weight in self._expand(term, threshold).items():
+            postings = self._postings[token]
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for jobcard_id, frequency in postings.items():
+                length_norm = 1 - BM25_B + BM25_B * self._lengths[jobcard_id] / average_length
+                score = weight * idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                # A document matching several expansions of a term counts its best match
+                if score > scores.get(jobcard_id, 0):
+                    scores[jobcard_id] = score
+        return scores
+
+    def _expand(self, term, threshold):
+        """Map the indexed tokens a query term matches to the weight of the match."""
+        expansions = {}
+        if term in self._postings:
+            expansions[term] = 1.0
+
+        start = bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            expansions.setdefault(token, PREFIX_MATCH_WEIGHT)
+
+        if len(term) >= 3:
+            term_trigrams = trigrams(term)
+            candidates = set()
+            for trigram in term_trigrams:
+                candidates.update(self._trigrams.get(trigram, ()))
+            for token in candidates:
+                token_trigrams = trigrams(token)
+                similarity = len(term_trigrams & token_trigrams) / len(term_trigrams | token_trigrams)
+                if similarity >= threshold and similarity > expansions.get(token, 0):
+                    expansions[token] = similarity
+        return expansions
+
+    def _add(self, jobcard_id, document):
+        tokens = Counter(tokenize(document))
+        self._documents[jobcard_id] = tokens
+        self._lengths[jobcard_id] = sum(tokens.values())
+        self._total_length += self._lengths[jobcard_id]
+        for token, frequency in tokens.items():
+            if token not in self._postings:
+                insort(self._vocabulary, token)
+                for trigram in trigrams(token):
+                    self._trigrams[trigram].add(token)
+            self._postings[token][jobcard_id] = frequency
+
+    def _remove(self, jobcard_id):
+        tokens = self._documents.pop(jobcard_id, None)
+        if tokens is None:
+            return
+        self._total_length -= self._lengths.pop(jobcard_id)
+        for token in tokens:
+            postings = self._postings[token]
+            postings.pop(jobcard_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+                for trigram in trigrams(token):
+                    self._trigrams[trigram].discard(token)
+                    if not self._trigrams[trigram]:
+                        del self._trigrams[trigram]
+
+    def _clear(self):
+        self._postings.clear()
+        self._documents.clear()
+        self._lengths.clear()
+        self._total_length = 0
+        self._trigrams.clear()
+        self._vocabulary.clear()
+
+
+search_index = SearchIndex()
+
+
+def _search_postgres(text, offset, limit):
+    terms = tokenize(text)[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    vector = JobcardSearchDocument.search_vector()
+    document = JobcardSearchDocument.document
+    simple = literal_column("'simple'::regconfig")
+
+    # Each term must match as a (prefix of a) word or fuzzily via trigrams;
+    # both operators are served by the GIN indexes
+    conditions = [
+        or_(vector.op('@@')(func.to_tsquery(simple, f'{term}:*')), literal(term).op('<%')(document))
+        for term in terms
+    ]
+    rank = func.ts_rank(vector, func.to_tsquery(simple, ' | '.join(f'{term}:*' for term in terms)))
+    for term in terms:
+        rank = rank + func.word_similarity(term, document)
+
+    rows = (
+        db.session.query(JobcardSearchDocument.jobcard_id, rank.label('score'))
+        .filter(*conditions)
+        .order_by(rank.desc(), JobcardSearchDocument.jobcard_id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return [(row.jobcard_id, float(row.score)) for row in rows]
+
+
+def search_jobcards(text, offset=0, limit=20):
+    """
+    Search jobcards by their client, device and problem text.
+
+    :return: A page of (jobcard_id, score) pairs, best match first
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return _search_postgres(text, offset, limit)
+    return search_index.search(text, offset, limit)
+
+
+# Keeping the documents up to date
+
+def refresh_search_documents(connection, session, condition):
+    """Rebuild the stored search documents of the jobcards matching `condition`."""
+    documents = build_documents(connection, condition)
+    if not documents:
+        return
+    table = JobcardSearchDocument.__table__
+    connection.execute(table.delete().where(table.c.jobcard_id.in_([doc['jobcard_id'] for doc in documents])))
+    connection.execute(table.insert(), documents)
+    _track_changes(connection, session, {doc['jobcard_id']: doc['document'] for doc in documents})
+
+
+def _track_changes(connection, session, changes):
+    # Postgres indexes the table itself; elsewhere remember the changes for the
+    # in-process index until the transaction commits
+    if connection.dialect.name != 'postgresql' and session is not None:
+        session.info.setdefault('search_changes', {}).update(changes)
+
+
+def _changed(target, attributes):
+    state = db.inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _insert_jobcard(mapper, connection, jobcard):
+    # New jobcards are indexed together at the end of the flush, with one
+    # statement per step however many were inserted
+    object_session(jobcard).info.setdefault('new_search_jobcards', []).append(jobcard.id)
+
+
+def _index_new_jobcards(session, flush_context):
+    jobcard_ids = session.info.pop('new_search_jobcards', None)
+    if jobcard_ids:
+        refresh_search_documents(session.connection(), session, Jobcards.id.in_(jobcard_ids))
+
+
+def _refresh_jobcard(mapper, connection, jobcard):
+    if _changed(jobcard, ('problem_description', 'diagnostic', 'device_id')):
+        refresh_search_documents(connection, object_session(jobcard), Jobcards.id == jobcard.id)
+
+
+def _delete_jobcard(mapper, connection, jobcard):
+    table = JobcardSearchDocument.__table__
+    connection.execute(table.delete().where(table.c.jobcard_id == jobcard.id))
+    _track_changes(connection, object_session(jobcard), {jobcard.id: None})
+
+
+def _refresh_device(mapper, connection, device):
+    if _changed(device, ('brand', 'device_model', 'client_id')):
+        refresh_search_documents(connection, object_session(device), Device.id == device.id)
+
+
+def _refresh_client(mapper, connection, client):
+    if _changed(client, ('name', 'email')):
+        refresh_search_documents(connection, object_session(client), Client.id == client.id)
+
+
+def _apply_committed_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if changes:
+        search_index.apply(changes)
+
+
+def _discard_changes(session):
+    session.info.pop('search_changes', None)
+    session.info.pop('new_search_jobcards', None)
+
+
+db.event.listen(Jobcards, 'after_insert', _insert_jobcard)
+db.event.listen(Jobcards, 'after_update', _refresh_jobcard)
+db.event.listen(Jobcards, 'before_delete', _delete_jobcard)
+db.event.listen(Device, 'after_update', _refresh_device)
+db.event.listen(Client, 'after_update', _refresh_client)
+event.listen(Session, 'after_flush', _index_new_jobcards)
+event.listen(Session, 'after_commit', _apply_committed_changes)
+event.listen(Session, 'after_rollback', _discard_changes)
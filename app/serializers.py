@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+from sqlalchemy import Date, DateTime, Numeric, Time
+from .models import db, Client, Device, Users, Jobcards
+
+# Match the formats SerializerMixin.to_dict() uses so the JSON shape doesn't change
+DATE_FORMAT = '%Y-%m-%d'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIME_FORMAT = '%H:%M'
+
+
+def _format_temporal(str_format):
+    def convert(value):
+        if isinstance(value, (date, datetime, time)):
+            return value.strftime(str_format)
+        return value
+    return convert
+
+
+def _format_decimal(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _converter_for(column_type):
+    """Return the value converter for a column type, or None if values pass through as-is."""
+    if isinstance(column_type, DateTime):
+        return _format_temporal(DATETIME_FORMAT)
+    if isinstance(column_type, Date):
+        return _format_temporal(DATE_FORMAT)
+    if isinstance(column_type, Time):
+        return _format_temporal(TIME_FORMAT)
+    if isinstance(column_type, Numeric):
+        return _format_decimal
+    return None
+
+
+class ColumnSerializer:
+    """
+    Precompiled serializer projecting a fixed list of model columns into dicts.
+
+    Rows are read straight from column queries, so no ORM objects are hydrated
+    and no relationships are walked at serialization time.
+    """
+
+    def __init__(self, model, exclude=()):
+        self.model = model
+        self.columns = tuple(
+            getattr(model, column.key) for column in model.__table__.columns
+            if column.key not in exclude
+        )
+        self.names = tuple(column.key for column in self.columns)
+        self.converters = tuple(
+            (column.key, converter) for column in self.columns
+            if (converter := _converter_for(column.type)) is not None
+        )
+
+    def query(self):
+        """Build a query selecting only this serializer's columns."""
+        return db.session.query(*self.columns)
+
+    def row_to_dict(self, row):
+        """Convert a row whose leading columns are this serializer's columns."""
+        data = dict(zip(self.names, row))
+        for name, converter in self.converters:
+            data[name] = converter(data[name])
+        return data
+
+    def fetch_by(self, column, values):
+        """Fetch serialized rows whose `column` is in `values`, grouped by that column."""
+        grouped = defaultdict(list)
+        if not values:
+            return grouped
+        key_index = self.names.index(column.key)
+        for row in self.query().filter(column.in_(values)).order_by(self.model.id):
+            grouped[row[key_index]].append(self.row_to_dict(row))
+        return grouped
+
+
+client_serializer = ColumnSerializer(Client)
+device_serializer = ColumnSerializer(Device)
+user_serializer = ColumnSerializer(Users, exclude=('password',))
+jobcard_serializer = ColumnSerializer(Jobcards)
+
+
+def serialize_clients(rows):
+    """Serialize client rows with their devices, as Client.to_dict() does."""
+    clients = [client_serializer.row_to_dict(row) for row in rows]
+    devices = device_serializer.fetch_by(Device.client_id, [client['id'] for client in clients])
+    for client in clients:
+        client['devices'] = devices.get(client['id'], [])
+    return clients
+
+
+def serialize_devices(rows):
+    """Serialize device rows with their owning client, as Device.to_dict() does."""
+    devices = [device_serializer.row_to_dict(row) for row in rows]
+    clients = client_serializer.fetch_by(Client.id, list({device['client_id'] for device in devices}))
+    for device in devices:
+        owner = clients.get(device['client_id'])
+        device['client'] = owner[0] if owner else None
+    return devices
+
+
+def serialize_users(rows):
+    """Serialize user rows (without passwords) with their assigned jobcards."""
+    users = [user_serializer.row_to_dict(row) for row in rows]
+    jobcards = jobcard_serializer.fetch_by(Jobcards.assigned_technician_id, [user['id'] for user in users])
+    for user in users:
+        user['jobcards'] = jobcards.get(user['id'], [])
+    return users
+
+
+def serialize_jobcards(rows):
+    """Serialize jobcard rows with their assigned technician, as Jobcards.to_dict() does."""
+    jobcards = [jobcard_serializer.row_to_dict(row) for row in rows]
+    technician_ids = list({
+        jobcard['assigned_technician_id'] for jobcard in jobcards
+        if jobcard['assigned_technician_id'] is not None
+    })
+    technicians = {}
+    if technician_ids:
+        technicians = {
+            user['id']: user
+            for user in serialize_users(user_serializer.query().filter(Users.id.in_(technician_ids)))
+        }
+    for jobcard in jobcards:
+        jobcard['user'] = technicians.get(jobcard['assigned_technician_id'])
+    return jobcards
+
+
+# Media types of the supported export formats
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def export_rows(query, serializer, export_format, extra_fields=(), batch_size=1000):
+    """
+    Yield every row of a column query as NDJSON lines or CSV text.
+
+    Rows are read through a server-side cursor `batch_size` at a time and each
+    batch is yielded as soon as it is formatted, so memory use and time to the
+    first byte don't depend on the size of the table.
+
+    :param query: Column query whose leading columns are the serializer's columns
+    :param serializer: ColumnSerializer for those leading columns
+    :param export_format: 'ndjson' or 'csv'
+    :param extra_fields: Names of any labelled columns that follow the serializer's columns
+    :param batch_size: Rows fetched and yielded per chunk
+    """
+    fieldnames = serializer.names + tuple(extra_fields)
+    extra_start = len(serializer.names)
+
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fieldnames)
+
+        def format_row(row):
+            writer.writerow(list(serializer.row_to_dict(row).values()) + list(row[extra_start:]))
+
+        def drain():
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return data
+    else:
+        lines = []
+
+        def format_row(row):
+            data = serializer.row_to_dict(row)
+            data.update(zip(extra_fields, row[extra_start:]))
+            lines.append(json.dumps(data, default=str))
+            lines.append('\n')
+
+        def drain():
+            data = ''.join(lines)
+            lines.clear()
+            return data
+
+    pending = 0
+    for row in query.yield_per(batch_size):
+        format_row(row)
+        pending += 1
+        if pending == batch_size:
+            yield drain()
+            pending = 0
+
+    data = drain()
+    if data:
+        yield data
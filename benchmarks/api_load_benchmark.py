@@ -0,0 +1,372 @@
+"""
+Load and latency benchmark for the REST API.
+
+Seeds a scratch database with `flask seed`'s fixture generator, then drives
+the clients, devices, users and jobcards namespaces in-process through
+Flask's test client with a few realistic traffic mixes:
+
+    intake      bursts of jobcard intake: new clients, devices and jobcards
+    dashboard   front desk polling of GET /jobcards?status=, with and without
+                If-None-Match, plus the technician list
+    login       login storms against POST /users/login
+    lookup      client and device lookups by id, phone number and serial
+    mixed       all of the above, weighted like a working day
+
+Each scenario runs a fixed number of requests across --concurrency threads
+and reports throughput, p50/p95/p99 latency, SQL queries per request and the
+process RSS, overall and per endpoint. Results are written as JSON, tagged
+with the current git commit; pass a previous results file as --baseline to
+print the change against it.
+
+Requests go through the whole WSGI stack but not over a socket, so the
+numbers measure the application and database rather than a web server. The
+target database is dropped and recreated, so only point --database-uri at a
+scratch database. Without it a temporary SQLite file is used.
+
+Usage:
+    python benchmarks/api_load_benchmark.py [--scenarios intake dashboard] [--requests 500]
+        [--concurrency 4] [--jobcards 20000] [--database-uri postgresql://...]
+        [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--scenarios', nargs='+', default=None, help='Scenarios to run (default: all)')
+parser.add_argument('--requests', type=int, default=500, help='Timed requests per scenario')
+parser.add_argument('--warmup', type=int, default=50, help='Untimed requests before each scenario')
+parser.add_argument('--concurrency', type=int, default=4, help='Threads issuing requests')
+parser.add_argument('--clients', type=int, default=2000, help='Clients to seed')
+parser.add_argument('--devices', type=int, default=6000, help='Devices to seed')
+parser.add_argument('--users', type=int, default=50, help='Users to seed')
+parser.add_argument('--jobcards', type=int, default=20000, help='Jobcards to seed')
+parser.add_argument('--seed', type=int, default=42, help='Random seed for the data and the request mix')
+parser.add_argument('--database-uri', help='Scratch database to use (dropped and recreated)')
+parser.add_argument('--output', default='api_load_results.json', help='Where to write the JSON results')
+parser.add_argument('--baseline', help='Previous results file to compare against')
+args = parser.parse_args()
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'api_load_benchmark.db')
+os.environ['DATABASE_URI'] = args.database_uri or f'sqlite:///{DB_PATH}'
+os.environ['EMAIL_WORKER_THREADS'] = '0'
+os.environ['MAIL_USERNAME'] = ''
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from app import app, db  # noqa: E402
+from app.fixtures import seed_database, STATUSES  # noqa: E402
+from app.models import Client, Device, Users, Jobcards  # noqa: E402
+
+# Seeded users all share this password
+PASSWORD = 'benchmark'
+
+
+# Measurement
+
+_request_state = threading.local()
+
+
+def _count_query(*_):
+    _request_state.queries = getattr(_request_state, 'queries', 0) + 1
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc isn't available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles (ms), error count, mean queries and, given the wall time, throughput."""
+    latencies = sorted(sample['latency'] for sample in samples)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample['ok']),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'queries_per_request': round(statistics.fmean(sample['queries'] for sample in samples), 2)
+    }
+    if elapsed is not None:
+        summary['throughput_rps'] = round(len(samples) / elapsed, 1)
+    return summary
+
+
+# Traffic
+
+class Dataset:
+    """Ids and keys of the seeded rows, for building requests."""
+
+    def __init__(self):
+        self.client_ids = [row[0] for row in db.session.query(Client.id).order_by(Client.id)]
+        self.device_ids = [row[0] for row in db.session.query(Device.id).order_by(Device.id)]
+        self.jobcard_ids = [row[0] for row in db.session.query(Jobcards.id).order_by(Jobcards.id)]
+        self.usernames = [row[0] for row in db.session.query(Users.username).order_by(Users.id)]
+        self.technician_ids = [row[0] for row in db.session.query(Users.id).filter(Users.role == 'technician')]
+        self.phones = [row[0] for row in db.session.query(Client.phone_number).order_by(Client.id).limit(1000)]
+        self.serials = [row[0] for row in db.session.query(Device.device_serial_number).order_by(Device.id).limit(1000)]
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def unique(self):
+        """A process-wide unique number for new emails and serial numbers."""
+        with self._lock:
+            self._sequence += 1
+            return self._sequence
+
+
+def new_client(rng, data, etags):
+    n = data.unique()
+    return 'POST /clients', 'post', '/clients', {'json': {
+        'name': f'Load Client {n}', 'email': f'load{n}.{rng.randrange(10 ** 9)}@example.com',
+        'phone_number': f'07{rng.randrange(10 ** 8):08d}'
+    }}, (201,)
+
+
+def new_device(rng, data, etags):
+    n = data.unique()
+    return 'POST /devices', 'post', '/devices', {'json': {
+        'device_serial_number': f'LOAD{n}-{rng.randrange(10 ** 9)}', 'device_model': 'Latitude 5420',
+        'brand': 'Dell', 'client_id': rng.choice(data.client_ids), 'battery_serial_number': f'LB{n}'
+    }}, (201,)
+
+
+def new_jobcard(rng, data, etags):
+    return 'POST /jobcards', 'post', '/jobcards', {'json': {
+        'device_id': rng.choice(data.device_ids), 'problem_description': 'Screen flickering after a drop',
+        'status': 'pending', 'assigned_technician_id': rng.choice(data.technician_ids) if data.technician_ids else None
+    }}, (201,)
+
+
+def update_jobcard(rng, data, etags):
+    jobcard_id = rng.choice(data.jobcard_ids)
+    return 'PATCH /jobcards/<id>/update', 'patch', f'/jobcards/{jobcard_id}/update', {'json': {
+        'status': rng.choice(STATUSES), 'diagnostic': 'Checked', 'cost': rng.randrange(500, 20000)
+    }}, (200,)
+
+
+def poll_jobcards(rng, data, etags):
+    url = f'/jobcards?status={rng.choice(STATUSES)}&limit=50'
+    # Most dashboards poll with the ETag of their last response
+    headers = {'If-None-Match': etags[url]} if url in etags and rng.random() < 0.8 else {}
+    return 'GET /jobcards?status=', 'get', url, {'headers': headers}, (200, 304)
+
+
+def list_technicians(rng, data, etags):
+    return 'GET /users/technicians', 'get', '/users/technicians', {}, (200,)
+
+
+def login(rng, data, etags):
+    username = rng.choice(data.usernames)
+    # One in ten attempts uses a wrong password
+    password = PASSWORD if rng.random() < 0.9 else 'wrong'
+    return 'POST /users/login', 'post', '/users/login', {'json': {
+        'username': username, 'password': password
+    }}, (200,) if password == PASSWORD else (401,)
+
+
+def get_client(rng, data, etags):
+    return 'GET /clients/<id>', 'get', f'/clients/{rng.choice(data.client_ids)}', {}, (200,)
+
+
+def get_device(rng, data, etags):
+    return 'GET /devices/<id>', 'get', f'/devices/{rng.choice(data.device_ids)}', {}, (200,)
+
+
+def get_jobcard_details(rng, data, etags):
+    return 'GET /jobcards/<id>/details', 'get', f'/jobcards/{rng.choice(data.jobcard_ids)}/details', {}, (200,)
+
+
+def search_client_phone(rng, data, etags):
+    return 'GET /clients/search', 'get', '/clients/search', {
+        'query_string': {'phone_number': rng.choice(data.phones)}
+    }, (200,)
+
+
+def search_device_serial(rng, data, etags):
+    return 'GET /devices/search', 'get', '/devices/search', {
+        'query_string': {'device_serial_number': rng.choice(data.serials)}
+    }, (200,)
+
+
+def list_clients(rng, data, etags):
+    return 'GET /clients', 'get', '/clients?limit=50', {}, (200,)
+
+
+# Scenario name -> [(weight, request builder)]
+SCENARIOS = {
+    'intake': [(1, new_client), (2, new_device), (6, new_jobcard)],
+    'dashboard': [(8, poll_jobcards), (1, list_technicians), (1, get_jobcard_details)],
+    'login': [(1, login)],
+    'lookup': [(3, get_client), (3, get_device), (2, search_client_phone), (2, search_device_serial)],
+    'mixed': [
+        (10, poll_jobcards), (6, get_jobcard_details), (4, get_client), (3, get_device),
+        (2, search_client_phone), (2, search_device_serial), (2, list_clients), (2, list_technicians),
+        (2, new_jobcard), (2, update_jobcard), (1, new_client), (1, new_device), (1, login)
+    ],
+}
+
+
+def run_requests(scenario, count, seed, data):
+    """Issue `count` requests from a scenario's mix on one thread; returns the samples."""
+    rng = random.Random(seed)
+    weights, builders = zip(*SCENARIOS[scenario])
+    etags = {}
+    samples = []
+    with app.test_client() as client:
+        for builder in rng.choices(builders, weights=weights, k=count):
+            endpoint, method, url, kwargs, expected = builder(rng, data, etags)
+            _request_state.queries = 0
+            start = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            latency = time.perf_counter() - start
+            if response.headers.get('ETag'):
+                etags[url] = response.headers['ETag']
+            samples.append({
+                'endpoint': endpoint, 'latency': latency, 'queries': _request_state.queries,
+                'ok': response.status_code in expected
+            })
+    return samples
+
+
+def run_scenario(scenario, data, index):
+    def spread(total, seed):
+        # Split `total` requests over the threads, each with its own random stream
+        shares = [total // args.concurrency + (1 if i < total % args.concurrency else 0) for i in range(args.concurrency)]
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            futures = [pool.submit(run_requests, scenario, share, seed + i, data) for i, share in enumerate(shares) if share]
+            return [sample for future in futures for sample in future.result()]
+
+    base_seed = args.seed * 1000 + index * 100
+    spread(args.warmup, base_seed + 50)
+    start = time.perf_counter()
+    samples = spread(args.requests, base_seed)
+    elapsed = time.perf_counter() - start
+
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample['endpoint']].append(sample)
+    result = summarize(samples, elapsed)
+    result['rss_mb'] = round(rss_mb(), 1)
+    result['endpoints'] = {endpoint: summarize(group) for endpoint, group in sorted(by_endpoint.items())}
+    return result
+
+
+# Reporting
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f'\n{"scenario":<12} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"errors":>7} '
+          f'{"RSS MB":>8}')
+    for scenario, result in results['scenarios'].items():
+        print(f'{scenario:<12} {result["throughput_rps"]:>9.1f} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+              f'{result["p99_ms"]:>9.2f} {result["queries_per_request"]:>8.2f} {result["errors"]:>7} '
+              f'{result["rss_mb"]:>8.1f}')
+        for endpoint, summary in result['endpoints'].items():
+            print(f'  {endpoint:<30} {summary["requests"]:>6} req  p50 {summary["p50_ms"]:>8.2f}  '
+                  f'p95 {summary["p95_ms"]:>8.2f}  queries {summary["queries_per_request"]:>6.2f}')
+
+    if not baseline:
+        return
+    print(f'\nChange against {baseline["meta"].get("commit") or "baseline"} (negative latency is better):')
+    for scenario, result in results['scenarios'].items():
+        before = baseline['scenarios'].get(scenario)
+        if not before:
+            continue
+        changes = [
+            f'{label} {100 * (result[key] - before[key]) / before[key]:+.1f}%'
+            for label, key in (('req/s', 'throughput_rps'), ('p50', 'p50_ms'), ('p95', 'p95_ms'), ('p99', 'p99_ms'))
+            if before[key]
+        ]
+        changes.append(f'queries {result["queries_per_request"] - before["queries_per_request"]:+.2f}')
+        print(f'  {scenario:<12} ' + '  '.join(changes))
+
+
+def main():
+    scenarios = args.scenarios or list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenario(s): {", ".join(sorted(unknown))}; choose from {", ".join(SCENARIOS)}')
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Per-request logging would dominate the timings
+    logging.disable(logging.INFO)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = time.perf_counter()
+        seed_database(args.clients, args.devices, args.users, args.jobcards, seed=args.seed, password=PASSWORD,
+                      echo=lambda line: print(f'  seeded {line}'))
+        print(f'Seeded in {time.perf_counter() - start:.1f}s')
+        data = Dataset()
+        db.session.remove()
+        event.listen(db.engine, 'before_cursor_execute', _count_query)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': db.engine.dialect.name,
+                'dataset': {'clients': args.clients, 'devices': args.devices, 'users': args.users,
+                            'jobcards': args.jobcards},
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'seed': args.seed
+            },
+            'scenarios': {}
+        }
+        for index, scenario in enumerate(scenarios):
+            print(f'Running {scenario}...')
+            # Some handlers print debugging output on every request
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                results['scenarios'][scenario] = run_scenario(scenario, data, index)
+
+        event.remove(db.engine, 'before_cursor_execute', _count_query)
+        db.session.remove()
+        if not args.database_uri:
+            db.engine.dispose()
+            os.remove(DB_PATH)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results['meta']['peak_rss_mb'] = round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_results(results, baseline)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Email dispatcher throughput benchmark.
+
+Queues a batch of emails in a throwaway SQLite outbox and times how long the
+EmailService dispatcher takes to deliver them to a local aiosmtpd server, first
+with one thread opening a fresh SMTP session per message (the old behaviour)
+and then with pooled, long-lived sessions across several threads.
+
+Requires aiosmtpd (`pip install aiosmtpd`). The local server has no TLS or
+network latency; use --handshake-ms to add a delay to every EHLO and so
+approximate the connection setup cost of a remote STARTTLS server.
+
+Usage:
+    python benchmarks/email_benchmark.py [--messages 500] [--threads 4] [--handshake-ms 50]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'email_benchmark.db')
+SMTP_PORT = 8025
+os.environ.update({
+    'DATABASE_URI': f'sqlite:///{DB_PATH}',
+    'MAIL_SERVER': '127.0.0.1',
+    'MAIL_PORT': str(SMTP_PORT),
+    'MAIL_USE_TLS': 'false',
+    'MAIL_USERNAME': 'benchmark',
+    'MAIL_PASSWORD': 'benchmark',
+    'MAIL_DEFAULT_SENDER': 'benchmark@laptopcare.test',
+    'EMAIL_OUTBOX_POLL_INTERVAL': '0.05',
+    'EMAIL_WORKER_THREADS': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db  # noqa: E402
+from app.email_service import email_service  # noqa: E402
+from app.models import EmailOutbox  # noqa: E402
+
+
+class CountingHandler:
+    def __init__(self, handshake_delay):
+        self.handshake_delay = handshake_delay
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        await asyncio.sleep(self.handshake_delay)
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 Message accepted for delivery'
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def run_scenario(name, messages, threads, pool_size, batch_size):
+    email_service.stop_email_service()
+    app.config['EMAIL_WORKER_THREADS'] = threads
+    app.config['EMAIL_SMTP_POOL_SIZE'] = pool_size
+    app.config['EMAIL_OUTBOX_BATCH_SIZE'] = batch_size
+
+    with app.app_context():
+        EmailOutbox.query.delete()
+        for i in range(messages):
+            email_service.send_email(
+                subject=f'Benchmark message {i}',
+                recipient=f'client{i}@example.com',
+                html_body='<p>Your laptop is ready for collection.</p>',
+                commit=False
+            )
+        db.session.commit()
+
+        start = time.perf_counter()
+        email_service.init_app(app)
+        while EmailOutbox.query.filter_by(status=EmailOutbox.PENDING).count():
+            db.session.remove()
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        failed = EmailOutbox.query.filter_by(status=EmailOutbox.DEAD).count()
+
+    print(f'{name:<28} {threads:>7} {pool_size:>5} {elapsed:>9.2f} {messages / elapsed:>9.1f} {failed:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500, help='Messages per scenario')
+    parser.add_argument('--threads', type=int, default=4, help='Worker threads for the pooled scenario')
+    parser.add_argument('--handshake-ms', type=float, default=0, help='Delay added to every EHLO')
+    args = parser.parse_args()
+
+    logging.getLogger('mail.log').setLevel(logging.ERROR)
+    handler = CountingHandler(args.handshake_ms / 1000)
+    controller = Controller(
+        handler, hostname='127.0.0.1', port=SMTP_PORT,
+        authenticator=accept_any_login, auth_require_tls=False
+    )
+    controller.start()
+
+    with app.app_context():
+        db.create_all()
+
+    batch_size = app.config['EMAIL_OUTBOX_BATCH_SIZE']
+    print(f'{"scenario":<28} {"threads":>7} {"pool":>5} {"secs":>9} {"msg/s":>9} {"dead":>7}')
+    try:
+        run_scenario('connection per message', args.messages, threads=1, pool_size=0, batch_size=1)
+        run_scenario('pooled sessions', args.messages, threads=args.threads, pool_size=args.threads,
+                     batch_size=batch_size)
+    finally:
+        email_service.stop_email_service()
+        controller.stop()
+        os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Index benchmark for the filter and join columns used by the API.
+
+Seeds a scratch database with (by default) one million jobcards, then runs the
+queries behind the list, search and detail endpoints twice: once without the
+secondary indexes added in migration d1a7c93e5b28 and once with them. For each
+query it prints the plan chosen by the database and the median latency.
+
+The target database is dropped and recreated, so only point --database-uri at a
+scratch database. Without it a temporary SQLite file is used.
+
+Usage:
+    python benchmarks/index_benchmark.py [--jobcards 1000000] [--database-uri postgresql://...]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--jobcards', type=int, default=1_000_000, help='Jobcards to seed')
+parser.add_argument('--database-uri', help='Scratch database to use (dropped and recreated)')
+parser.add_argument('--repeat', type=int, default=20, help='Timed executions per query')
+parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated data')
+args = parser.parse_args()
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'index_benchmark.db')
+os.environ['DATABASE_URI'] = args.database_uri or f'sqlite:///{DB_PATH}'
+os.environ['EMAIL_WORKER_THREADS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text  # noqa: E402
+from app import app, db  # noqa: E402
+from app.models import Client, Device, Users, Jobcards  # noqa: E402
+
+# Indexes added by migration d1a7c93e5b28
+BENCHMARKED_INDEXES = {
+    'ix_clients_phone_number', 'ix_devices_client_id', 'ix_users_username', 'ix_users_role',
+    'ix_jobcards_device_id', 'ix_jobcards_timestamp', 'ix_jobcards_status_id',
+    'ix_jobcards_assigned_technician_id_id', 'ix_jobcards_status_assigned_technician_id_id',
+}
+STATUSES = ['pending', 'in_progress', 'completed', 'cancelled']
+CHUNK = 10_000
+
+
+def insert_chunked(table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            db.session.execute(insert(table), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(table), batch)
+    db.session.commit()
+
+
+def seed(jobcards, rng):
+    clients = max(1, jobcards // 10)
+    devices = max(1, jobcards // 3)
+    technicians = 50
+    start = datetime(2023, 1, 1)
+
+    insert_chunked(Users.__table__, (
+        {'id': i, 'email': f'user{i}@laptopcare.test', 'username': f'user{i}', 'password': 'x',
+         'role': 'technician' if i <= technicians else rng.choice(['admin', 'clerk'])}
+        for i in range(1, technicians + 21)
+    ))
+    insert_chunked(Client.__table__, (
+        {'id': i, 'name': f'Client {i}', 'email': f'client{i}@example.com', 'phone_number': f'07{i:08d}'}
+        for i in range(1, clients + 1)
+    ))
+    insert_chunked(Device.__table__, (
+        {'id': i, 'device_serial_number': f'SN{i:09d}', 'device_model': 'Latitude', 'brand': 'Dell',
+         'client_id': rng.randint(1, clients), 'warranty_status': 'False'}
+        for i in range(1, devices + 1)
+    ))
+    insert_chunked(Jobcards.__table__, (
+        {'id': i, 'problem_description': 'Screen flickering', 'status': rng.choice(STATUSES),
+         'device_id': rng.randint(1, devices), 'cost': rng.randint(500, 20000),
+         'assigned_technician_id': rng.randint(1, technicians) if rng.random() < 0.9 else None,
+         'timestamp': start + timedelta(minutes=i)}
+        for i in range(1, jobcards + 1)
+    ))
+    return clients, devices
+
+
+def benchmark_queries(jobcards, clients, devices):
+    middle = jobcards // 2
+    recent = datetime(2023, 1, 1) + timedelta(minutes=jobcards - 1000)
+    return {
+        'jobcards page by status': Jobcards.query_with_details()
+            .filter(Jobcards.status == 'in_progress', Jobcards.id > middle).order_by(Jobcards.id).limit(101),
+        'jobcards page by technician': Jobcards.query_with_details()
+            .filter(Jobcards.assigned_technician_id == 7, Jobcards.id > middle).order_by(Jobcards.id).limit(101),
+        'jobcards page by status+technician': Jobcards.query_with_details()
+            .filter(Jobcards.status == 'pending', Jobcards.assigned_technician_id == 7, Jobcards.id > middle)
+            .order_by(Jobcards.id).limit(101),
+        'jobcards for a device': db.session.query(Jobcards.id).filter(Jobcards.device_id == devices // 2),
+        'recent jobcards by timestamp': db.session.query(Jobcards.id).filter(Jobcards.timestamp >= recent),
+        'devices for a page of clients': db.session.query(Device.id)
+            .filter(Device.client_id.in_(range(clients // 2, clients // 2 + 100))),
+        'client by phone number': db.session.query(Client.id).filter(Client.phone_number == f'07{clients // 2:08d}'),
+        'technicians by role': db.session.query(Users.id).filter(Users.role == 'technician'),
+        'user by username (login)': db.session.query(Users.id).filter(Users.username == 'user25'),
+    }
+
+
+def explain(query):
+    statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).fetchall()
+        return [row[-1] for row in rows]
+    return [row[0] for row in db.session.execute(text(f'EXPLAIN {statement}')).fetchall()]
+
+
+def run_phase(label, queries, repeat):
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    print(f'\n=== {label} ===')
+    results = {}
+    for name, query in queries.items():
+        plan = explain(query)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query.all()
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+        print(f'\n{name}: {results[name] * 1000:.2f} ms')
+        for line in plan:
+            print(f'    {line}')
+    return results
+
+
+def main():
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        start = time.perf_counter()
+        clients, devices = seed(args.jobcards, rng)
+        print(f'Seeded {args.jobcards} jobcards in {time.perf_counter() - start:.1f}s')
+
+        indexes = [
+            index for table in db.metadata.sorted_tables for index in table.indexes
+            if index.name in BENCHMARKED_INDEXES
+        ]
+        queries = benchmark_queries(args.jobcards, clients, devices)
+
+        for index in indexes:
+            index.drop(db.engine)
+        before = run_phase('without indexes', queries, args.repeat)
+
+        for index in indexes:
+            index.create(db.engine)
+        after = run_phase('with indexes', queries, args.repeat)
+
+        print(f'\n{"query":<38} {"before (ms)":>12} {"after (ms)":>12} {"speedup":>9}')
+        for name in queries:
+            print(f'{name:<38} {before[name] * 1000:>12.2f} {after[name] * 1000:>12.2f} '
+                  f'{before[name] / after[name]:>8.1f}x')
+
+        db.session.remove()
+        if not args.database_uri:
+            db.engine.dispose()
+            os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
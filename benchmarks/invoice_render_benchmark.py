@@ -0,0 +1,83 @@
+"""
+Invoice rendering benchmark.
+
+Renders invoices with 1, 10 and 200 line items through generate_invoice_pdf and
+reports p50/p99 render time and the peak memory allocated (as traced by
+tracemalloc) while rendering one invoice.
+
+Usage:
+    python benchmarks/invoice_render_benchmark.py [--runs 200] [--items 1 10 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('DATABASE_URI', 'sqlite://')
+os.environ.setdefault('EMAIL_WORKER_THREADS', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.invoice_service import generate_invoice_pdf  # noqa: E402
+
+
+def invoice_with_items(count):
+    return {
+        'jobcard_id': 1042,
+        'client_name': 'Wanjiru Kamau',
+        'client_email': 'wanjiru@example.com',
+        'device_info': 'Dell Latitude 7420',
+        'invoice_date': '2026-01-31',
+        'items': [
+            {'type': 'part', 'description': f'Replacement part #{i}', 'quantity': 1 + i % 3, 'price': 1500 + i}
+            for i in range(count)
+        ],
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(invoice, runs):
+    # Warm up font and style caches so steady-state renders are measured
+    for _ in range(3):
+        generate_invoice_pdf(invoice)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        generate_invoice_pdf(invoice)
+        timings.append(time.perf_counter() - start)
+
+    # Allocation figures come from a separate, traced pass so tracing doesn't skew timings
+    peaks = []
+    tracemalloc.start()
+    for _ in range(max(1, runs // 10)):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        generate_invoice_pdf(invoice)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return timings, statistics.median(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=200, help='Timed renders per item count')
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 10, 200], help='Line item counts to render')
+    args = parser.parse_args()
+
+    print(f'{"items":>6} {"p50 (ms)":>10} {"p99 (ms)":>10} {"peak alloc (KiB)":>17}')
+    for count in args.items:
+        timings, peak = measure(invoice_with_items(count), args.runs)
+        print(f'{count:>6} {percentile(timings, 50) * 1000:>10.2f} {percentile(timings, 99) * 1000:>10.2f} '
+              f'{peak / 1024:>17.1f}')
+
+
+if __name__ == '__main__':
+    main()
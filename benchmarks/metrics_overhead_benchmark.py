@@ -0,0 +1,132 @@
+"""
+Per-request cost of the Prometheus metrics in app/metrics.py.
+
+Runs the same cheap requests (a client lookup, a device lookup and the
+technician list, against a small seeded SQLite database) in three fresh
+processes:
+
+    off             METRICS_ENABLED=false
+    on              metrics kept in process memory
+    multiprocess    metrics written to PROMETHEUS_MULTIPROC_DIR, as under gunicorn
+
+and reports the median and mean request time of each, the overhead of the
+last two against `off`, and how long one scrape of /metrics takes. Requests
+go through Flask's test client, so the numbers cover the WSGI stack but not a
+web server. The query instrumentation is switched off in every run so that
+only the metrics differ.
+
+Usage:
+    python benchmarks/metrics_overhead_benchmark.py [--requests 5000] [--rounds 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--requests', type=int, default=5000, help='Timed requests per round')
+parser.add_argument('--rounds', type=int, default=3, help='Rounds per mode; the fastest round is reported')
+parser.add_argument('--run', choices=['off', 'on', 'multiprocess'], help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+MODES = ['off', 'on', 'multiprocess']
+
+
+def run_mode():
+    """Time the requests in this process, configured for args.run, and print the results as JSON."""
+    import contextlib
+    import logging
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app, db
+    from app.fixtures import seed_database
+
+    logging.disable(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        seed_database(clients=200, devices=400, users=20, jobcards=0, echo=lambda message: None)
+    client = app.test_client()
+    urls = ['/clients/1', '/devices/1', '/users/technicians']
+
+    rounds = []
+    # Route handlers print; keep that out of the timings and the output
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(50):
+            for url in urls:
+                client.get(url)
+        for _ in range(args.rounds):
+            latencies = []
+            for i in range(args.requests):
+                url = urls[i % len(urls)]
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, (url, response.status_code)
+            rounds.append(latencies)
+
+        scrape = None
+        if args.run != 'off':
+            started = time.perf_counter()
+            response = client.get('/metrics')
+            scrape = time.perf_counter() - started
+            assert response.status_code == 200
+
+    best = min(rounds, key=statistics.median)
+    print(json.dumps({
+        'median_us': statistics.median(best) * 1e6,
+        'mean_us': statistics.fmean(best) * 1e6,
+        'scrape_ms': scrape * 1000 if scrape is not None else None
+    }))
+
+
+def spawn(mode, workdir):
+    env = dict(
+        os.environ,
+        DATABASE_URI=f'sqlite:///{os.path.join(workdir, mode + ".db")}',
+        EMAIL_WORKER_THREADS='0',
+        MAIL_USERNAME='',
+        QUERY_INSTRUMENTATION_ENABLED='false',
+        METRICS_ENABLED='false' if mode == 'off' else 'true'
+    )
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    if mode == 'multiprocess':
+        env['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(workdir, 'prometheus')
+        os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run', mode,
+         '--requests', str(args.requests), '--rounds', str(args.rounds)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    try:
+        results = {}
+        for mode in MODES:
+            print(f'Running {mode}...', flush=True)
+            results[mode] = spawn(mode, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = results['off']
+    print(f'\n{args.requests} requests x {args.rounds} rounds, fastest round')
+    print(f'{"mode":<14}{"median us":>12}{"mean us":>12}{"overhead us":>14}{"overhead %":>12}{"scrape ms":>12}')
+    for mode in MODES:
+        result = results[mode]
+        overhead = result['median_us'] - baseline['median_us']
+        scrape = f'{result["scrape_ms"]:.2f}' if result['scrape_ms'] is not None else '-'
+        print(f'{mode:<14}{result["median_us"]:>12.1f}{result["mean_us"]:>12.1f}'
+              f'{overhead:>14.1f}{overhead / baseline["median_us"] * 100:>11.1f}%{scrape:>12}')
+
+
+if __name__ == '__main__':
+    if args.run:
+        run_mode()
+    else:
+        main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark comparing SerializerMixin.to_dict() with the columnar serializers.
+
+Seeds a throwaway SQLite database and times serializing the same page of
+clients, devices, users and jobcards through both paths.
+
+Usage:
+    python benchmarks/serializer_benchmark.py [--rows 2000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'serializer_benchmark.db')
+os.environ['DATABASE_URI'] = f'sqlite:///{DB_PATH}'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db  # noqa: E402
+from app.models import Client, Device, Users, Jobcards  # noqa: E402
+from app.serializers import (  # noqa: E402
+    client_serializer, device_serializer, user_serializer,
+    serialize_clients, serialize_devices, serialize_users, serialize_jobcards
+)
+
+
+def seed(rows):
+    technicians = [
+        Users(email=f'tech{i}@example.com', username=f'tech{i}', password='x', role='technician')
+        for i in range(10)
+    ]
+    db.session.add_all(technicians)
+    clients = [
+        Client(name=f'Client {i}', email=f'client{i}@example.com', phone_number=f'0700{i:06d}')
+        for i in range(rows)
+    ]
+    db.session.add_all(clients)
+    db.session.flush()
+    devices = [
+        Device(device_serial_number=f'SN{i}', device_model='Latitude', brand='Dell',
+               client_id=clients[i % rows].id, warranty_status='False')
+        for i in range(rows)
+    ]
+    db.session.add_all(devices)
+    db.session.flush()
+    db.session.add_all([
+        Jobcards(problem_description='Screen flickering', status='pending', device_id=devices[i].id,
+                 assigned_technician_id=technicians[i % 10].id)
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000, help='Rows per table')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case; the best is reported')
+    args = parser.parse_args()
+
+    cases = [
+        ('clients', lambda: [c.to_dict() for c in Client.query.order_by(Client.id)],
+         lambda: serialize_clients(client_serializer.query().order_by(Client.id).all())),
+        ('devices', lambda: [d.to_dict() for d in Device.query.order_by(Device.id)],
+         lambda: serialize_devices(device_serializer.query().order_by(Device.id).all())),
+        ('users', lambda: [u.to_dict(rules=('-password',)) for u in Users.query.order_by(Users.id)],
+         lambda: serialize_users(user_serializer.query().order_by(Users.id).all())),
+        ('jobcards', lambda: [j.to_dict() for j in Jobcards.query.order_by(Jobcards.id)],
+         lambda: serialize_jobcards(Jobcards.query_with_details().order_by(Jobcards.id).all())),
+    ]
+
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+
+        print(f'{"endpoint":<10} {"to_dict (ms)":>14} {"columnar (ms)":>14} {"speedup":>8}')
+        for name, to_dict_path, columnar_path in cases:
+            old = best_of(args.repeat, to_dict_path)
+            new = best_of(args.repeat, columnar_path)
+            print(f'{name:<10} {old * 1000:>14.1f} {new * 1000:>14.1f} {old / new:>7.1f}x')
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
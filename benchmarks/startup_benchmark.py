@@ -0,0 +1,161 @@
+"""
+Cold start benchmark: import time and time to first request.
+
+Each round starts a fresh interpreter and measures:
+
+    import      `from app import app`, which builds the app
+    first       the first request through Flask's test client after that
+    total       interpreter start to the first response, as seen from outside
+
+With --gunicorn it also starts `gunicorn -c gunicorn.conf.py app:app` with one
+worker and times how long it takes to answer its first HTTP request, which is
+what a deploy or a `kill -HUP` reload waits on. That includes the worker's
+pool pre-warming.
+
+Finally it runs `python -X importtime` once and lists the slowest top-level
+imports under the app package, to show where the import time goes.
+
+A throwaway SQLite database is created first, so the numbers don't include
+connecting to a remote server.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--rounds 10] [--gunicorn] [--top 15]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--rounds', type=int, default=10, help='Fresh interpreters to time')
+parser.add_argument('--gunicorn', action='store_true', help='Also time a gunicorn worker to its first response')
+parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+args = parser.parse_args()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URL = '/clients/1'
+
+SETUP = '''
+from app import app, db
+from app.fixtures import seed_database
+with app.app_context():
+    db.create_all()
+    seed_database(clients=10, devices=10, users=5, jobcards=10, echo=lambda message: None)
+'''
+
+FIRST_REQUEST = f'''
+import contextlib, json, os, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    status = app.test_client().get({URL!r}).status_code
+finished = time.perf_counter()
+assert status == 200, status
+print(json.dumps({{'import': imported - started, 'first': finished - imported}}))
+'''
+
+
+def python(code, env, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=ROOT, env=env, check=True,
+                          capture_output=True, text=True)
+
+
+def time_first_request(env):
+    started = time.perf_counter()
+    output = python(FIRST_REQUEST, env).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total'] = time.perf_counter() - started
+    return result
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_gunicorn(env):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-w', '1', '-b', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}{URL}', timeout=5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not answer within 60s')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def slowest_imports(env):
+    """(cumulative seconds, module) for the imports directly under `import app`."""
+    stderr = python('import app', env, '-X', 'importtime').stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Imports made directly by the app package are indented by two spaces
+        if name.startswith('   ') and not name.startswith('    '):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+        elif name.strip() == 'app':
+            imports.append((int(cumulative) / 1e6, 'app (total)'))
+    return sorted(imports, reverse=True)
+
+
+def describe(samples):
+    return f'{statistics.median(samples) * 1000:>9.1f}{min(samples) * 1000:>9.1f}{max(samples) * 1000:>9.1f}'
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URI=f'sqlite:///{os.path.join(workdir, "startup.db")}',
+        EMAIL_WORKER_THREADS='0',
+        MAIL_USERNAME='',
+        PYTHONDONTWRITEBYTECODE='0'
+    )
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    try:
+        python(SETUP, env)
+        # One untimed run so every round reads compiled bytecode
+        time_first_request(env)
+        rounds = [time_first_request(env) for _ in range(args.rounds)]
+        gunicorn_rounds = [time_gunicorn(env) for _ in range(args.rounds)] if args.gunicorn else []
+        imports = slowest_imports(env)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{args.rounds} cold starts (ms)')
+    print(f'{"":<24}{"median":>9}{"min":>9}{"max":>9}')
+    print(f'{"import app":<24}{describe([r["import"] for r in rounds])}')
+    print(f'{"first request":<24}{describe([r["first"] for r in rounds])}')
+    print(f'{"process to response":<24}{describe([r["total"] for r in rounds])}')
+    if gunicorn_rounds:
+        print(f'{"gunicorn to response":<24}{describe(gunicorn_rounds)}')
+
+    print(f'\nSlowest imports made by the app package (cumulative ms, python -X importtime)')
+    for seconds, name in imports[:args.top]:
+        print(f'{seconds * 1000:>9.1f}  {name}')
+
+
+if __name__ == '__main__':
+    main()
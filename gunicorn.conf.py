@@ -0,0 +1,36 @@
+"""
+gunicorn settings shared by every deployment.
+
+Workers are threaded (gthread). A long-poll or server-sent event stream on
+/jobcards/changes then holds one thread, for up to JOBCARD_CHANGES_MAX_WAIT
+or JOBCARD_CHANGES_STREAM_SECONDS, rather than a whole worker. Both release
+their database connection while waiting, so GUNICORN_THREADS can exceed the
+database pool size; size it for the number of front-ends kept open per
+worker. Set the worker count with WEB_CONCURRENCY as usual.
+
+Each worker pre-warms its database pool once it has loaded the app (see
+app/database.py). With PROMETHEUS_MULTIPROC_DIR set, each worker writes its
+metric samples to files in that directory (see app/metrics.py). The directory
+must be emptied before gunicorn starts, and a worker's live gauges are dropped
+when it exits.
+"""
+import os
+from prometheus_client import multiprocess
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# A gthread worker heartbeats from its main loop, so this only catches hung workers;
+# requests and streams may run longer than it
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# On shutdown, change streams still open after this are cut; EventSource reconnects by itself
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+
+def post_worker_init(worker):
+    from app.database import prewarm_pool
+    prewarm_pool(worker.wsgi)
+
+
+def child_exit(server, worker):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
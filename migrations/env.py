@@ -90,11 +90,21 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    connectable = get_engine()
+
+    # indexes declared with ddl_if(dialect=...) (e.g. the Postgres-only search
+    # indexes) only exist on that dialect, so don't autogenerate them elsewhere
+    def include_object(object, name, type_, reflected, compare_to):
+        ddl_if = getattr(object, '_ddl_if', None)
+        if type_ == 'index' and ddl_if is not None and ddl_if.dialect is not None:
+            return ddl_if.dialect == connectable.dialect.name
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
-
-    connectable = get_engine()
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     with connectable.connect() as connection:
         context.configure(
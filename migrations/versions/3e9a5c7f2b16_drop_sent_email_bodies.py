@@ -0,0 +1,35 @@
+"""drop sent email bodies
+
+Revision ID: 3e9a5c7f2b16
+Revises: 7d4e2b9c1a58
+Create Date: 2026-10-17 23:18:40.164382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e9a5c7f2b16'
+down_revision = '7d4e2b9c1a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.alter_column('raw_message',
+               existing_type=sa.TEXT(),
+               nullable=True)
+
+    # Sent emails are never read again; free the space their bodies take up
+    op.execute("UPDATE email_outbox SET raw_message = NULL WHERE status = 'sent'")
+
+
+def downgrade():
+    op.execute("UPDATE email_outbox SET raw_message = '' WHERE raw_message IS NULL")
+
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.alter_column('raw_message',
+               existing_type=sa.TEXT(),
+               nullable=False)
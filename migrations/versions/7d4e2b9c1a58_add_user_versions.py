@@ -0,0 +1,34 @@
+"""add user versions
+
+Revision ID: 7d4e2b9c1a58
+Revises: e8b2d6f4a937
+Create Date: 2026-10-17 22:41:12.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4e2b9c1a58'
+down_revision = 'e8b2d6f4a937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing users start at version 1, last modified now (in UTC, like utcnow())
+    if op.get_bind().dialect.name == 'postgresql':
+        now = sa.text("timezone('utc', now())")
+    else:
+        now = sa.text('CURRENT_TIMESTAMP')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=now))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
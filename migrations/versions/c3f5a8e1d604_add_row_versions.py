@@ -0,0 +1,40 @@
+"""add row versions
+
+Revision ID: c3f5a8e1d604
+Revises: a9e4c7d2f185
+Create Date: 2026-10-17 19:27:45.018236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f5a8e1d604'
+down_revision = 'a9e4c7d2f185'
+branch_labels = None
+depends_on = None
+
+
+VERSIONED_TABLES = ('clients', 'devices', 'jobcards')
+
+
+def upgrade():
+    # Existing rows start at version 1, last modified now (in UTC, like utcnow())
+    if op.get_bind().dialect.name == 'postgresql':
+        now = sa.text("timezone('utc', now())")
+    else:
+        now = sa.text('CURRENT_TIMESTAMP')
+
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                          server_default=now))
+
+
+def downgrade():
+    for table in reversed(VERSIONED_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
@@ -0,0 +1,44 @@
+"""add filter and join indexes
+
+Revision ID: d1a7c93e5b28
+Revises: b4d2e7f9a613
+Create Date: 2026-10-17 16:21:37.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a7c93e5b28'
+down_revision = 'b4d2e7f9a613'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_clients_phone_number', 'clients', ['phone_number']),
+    ('ix_devices_client_id', 'devices', ['client_id']),
+    ('ix_users_username', 'users', ['username']),
+    ('ix_users_role', 'users', ['role']),
+    ('ix_jobcards_device_id', 'jobcards', ['device_id']),
+    ('ix_jobcards_timestamp', 'jobcards', ['timestamp']),
+    ('ix_jobcards_status_id', 'jobcards', ['status', 'id']),
+    ('ix_jobcards_assigned_technician_id_id', 'jobcards', ['assigned_technician_id', 'id']),
+    ('ix_jobcards_status_assigned_technician_id_id', 'jobcards', ['status', 'assigned_technician_id', 'id']),
+]
+
+
+def upgrade():
+    # Build the indexes CONCURRENTLY on Postgres so existing tables stay writable;
+    # that can't run inside a transaction, hence the autocommit block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,50 @@
+"""
+Shared fixtures: the app against a throwaway SQLite database, with the
+email dispatcher threads off. Config is read from the environment when
+app.config is imported, so it's set before anything from the app package.
+"""
+import os
+import sys
+import tempfile
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ.update({
+    'DATABASE_URI': f'sqlite:///{os.path.join(TEMP_DIR, "test.db")}',
+    'INVOICE_CACHE_DIR': os.path.join(TEMP_DIR, 'invoices'),
+    'EMAIL_WORKER_THREADS': '0',
+    'MAIL_USERNAME': '',
+    'RESPONSE_CACHE_ENABLED': 'false',
+    'METRICS_ENABLED': 'false',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app import app as flask_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """List that collects every SQL statement run while the test is active."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
@@ -0,0 +1,36 @@
+import pytest
+from app import db
+from app.models import Client, Device, Users, Jobcards
+
+
+@pytest.fixture
+def jobcard(app):
+    technician = Users(email='tech@example.com', username='otieno', role='technician')
+    client = Client(name='Wanjiru', email='wanjiru@example.com', phone_number='0700000000')
+    device = Device(device_serial_number='SN1', device_model='XPS', brand='Dell', client=client, warranty_status='False')
+    db.session.add_all([technician, device])
+    db.session.flush()
+    jobcard = Jobcards(problem_description='Screen flicker', status='pending', device_id=device.id,
+                       assigned_technician_id=technician.id)
+    db.session.add(jobcard)
+    db.session.commit()
+    return jobcard
+
+
+@pytest.mark.parametrize('url, field, value', [
+    # The list embeds the whole technician, the details only their name
+    ('/jobcards', 'email', 'otieno@example.com'),
+    ('/jobcards', 'username', 'otieno.k'),
+    ('/jobcards/{id}/details', 'username', 'otieno.k'),
+])
+def test_editing_the_technician_changes_the_etag(client, jobcard, url, field, value):
+    url = url.format(id=jobcard.id)
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    setattr(jobcard.user, field, value)
+    db.session.commit()
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
@@ -0,0 +1,62 @@
+"""Outbox housekeeping: sent emails drop their bodies, and old sent and dead emails are pruned."""
+from datetime import timedelta
+from app import db
+from app.email_service import email_service
+from app.models import EmailOutbox, utcnow
+
+
+class FakeSMTP:
+    def __init__(self):
+        self.sent = []
+
+    def sendmail(self, sender, recipients, message):
+        self.sent.append(message)
+
+
+class FakePool:
+    def __init__(self):
+        self.connection = FakeSMTP()
+
+    def acquire(self):
+        return self.connection
+
+    def release(self, smtp_conn):
+        pass
+
+    def discard(self, smtp_conn):
+        pass
+
+
+def queue_email(status=EmailOutbox.PENDING, age_days=0):
+    email = EmailOutbox(sender='shop@example.com', recipient='client@example.com', subject='Invoice',
+                        raw_message='Subject: Invoice\n\nHello', status=status,
+                        created_at=utcnow() - timedelta(days=age_days))
+    db.session.add(email)
+    db.session.commit()
+    return email
+
+
+def test_sent_email_drops_its_body(app, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(email_service, 'smtp_pool', pool)
+    email = queue_email()
+
+    email_service._deliver_batch([email])
+    db.session.expire_all()
+    email = db.session.get(EmailOutbox, email.id)
+    assert pool.connection.sent == ['Subject: Invoice\n\nHello']
+    assert email.status == EmailOutbox.SENT
+    assert email.raw_message is None
+
+
+def test_prune_deletes_old_sent_and_dead_emails(app):
+    old_sent = queue_email(EmailOutbox.SENT, age_days=40).id
+    old_dead = queue_email(EmailOutbox.DEAD, age_days=40).id
+    old_pending = queue_email(EmailOutbox.PENDING, age_days=40).id
+    new_sent = queue_email(EmailOutbox.SENT, age_days=1).id
+
+    result = app.test_cli_runner().invoke(args=['emails', 'prune', '--days', '30'])
+    assert 'Deleted 2 email(s)' in result.output
+    remaining = {email.id for email in EmailOutbox.query.all()}
+    assert remaining == {old_pending, new_sent}
+    assert old_sent not in remaining and old_dead not in remaining
@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Client
+
+
+def add_client(email):
+    db.session.add(Client(name='Wanjiru', email=email, phone_number='0700000000'))
+    db.session.commit()
+
+
+def test_failing_statement_raises_the_original_error(app):
+    add_client('wanjiru@example.com')
+    with pytest.raises(IntegrityError):
+        add_client('wanjiru@example.com')
+    db.session.rollback()
+
+    # The failed statement's timer was dropped, so later statements are timed normally
+    with db.engine.connect() as connection:
+        assert not connection.info.get('query_started')
+    add_client('other@example.com')
+    assert Client.query.count() == 2
+
+
+def test_failing_statement_in_a_request_keeps_its_error(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', True)
+    add_client('wanjiru@example.com')
+    with pytest.raises(IntegrityError):
+        client.post('/clients', json={'name': 'Wanjiru', 'email': 'wanjiru@example.com', 'phone_number': '0700000000'})
@@ -0,0 +1,52 @@
+"""The two-tier invoice cache: concurrent writers and disk eviction."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from app.invoice_service import InvoiceCache
+
+
+def make_cache(directory, disk_limit=10 ** 6):
+    cache = InvoiceCache()
+    cache.directory = str(directory)
+    cache.memory_limit = 0
+    cache.disk_limit = disk_limit
+    return cache
+
+
+def key(i):
+    return sha256(str(i).encode()).hexdigest()
+
+
+def test_concurrent_puts_of_one_key(tmp_path):
+    cache = make_cache(tmp_path)
+    pdf_bytes = b'%PDF' + b'x' * 10000
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(lambda _: cache.put(key(0), pdf_bytes), range(200)))
+
+    assert os.listdir(tmp_path) == [f'{key(0)}.pdf']
+    assert cache.get(key(0)) == pdf_bytes
+    assert cache._disk_bytes == len(pdf_bytes)
+
+
+def test_failed_disk_write_is_not_raised(tmp_path):
+    blocker = tmp_path / 'not-a-directory'
+    blocker.write_bytes(b'')
+    cache = make_cache(blocker / 'cache')
+    cache.memory_limit = 1000
+
+    cache.put(key(0), b'%PDF')
+    assert cache.get(key(0)) == b'%PDF'
+
+
+def test_disk_is_trimmed_oldest_first_once_over_the_limit(tmp_path):
+    cache = make_cache(tmp_path, disk_limit=1000)
+    for i in range(10):
+        cache.put(key(i), b'x' * 100)
+        os.utime(cache._path(key(i)), (i, i))
+    assert len(os.listdir(tmp_path)) == 10
+
+    cache.put(key(10), b'x' * 100)
+    remaining = sorted(os.listdir(tmp_path))
+    assert sum(os.path.getsize(tmp_path / name) for name in remaining) <= 900
+    assert f'{key(0)}.pdf' not in remaining
+    assert f'{key(10)}.pdf' in remaining
@@ -0,0 +1,156 @@
+import io
+import json
+import os
+import signal
+import time
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from uuid import uuid4
+from prometheus_client import REGISTRY
+from app import db
+from app import invoice_service as invoice_service_module
+from app.invoice_service import invoice_service, render_pool, _render_in_window
+from app.models import Client, Device, Jobcards, InvoiceJob, utcnow
+
+INVOICE = {
+    'jobcard_id': 1, 'client_name': 'Wanjiru', 'client_email': 'wanjiru@example.com',
+    'device_info': 'Dell XPS', 'items': [{'type': 'service', 'description': 'Screen', 'price': 1000}], 'total': 1000
+}
+
+
+def invoice():
+    # A new description each time, so the invoice is never already cached
+    return {**INVOICE, 'items': [{'type': 'service', 'description': f'Screen {uuid4().hex}', 'price': 1000}]}
+
+
+def wait_until_finished(job_id, timeout=60):
+    invoice_service.wait_for(job_id, timeout)
+    db.session.expire_all()
+    return db.session.get(InvoiceJob, job_id)
+
+
+def test_broken_render_pool_is_replaced(app, client):
+    try:
+        job = invoice_service.submit(invoice())
+        assert wait_until_finished(job.id).status == InvoiceJob.COMPLETED
+
+        # Kill the render processes, as the OOM killer would
+        broken = invoice_service._executor
+        for process in broken._processes.values():
+            os.kill(process.pid, signal.SIGKILL)
+        time.sleep(0.5)
+
+        response = client.post('/jobcards/generate-invoice?async=true', json=invoice())
+        assert response.status_code == 202
+        assert wait_until_finished(response.json['id']).status == InvoiceJob.COMPLETED
+        assert invoice_service._executor is not broken
+    finally:
+        invoice_service.shutdown()
+
+
+def test_unavailable_pool_fails_the_job(app, client, monkeypatch):
+    def broken(normalized):
+        raise RuntimeError('cannot schedule new futures after shutdown')
+
+    monkeypatch.setattr(invoice_service, '_submit_render', broken)
+    response = client.post('/jobcards/generate-invoice?async=true', json=invoice())
+
+    assert response.status_code == 503
+    assert response.json['status'] == InvoiceJob.FAILED
+    job = db.session.get(InvoiceJob, response.json['id'])
+    assert job.status == InvoiceJob.FAILED
+    assert job.id not in invoice_service._done_events
+    assert invoice_service._pending == 0
+
+
+def test_pool_renders_are_recorded_in_this_process(app):
+    def renders():
+        return REGISTRY.get_sample_value('invoice_render_duration_seconds_count') or 0
+
+    before = renders()
+    try:
+        job = invoice_service.submit(invoice())
+        assert wait_until_finished(job.id).status == InvoiceJob.COMPLETED
+    finally:
+        invoice_service.shutdown()
+    assert renders() == before + 1
+
+
+def test_prune_jobs_deletes_old_jobs_and_their_pdfs(app, client, tmp_path):
+    def completed_job(age_days):
+        file_path = tmp_path / f'{uuid4().hex}.pdf'
+        file_path.write_bytes(b'%PDF')
+        job = InvoiceJob(id=uuid4().hex, jobcard_id='1', status=InvoiceJob.COMPLETED, file_path=str(file_path),
+                         created_at=utcnow() - timedelta(days=age_days))
+        db.session.add(job)
+        db.session.commit()
+        return job.id, file_path
+
+    old_id, old_path = completed_job(10)
+    new_id, new_path = completed_job(1)
+
+    result = app.test_cli_runner().invoke(args=['invoices', 'prune-jobs', '--days', '7'])
+    assert 'Deleted 1 invoice job(s)' in result.output
+    assert db.session.get(InvoiceJob, old_id) is None
+    assert not old_path.exists()
+    assert db.session.get(InvoiceJob, new_id) is not None
+    assert new_path.exists()
+
+    new_path.unlink()
+    assert client.get(f'/jobcards/invoice-jobs/{new_id}/download').status_code == 410
+
+
+def add_jobcards(count):
+    ids = []
+    for i in range(count):
+        client = Client(name=f'Client {i}', email=f'client{i}@example.com', phone_number=f'07{i:08d}')
+        device = Device(device_serial_number=f'SN{i}', device_model='XPS', brand='Dell', client=client,
+                        warranty_status='False')
+        db.session.add(device)
+        db.session.flush()
+        jobcard = Jobcards(problem_description=f'Problem {uuid4().hex}', status='pending', device_id=device.id, cost=100)
+        db.session.add(jobcard)
+        db.session.flush()
+        ids.append(jobcard.id)
+    db.session.commit()
+    return ids
+
+
+def test_batch_requests_share_the_render_pool(app, client, monkeypatch):
+    pools = []
+
+    def counting_pool(max_workers):
+        pools.append(max_workers)
+        return render_pool(max_workers)
+
+    monkeypatch.setattr(invoice_service_module, 'render_pool', counting_pool)
+    jobcard_ids = add_jobcards(3)
+    try:
+        for _ in range(2):
+            response = client.post('/jobcards/invoices/batch', json={'jobcard_ids': jobcard_ids, 'send_emails': False})
+            assert response.status_code == 200
+            with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+                assert sorted(json.loads(archive.read('manifest.json'))['rendered']) == jobcard_ids
+        assert pools == [app.config['INVOICE_RENDER_WORKERS']]
+    finally:
+        invoice_service.shutdown()
+
+
+def test_batch_keeps_at_most_window_renders_submitted():
+    submitted = []
+    peaks = []
+
+    def submit(normalized):
+        future = Future()
+        future.set_result((b'%PDF', None))
+        submitted.append(future)
+        return future
+
+    to_render = {i: ({}, f'key{i}') for i in range(10)}
+    finished = []
+    for jobcard_id, key, future in _render_in_window(to_render, submit, 3):
+        finished.append(jobcard_id)
+        peaks.append(len(submitted) - len(finished) + 1)
+    assert sorted(finished) == list(range(10))
+    assert max(peaks) == 3
@@ -0,0 +1,45 @@
+"""GET /jobcards must run the same number of queries however many rows it returns."""
+import pytest
+from app import db
+from app.models import Client, Device, Users, Jobcards
+
+
+@pytest.fixture
+def technicians(app):
+    technicians = [Users(email=f'tech{i}@example.com', username=f'tech{i}', role='technician') for i in range(3)]
+    db.session.add_all(technicians)
+    db.session.commit()
+    return [technician.id for technician in technicians]
+
+
+def add_jobcards(start, count, technician_ids):
+    """Add jobcards `start` to `start + count`, each on its own device and client."""
+    for i in range(start, start + count):
+        client = Client(name=f'Client {i}', email=f'client{i}@example.com', phone_number=f'07{i:08d}')
+        device = Device(device_serial_number=f'SN{i}', device_model='XPS', brand='Dell', client=client,
+                        warranty_status='False')
+        db.session.add(device)
+        db.session.flush()
+        technician_id = technician_ids[i % len(technician_ids)] if i % 4 else None
+        db.session.add(Jobcards(problem_description=f'Problem {i}', status='pending', device_id=device.id,
+                                assigned_technician_id=technician_id))
+    db.session.commit()
+
+
+def count_queries(client, statements, url):
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(statements), len(response.json)
+
+
+@pytest.mark.parametrize('url', ['/jobcards', '/jobcards?status=pending'])
+def test_jobcard_list_query_count_is_constant(client, statements, technicians, url):
+    add_jobcards(0, 5, technicians)
+    small, returned = count_queries(client, statements, url)
+    assert returned == 5
+
+    add_jobcards(5, 45, technicians)
+    large, returned = count_queries(client, statements, url)
+    assert returned == 50
+    assert large == small